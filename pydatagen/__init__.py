@@ -11,6 +11,13 @@ regarding the generation speed.
 __all__ = [
     # Exported methods
     'printf',
+    'printf_many',
+    'scanf',
+    'scanner',
+    'validator',
+    'ValidationError',
+    'fflush',
+    'output',
     'rep',
     # Data structures
     'deque',
@@ -20,28 +27,963 @@ __all__ = [
     # Randomization methods
     'rand',
     'xrand',
+    'take',
+    'choice',
+    'permutation',
+    'step',
+    'point',
+    'polygon',
+    'segment',
+    'lazylist',
+    'matrix',
+    'get_backend',
+    'set_backend',
+    'use_backend',
     'rate',
+    'xrate',
+    'rate_mask',
+    # Graph generators
+    'rand_tree',
+    'rand_graph',
+    # Test suites
+    'build_suite',
+    'update_suite',
+    'stress_test',
+    'generate_case',
+    # Instrumentation
+    'profile',
 ]
 
 import sys
+import array
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import gzip
+import hashlib
+import heapq
+import importlib.util
+import inspect
+import io
+import itertools
+import json
+import lzma
+import math
+import mmap
+import os
 import random
+import re
+import shlex
+import subprocess
+import threading
+import time
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 ################################################################################
 
 def printf(fmt_str, *args):
     """C++ styled output function. Also automatically formats some particular
-    data types for ease of output."""
-    args = list(args)
-    for i in range(0, len(args)):
-        if type(args[i]) == list:
-            args[i] = ' '.join(map(str, args[i][1:]))
-    print(fmt_str % tuple(args), end='')
+    data types for ease of output: lists (from [1]), tuples, arrays, bytes, 2D
+    lists, lazylists and matrices, where each item is formatted with the same
+    conversion (like %d or %.2f) and separated with spaces (or newlines
+    between rows). Format strings are compiled only once, see Formatter."""
+    if profiler is not None:
+        return printf_profiled(fmt_str, args)
+    compiled_format(fmt_str).write(output_stack[-1], args)
+
+def printf_many(fmt_str, rows):
+    """printf_many(fmt_str, rows): Calls printf(fmt_str, *row) for each row in
+    rows, but formats blocks of thousands of rows with a single format string
+    and writes each block at once. If there is only one conversion in
+    fmt_str, each row is the argument itself, e.g. printf_many('%d\\n', lst)."""
+    if profiler is not None:
+        return printf_many_profiled(fmt_str, rows)
+    compiled_format(fmt_str).write_many(output_stack[-1], rows)
+
+plain_types = {int, float, str, bool}
+
+class Formatter:
+    """Formatter(fmt_str): A compiled printf() format. The conversions of the
+    format are found only once, after which arguments of plain types (int,
+    float, str) are formatted by the % operator directly, and containers are
+    formatted item by item with their own conversions, by format strings
+    repeated for blocks of items instead of calling str() for each."""
+    conversion = re.compile(r'%(\([^)]*\))?[-#0 +]*(\*|\d+)?(?:\.(\*|\d*))?[hlLqjzt]*([diouxXeEfFgGcrsa%])')
+    def __init__(self, fmt_str):
+        self.fmt_str = fmt_str
+        self.literals = []
+        self.conversions = []
+        self.compound = True
+        pos = 0
+        for m in Formatter.conversion.finditer(fmt_str):
+            if m.group(4) == '%':
+                continue
+            # Keys and starred widths take the arguments differently
+            if m.group(1) is not None or m.group(2) == '*' or m.group(3) == '*':
+                self.compound = False
+            self.literals.append(fmt_str[pos:m.start()].replace('%%', '%'))
+            self.conversions.append(m.group(0))
+            pos = m.end()
+        self.literals.append(fmt_str[pos:].replace('%%', '%'))
+        self.blocks = {}
+        return
+    def __repr__(self):
+        return 'Formatter(%r)' % self.fmt_str
+    def block(self, conv, count, sep=' '):
+        """block(conv, count, sep): Returns conv repeated for count times and
+        separated with sep, which is cached for the largest blocks."""
+        key = (conv, count, sep)
+        if key not in self.blocks:
+            res = sep.replace('%', '%%').join([conv] * count)
+            if count < 4096:
+                return res
+            self.blocks[key] = res
+        return self.blocks[key]
+    def write_items(self, sink, conv, items, sep=' '):
+        """write_items(sink, conv, items, sep): Writes the items (a sequence)
+        formatted by conv and separated with sep, in blocks of 65536 items."""
+        for i in range(0, len(items), 65536):
+            if i > 0:
+                sink.write(sep)
+            chunk = items[i:i+65536]
+            if conv == '%s' and all(type(item) == str for item in chunk):
+                sink.write(sep.join(chunk))
+            else:
+                sink.write(self.block(conv, len(chunk), sep) % tuple(chunk))
+        return
+    def write_rows(self, sink, conv, rows, one_based):
+        """write_rows(sink, conv, rows, one_based): Writes a 2D list, with rows
+        separated with newlines."""
+        for i in range(0, len(rows)):
+            if i > 0:
+                sink.write('\n')
+            row = rows[i]
+            self.write_items(sink, conv, row[1:] if one_based and type(row) == list else row)
+        return
+    def write_arg(self, sink, conv, arg):
+        """write_arg(sink, conv, arg): Writes a single argument formatted by the
+        conversion conv."""
+        vartype = type(arg)
+        if vartype in plain_types:
+            sink.write(conv % arg)
+        elif vartype == list:
+            # 2D lists created by rand((list, list), ...) in former versions
+            if len(arg) > 1 and type(arg[1]) in {list, tuple, array.array}:
+                self.write_rows(sink, conv, arg[1:], True)
+            else:
+                self.write_items(sink, conv, arg[1:])
+        elif vartype == tuple:
+            if len(arg) > 0 and type(arg[0]) in {list, tuple, array.array}:
+                self.write_rows(sink, conv, arg, False)
+            else:
+                self.write_items(sink, conv, arg)
+        elif vartype == array.array:
+            self.write_items(sink, conv, arg)
+        elif vartype == matrix.Row:
+            self.write_items(sink, conv, arg.values())
+        elif vartype == lazylist:
+            arg.write_to(sink, conv)
+        elif vartype == matrix:
+            arg.write_to(sink, None, conv)
+        elif vartype in {bytes, bytearray}:
+            sink.write(conv % arg.decode('latin-1'))
+        elif numpy is not None and vartype == numpy.ndarray:
+            if arg.ndim == 2:
+                self.write_rows(sink, conv, arg.tolist(), False)
+            else:
+                self.write_items(sink, conv, arg.tolist())
+        else:
+            sink.write(conv % (arg,))
+        return
+    def write(self, sink, args):
+        """write(sink, args): Writes the arguments formatted into sink."""
+        for arg in args:
+            if type(arg) not in plain_types:
+                break
+        else:
+            sink.write(self.fmt_str % args)
+            return
+        if not self.compound or len(args) != len(self.conversions):
+            sink.write(self.fmt_str % args)
+            return
+        literals, conversions = self.literals, self.conversions
+        for i in range(0, len(args)):
+            if literals[i]:
+                sink.write(literals[i])
+            self.write_arg(sink, conversions[i], args[i])
+        if literals[-1]:
+            sink.write(literals[-1])
+        return
+    def write_many(self, sink, rows):
+        """write_many(sink, rows): Writes each row of arguments formatted into
+        sink, in blocks of rows."""
+        single = len(self.conversions) == 1
+        size = max(1, 16384 // max(1, len(self.conversions)))
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, size))
+            if not chunk:
+                break
+            flat = chunk if single else list(itertools.chain.from_iterable(chunk))
+            if set(map(type, flat)) <= plain_types and len(flat) == len(chunk) * len(self.conversions):
+                fmt = self.blocks.get(len(chunk)) or self.fmt_str * len(chunk)
+                if len(chunk) == size:
+                    self.blocks[len(chunk)] = fmt
+                sink.write(fmt % tuple(flat))
+                continue
+            for row in chunk:
+                self.write(sink, (row,) if single else tuple(row))
+        return
+    pass
+
+@functools.lru_cache(maxsize=256)
+def compiled_format(fmt_str):
+    """compiled_format(fmt_str): Returns the Formatter of fmt_str, which is kept
+    in a LRU cache of 256 entries."""
+    return Formatter(fmt_str)
+
+def fflush():
+    """fflush(): Flushes the buffered contents of the current output."""
+    output_stack[-1].flush()
+    return
 
 def rep(begin, end, step=1):
     """rep(begin, end, step=1): A wrapper for range which provides easy results
     that ends at end instead of end - 1."""
     yield from range(begin, end+1, step)
 
+class OutputSink:
+    """OutputSink(target, compress, buffer_size, encoding): The destination of
+    printf(). See output() for the meaning of the arguments. Contents are kept
+    in a write buffer and written to the target in large blocks."""
+    def __init__(self, target=None, compress=None, buffer_size=1048576, encoding='utf-8'):
+        self.target = target
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.encoding = encoding
+        self.buffer = []
+        self.buffered = 0
+        self.stream = None
+        self.owned = []
+        self.binary = False
+        if hasattr(target, '__fspath__'):
+            self.target = target = os.fspath(target)
+        # Infers the compression from file name
+        if compress is None and type(target) == str:
+            if target.endswith('.gz'):
+                self.compress = 'gzip'
+            elif target.endswith('.xz'):
+                self.compress = 'xz'
+        if self.compress not in {None, 'gzip', 'xz'}:
+            raise ValueError('unsupported compression, candidates: gzip, xz')
+        # Unbuffered sinks pass the contents through immediately
+        if buffer_size <= 0:
+            self.write = self.write_through
+        return
+    def __enter__(self):
+        self.open()
+        output_stack.append(self)
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        output_stack.remove(self)
+        self.close()
+        return False
+    def open(self):
+        if self.stream is not None:
+            return
+        target = self.target
+        if target is None:
+            target = sys.stdout
+        elif type(target) == str:
+            target = open(target, 'wb')
+            self.owned.append(target)
+        if self.compress == 'gzip':
+            target = gzip.GzipFile(fileobj=target, mode='wb')
+            self.owned.append(target)
+        elif self.compress == 'xz':
+            target = lzma.LZMAFile(target, mode='wb')
+            self.owned.append(target)
+        self.stream = target
+        self.binary = not isinstance(target, io.TextIOBase)
+        return
+    def write(self, s):
+        self.buffer.append(s)
+        self.buffered += len(s)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+        return
+    def write_through(self, s):
+        self.buffer.append(s)
+        self.flush()
+        return
+    def flush(self):
+        if self.stream is None:
+            self.open()
+        data = ''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        if self.binary:
+            data = data.encode(self.encoding)
+        self.stream.write(data)
+        self.stream.flush()
+        return
+    def close(self):
+        """Flushes the contents, and closes the files opened by the sink. File
+        objects given by the user are left open."""
+        self.flush()
+        while self.owned:
+            self.owned.pop().close()
+        self.stream = None
+        return
+    def getvalue(self):
+        """Returns the written contents of an in-memory (io.BytesIO) target.
+        Compressed contents are complete only after the sink is closed."""
+        if self.stream is not None:
+            self.flush()
+        return self.target.getvalue()
+    pass
+
+class StdoutSink(OutputSink):
+    """StdoutSink(): The default destination of printf(), which writes to the
+    current sys.stdout immediately, so that it works along with print()."""
+    def __init__(self):
+        OutputSink.__init__(self, None, buffer_size=0)
+        return
+    def write_through(self, s):
+        sys.stdout.write(s)
+        return
+    def flush(self):
+        sys.stdout.flush()
+        return
+    def close(self):
+        return
+    pass
+
+output_stack = [StdoutSink()]
+
+def output(target=None, compress=None, buffer_size=1048576, encoding='utf-8'):
+    """output(target=None, compress=None, buffer_size=1048576): Creates an
+    output sink for printf(), to be used along with the 'with' statement:
+
+        with output('1.in'):
+            printf('%d\\n', n)
+
+    The target may be None (sys.stdout), a file path, or a file object (either
+    binary or text). Use an io.BytesIO() as the target to write into memory,
+    the contents could be read through getvalue() of the sink.
+    The contents are compressed if compress is 'gzip' or 'xz', or if the file
+    path ends with '.gz' or '.xz'.
+    Contents are written in blocks of around buffer_size characters, call
+    fflush() to write them immediately. Sinks could be nested, and printf()
+    always writes to the innermost one."""
+    return OutputSink(target, compress, buffer_size, encoding)
+
+def locate(data, pos):
+    """locate(data, pos): Returns the (line, column) of pos in the buffer data,
+    both starting from 1."""
+    line, begin = 1, 0
+    for i in range(0, pos, 1048576):
+        line += data[i:min(i + 1048576, pos)].count(b'\n')
+    begin = data.rfind(b'\n', 0, pos) + 1
+    return line, pos - begin + 1
+
+scanf_patterns = {
+    'int': re.compile(rb'\s*([-+]?\d+)'),
+    'hex': re.compile(rb'\s*([-+]?(?:0[xX])?[0-9a-fA-F]+)'),
+    'float': re.compile(rb'\s*([-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[iI][nN][fF]|[nN][aA][nN]))'),
+    'str': re.compile(rb'\s*(\S+)'),
+    'space': re.compile(rb'\s*'),
+    'word': re.compile(rb'\S*'),
+}
+
+@functools.lru_cache(maxsize=256)
+def compile_scanf(fmt_str):
+    """compile_scanf(fmt_str): Compiles a scanf() format into a tuple of steps,
+    each being ('space', None), ('literal', bytes) or (conversion, None)."""
+    steps = []
+    conversions = {'d': 'int', 'u': 'int', 'i': 'int', 'x': 'hex', 'X': 'hex',
+                   'f': 'float', 'F': 'float', 'e': 'float', 'E': 'float',
+                   'g': 'float', 'G': 'float', 's': 'str', 'c': 'char'}
+    pattern = re.compile(r'(\s+)|%(?:\d*)(?:hh|h|ll|l|L|j|z|t)?([%a-zA-Z])|([^%\s]+)')
+    pos = 0
+    while pos < len(fmt_str):
+        m = pattern.match(fmt_str, pos)
+        if m is None:
+            raise ValueError('incomplete conversion at the end of format %r' % fmt_str)
+        pos = m.end()
+        if m.group(1) is not None:
+            steps.append(('space', None))
+        elif m.group(2) == '%':
+            steps.append(('literal', b'%'))
+        elif m.group(2) is not None:
+            if m.group(2) not in conversions:
+                raise ValueError('unsupported conversion %%%s, candidates: d, u, i, x, f, e, g, s, c' % m.group(2))
+            steps.append((conversions[m.group(2)], None))
+        else:
+            steps.append(('literal', m.group(3).encode()))
+    return tuple(steps)
+
+class Scanner:
+    """Scanner(target, encoding): The source of scanf(). See scanner() for the
+    meaning of the arguments. Tokens are parsed directly from one large buffer
+    (a memory map of the file, if possible), instead of line by line."""
+    def __init__(self, target=None, encoding='utf-8'):
+        self.target = target
+        self.encoding = encoding
+        self.data = None
+        self.pos = 0
+        self.owned = []
+        if hasattr(target, '__fspath__'):
+            self.target = os.fspath(target)
+        return
+    def __enter__(self):
+        self.open()
+        input_stack.append(self)
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        input_stack.remove(self)
+        self.close()
+        return False
+    def open(self):
+        if self.data is not None:
+            return
+        target = self.target
+        if target is None:
+            target = sys.stdin
+        if type(target) in {bytes, bytearray}:
+            self.data = bytes(target)
+        elif type(target) == str and target.endswith('.gz'):
+            with gzip.open(target, 'rb') as f:
+                self.data = f.read()
+        elif type(target) == str and target.endswith('.xz'):
+            with lzma.open(target, 'rb') as f:
+                self.data = f.read()
+        elif type(target) == str:
+            f = open(target, 'rb')
+            self.owned.append(f)
+            if os.fstat(f.fileno()).st_size > 0:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.owned.append(self.data)
+            else:
+                self.data = b''
+        elif isinstance(target, io.TextIOBase):
+            if hasattr(target, 'buffer'):
+                self.data = target.buffer.read()
+            else:
+                self.data = target.read().encode(self.encoding)
+        else:
+            self.data = target.read()
+        return
+    def close(self):
+        """Closes the files opened by the scanner. File objects given by the
+        user are left open."""
+        while self.owned:
+            self.owned.pop().close()
+        self.data = None
+        return
+    def where(self, pos=None):
+        """where(pos=None): Describes the position (defaults to the current one)
+        in the input by its line and column."""
+        return 'line %d, column %d' % locate(self.data, self.pos if pos is None else pos)
+    def eof(self):
+        """eof(): Returns if there is nothing but whitespace left."""
+        if self.data is None:
+            self.open()
+        return scanf_patterns['space'].match(self.data, self.pos).end() >= len(self.data)
+    def match(self, kind):
+        """match(kind): Reads a token of kind ('int', 'hex', 'float' or 'str'),
+        and returns it in bytes."""
+        if self.data is None:
+            self.open()
+        m = scanf_patterns[kind].match(self.data, self.pos)
+        if m is None:
+            if self.eof():
+                raise EOFError('unexpected end of input at %s' % self.where())
+            raise ValueError('expected %s at %s' % (kind, self.where(scanf_patterns['space'].match(self.data, self.pos).end())))
+        self.pos = m.end()
+        return m.group(1)
+    def read_int(self):
+        return int(self.match('int'))
+    def read_float(self):
+        return float(self.match('float'))
+    def read_str(self):
+        return self.match('str').decode(self.encoding)
+    def token_blocks(self, count, block_size=1048576):
+        """token_blocks(count, block_size): Yields the next count tokens in lists
+        of bytes, split from blocks of around block_size bytes of the buffer,
+        so that there are never too many tokens in memory."""
+        if self.data is None:
+            self.open()
+        data, size = self.data, len(self.data)
+        while count > 0:
+            if self.pos >= size:
+                raise EOFError('unexpected end of input at %s, %d more tokens expected' % (self.where(), count))
+            # Extends the block to the end of the token cut by the block
+            end = scanf_patterns['word'].match(data, min(self.pos + block_size, size)).end()
+            parts = data[self.pos:end].split(None, count)
+            if len(parts) > count:
+                self.pos = end - len(parts.pop())
+            else:
+                self.pos = end
+            count -= len(parts)
+            yield parts
+        return
+    def read_numbers(self, count, vartype, typecode):
+        begin = self.pos
+        res = array.array(typecode)
+        try:
+            for parts in self.token_blocks(count):
+                done = len(res)
+                try:
+                    res.extend(map(vartype, parts))
+                except OverflowError:
+                    # Integers which do not fit in 64 bits are kept in a list
+                    res = list(res[:done])
+                    res.extend(map(vartype, parts))
+        except ValueError:
+            raise ValueError('expected %d %ss after %s' % (count, vartype.__name__, self.where(begin)))
+        return res
+    def read_ints(self, count):
+        """read_ints(count): Reads count integers into an array.array (or a
+        list, if they do not fit in 64 bits), which starts index from [0]."""
+        return self.read_numbers(count, int, 'q')
+    def read_floats(self, count):
+        """read_floats(count): Reads count floating point numbers into an
+        array.array, which starts index from [0]."""
+        return self.read_numbers(count, float, 'd')
+    def read_strs(self, count):
+        """read_strs(count): Reads count strings into a list, which starts index
+        from [0]."""
+        res = []
+        for parts in self.token_blocks(count):
+            res.extend(part.decode(self.encoding) for part in parts)
+        return res
+    def read_list(self, length, vartype=int):
+        """read_list(length, vartype=int): Reads a list written by printf(), in
+        the same form as rand(list, length, vartype, ...), which starts index
+        from [1]."""
+        readers = {int: self.read_ints, float: self.read_floats, str: self.read_strs}
+        if vartype not in readers:
+            raise ValueError('unsupported type, candidates: int, float, str')
+        return [None] + list(readers[vartype](length))
+    def read_matrix(self, rows, columns, vartype=int):
+        """read_matrix(rows, columns, vartype=int): Reads a matrix written by
+        printf(), which starts index from [1][1]."""
+        readers = {int: self.read_ints, float: self.read_floats, str: self.read_strs}
+        if vartype not in readers:
+            raise ValueError('unsupported type, candidates: int, float, str')
+        return matrix(rows, columns, readers[vartype](rows * columns))
+    def scanf(self, fmt_str):
+        """scanf(fmt_str): See scanf()."""
+        if self.data is None:
+            self.open()
+        res = []
+        for step, literal in compile_scanf(fmt_str):
+            if step == 'space':
+                self.pos = scanf_patterns['space'].match(self.data, self.pos).end()
+            elif step == 'literal':
+                if self.data[self.pos:self.pos+len(literal)] != literal:
+                    raise ValueError('expected %r at %s' % (literal.decode(), self.where()))
+                self.pos += len(literal)
+            elif step == 'char':
+                if self.pos >= len(self.data):
+                    raise EOFError('unexpected end of input at %s' % self.where())
+                res.append(self.data[self.pos:self.pos+1].decode('latin-1'))
+                self.pos += 1
+            elif step == 'int':
+                res.append(int(self.match('int')))
+            elif step == 'hex':
+                res.append(int(self.match('hex'), 16))
+            elif step == 'float':
+                res.append(float(self.match('float')))
+            else:
+                res.append(self.match('str').decode(self.encoding))
+        return res[0] if len(res) == 1 else tuple(res)
+    pass
+
+input_stack = [Scanner()]
+
+def scanner(target=None, encoding='utf-8'):
+    """scanner(target=None, encoding='utf-8'): Creates an input source for
+    scanf(), to be used along with the 'with' statement:
+
+        with scanner('1.in') as sc:
+            n = scanf('%d')
+            a = sc.read_list(n, int)
+
+    The target may be None (sys.stdin), a file path, a file object or bytes.
+    Files are memory mapped (or decompressed into memory if the path ends with
+    '.gz' or '.xz') and parsed without being split into lines. Besides
+    scanf(), the scanner reads numbers in bulk with read_ints(count) and
+    read_floats(count), and reads back the lists and matrices written by
+    printf() with read_list() and read_matrix()."""
+    return Scanner(target, encoding)
+
+def scanf(fmt_str):
+    """scanf(fmt_str): C++ styled input function, which reads from the current
+    scanner (defaults to sys.stdin) in the format of printf(). Conversions %d,
+    %u, %i, %x, %f, %e, %g (with optional l / ll), %s and %c are supported,
+    whitespace in the format skips any whitespace, and other characters should
+    match exactly. Returns the value if there is only one conversion, or a
+    tuple of the values otherwise."""
+    return input_stack[-1].scanf(fmt_str)
+
+class ValidationError(ValueError):
+    """ValidationError(message, line, column): A violation of the constraints
+    found by a Validator, at said line and column of the input."""
+    def __init__(self, message, line, column):
+        ValueError.__init__(self, '%s at line %d, column %d' % (message, line, column))
+        self.line = line
+        self.column = column
+        return
+    pass
+
+validate_patterns = {
+    'token': re.compile(rb'[^\s]+'),
+    'word': re.compile(rb'[^\s]*'),
+    'float': re.compile(rb'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'),
+}
+
+class Validator(Scanner):
+    """Validator(target, encoding): Checks an input against the constraints
+    described in the same syntax as rand(). See validator() for details."""
+    def __enter__(self):
+        self.open()
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.finish()
+        finally:
+            self.close()
+        return False
+    def fail(self, message, pos=None):
+        """fail(message, pos=None): Raises a ValidationError at pos (defaults to
+        the current position)."""
+        line, column = locate(self.data, self.pos if pos is None else pos)
+        raise ValidationError(message, line, column)
+    def token(self):
+        """token(): Reads a token (without skipping any whitespace), returns it
+        in bytes along with its position."""
+        if self.data is None:
+            self.open()
+        begin = self.pos
+        m = validate_patterns['token'].match(self.data, begin)
+        if m is None:
+            if begin >= len(self.data):
+                self.fail('unexpected end of input')
+            self.fail('expected a token, found %r' % self.data[begin:begin+1].decode('latin-1'))
+        self.pos = m.end()
+        return m.group(), begin
+    def literal(self, expected, note):
+        if self.data is None:
+            self.open()
+        if self.data[self.pos:self.pos+len(expected)] != expected:
+            if self.pos >= len(self.data):
+                self.fail('expected %s, found end of input' % note)
+            self.fail('expected %s, found %r' % (note, self.data[self.pos:self.pos+1].decode('latin-1')))
+        self.pos += len(expected)
+        return
+    def space(self):
+        """space(): Expects a single space."""
+        self.literal(b' ', 'a space')
+        return
+    def eol(self):
+        """eol(): Expects the end of a line."""
+        self.literal(b'\n', 'end of line')
+        return
+    def finish(self):
+        """finish(): Expects the end of input."""
+        if self.data is None:
+            self.open()
+        if self.pos < len(self.data):
+            self.fail('expected end of input, found %r' % self.data[self.pos:self.pos+1].decode('latin-1'))
+        return
+    def expect(self, *args):
+        """expect(...): Reads an item described in the syntax of rand(), and
+        checks if it could have been created by rand(...). Returns the value
+        of numbers, strings and choices, or None for lists and matrices, which
+        are checked item by item without being kept."""
+        return check_plan(*args)(self)
+    def int_list(self, count, low, high):
+        """int_list(count, low, high): Expects count integers within [low, high]
+        separated with single spaces. Blocks of the list are checked in bulk,
+        and only checked again item by item if anything is wrong, to find out
+        where the violation is."""
+        data, size = self.data, len(self.data)
+        check = check_plan(int, low, high)
+        done = 0
+        while done < count:
+            if done > 0:
+                if data[self.pos:self.pos+1] != b' ':
+                    self.fail('expected %d items, found only %d' % (count, done))
+                self.pos += 1
+            begin = self.pos
+            # Extends the block to the end of the token cut by the block
+            end = validate_patterns['word'].match(data, min(begin + 1048576, size)).end()
+            block = data[begin:end]
+            newline = block.find(b'\n')
+            if newline >= 0:
+                block = block[:newline]
+            parts = block.split(b' ', count - done)
+            if len(parts) > count - done:
+                block = block[:len(block)-len(parts.pop())-1]
+            try:
+                vals = list(map(int, parts))
+                valid = min(vals) >= low and max(vals) <= high and ' '.join(map(str, vals)).encode() == block
+            except ValueError:
+                valid = False
+            if not valid:
+                # Finds out the violation item by item
+                self.pos = begin
+                for i in range(0, len(parts)):
+                    if i > 0:
+                        self.space()
+                    check(self)
+                self.fail('expected %d items, found only %d' % (count, done + len(parts)))
+            self.pos = begin + len(block)
+            done += len(parts)
+        return
+    def edges(self, count, n, weight=None, connected=False, simple=False, directed=False):
+        """edges(count, n, weight=None, connected=False, simple=False,
+        directed=False): Expects count lines of edges 'u v' (or 'u v w' if the
+        weight is described in a tuple like (int, 1, 10**9)) between vertices
+        [1, n]. Checks if the graph is connected (ignoring the directions), or
+        if it is simple (without self loops or duplicate edges), if told so.
+        Memory used is O(n), or O(count) for simple graphs."""
+        vertex = check_plan(int, 1, n)
+        weight = check_plan(*weight) if weight is not None else None
+        parent = array.array('q', range(0, n + 1)) if connected else None
+        components = n
+        seen = set() if simple else None
+        for i in range(0, count):
+            begin = self.pos
+            u = vertex(self)
+            self.space()
+            v = vertex(self)
+            if weight is not None:
+                self.space()
+                weight(self)
+            if seen is not None:
+                if u == v:
+                    self.fail('unexpected self loop %d-%d' % (u, v), begin)
+                key = (u, v) if directed or u < v else (v, u)
+                if key in seen:
+                    self.fail('duplicate edge %d-%d' % (u, v), begin)
+                seen.add(key)
+            if parent is not None:
+                # Union-find with path halving
+                while parent[u] != u:
+                    parent[u] = parent[parent[u]]
+                    u = parent[u]
+                while parent[v] != v:
+                    parent[v] = parent[parent[v]]
+                    v = parent[v]
+                if u != v:
+                    parent[u] = v
+                    components -= 1
+            self.eol()
+        if parent is not None and components > 1:
+            self.fail('expected a connected graph, found %d components' % components)
+        return
+    pass
+
+def validator(target=None, encoding='utf-8'):
+    """validator(target=None, encoding='utf-8'): Creates a validator of the
+    input at target (see scanner() for the candidates), which checks the
+    layout and constraints of the input in a single pass:
+
+        with validator('1.in') as v:
+            n = v.expect(int, 1, 10**5)
+            v.space()
+            m = v.expect(int, 0, 10**5)
+            v.eol()
+            v.expect(list, n, int, 1, 10**9)
+            v.eol()
+            v.edges(m, n, weight=(int, 1, 100), connected=True)
+
+    Items are described by v.expect(...) in the same syntax as rand(...),
+    e.g. (str, 'ab', 1, 10) or ((list, list), (rows, columns), int, 0, 1).
+    Whitespace is strict: tokens are separated with single spaces by space(),
+    lines end with eol(), and the input should end right after the last item
+    when the 'with' statement ends. The first violation raises a
+    ValidationError with its line and column. Lists are checked without being
+    kept, so the memory used is bounded regardless of the size of input."""
+    return Validator(target, encoding)
+
+def compile_check(*args):
+    """compile_check(...): Compiles the description of an item (in the syntax of
+    rand()) into a function which reads the item from a Validator, checks it,
+    and returns its value."""
+    args = list(args)
+    if len(args) <= 0:
+        args.append(int)
+    # Structured arrays
+    if args[0] is permutation:
+        if len(args) < 2:
+            raise ValueError('expected array length, candidates: function(permutation, ...)')
+        if type(args[1]) == int:
+            return check_plan(set, args[1], int, 1, args[1])
+        items = as_sequence(args[1])
+        return check_plan(set, len(items), items)
+    if args[0] is sorted or args[0] is sum or args[0] is step:
+        sampler, length = compile_shape(args[0], args[1:])
+        if args[0] is sorted:
+            item = check_plan(*args[2:])
+        elif args[0] is step:
+            item = check_plan(int, args[3], args[4])
+        else:
+            total = args[2] if type(args[2]) == tuple else (args[2], args[2])
+            low_bnd = args[3] if len(args) >= 4 else 0
+            upr_bnd = args[4] if len(args) >= 5 else total[1] - (length - 1) * low_bnd
+            item = check_plan(int, low_bnd, upr_bnd)
+        def check(v):
+            begin = v.pos
+            last = None
+            for i in range(0, length):
+                if i > 0:
+                    v.space()
+                pos = v.pos
+                val = item(v)
+                if args[0] is sorted and last is not None and val < last:
+                    v.fail('expected non-decreasing items, found %r after %r' % (val, last), pos)
+                if args[0] is step and last is not None and abs(val - last) > args[2]:
+                    v.fail('expected a step of at most %d, found %r after %r' % (args[2], val, last), pos)
+                last = val if args[0] is not sum else (last or 0) + val
+            if args[0] is sum and not total[0] <= last <= total[1]:
+                v.fail('sum %d out of range [%d, %d]' % (last, total[0], total[1]), begin)
+            return None
+        return check
+    # Choosing from a set
+    if type(args[0]) != type and (type(args[0]) != tuple or type(args[0][0]) != type):
+        objset = args[0].items if type(args[0]) == choice else args[0]
+        if not iterable(objset):
+            raise ValueError('unable to check set, candidates: function(iterable object)')
+        allowed = {str(item).encode(): item for item in objset}
+        def check(v):
+            tok, pos = v.token()
+            if tok not in allowed:
+                v.fail('unexpected item %r' % tok.decode('latin-1'), pos)
+            return allowed[tok]
+        return check
+    vartype, args = args[0], args[1:]
+    if vartype == int:
+        spec = parse_args_int(args)
+        def check(v):
+            tok, pos = v.token()
+            try:
+                val = int(tok)
+            except ValueError:
+                v.fail('expected an integer, found %r' % tok[:32].decode('latin-1'), pos)
+            if str(val).encode() != tok:
+                v.fail('expected an integer without leading zeros, found %r' % tok[:32].decode('latin-1'), pos)
+            if spec[0] == 'set' and val not in spec[1]:
+                v.fail('integer %d not in the set' % val, pos)
+            if spec[0] == 'range' and not spec[1] <= val <= spec[2]:
+                v.fail('integer %d out of range [%d, %d]' % (val, spec[1], spec[2]), pos)
+            return val
+        check.bounds = spec[1:] if spec[0] == 'range' else None
+        return check
+    elif vartype == float:
+        spec = parse_args_float(args)
+        def check(v):
+            tok, pos = v.token()
+            if validate_patterns['float'].fullmatch(tok) is None:
+                v.fail('expected a floating point number, found %r' % tok[:32].decode('latin-1'), pos)
+            val = float(tok)
+            if spec[0] == 'set' and val not in spec[1]:
+                v.fail('number %r not in the set' % val, pos)
+            if spec[0] == 'range' and not spec[1] <= val <= spec[2]:
+                v.fail('number %r out of range [%r, %r]' % (val, spec[1], spec[2]), pos)
+            return val
+        return check
+    elif vartype in {str, bytes}:
+        if vartype == bytes and len(args) >= 2 and type(args[0]) in {bytes, bytearray}:
+            args = [args[0].decode('latin-1')] + list(args[1:])
+        chrset, minlen, maxlen = parse_args_str(args)
+        narrow = all(ord(c) < 128 for c in chrset)
+        allowed = ''.join(chrset).encode() if narrow else set(chrset)
+        def check(v):
+            tok, pos = v.token()
+            if narrow:
+                val = tok
+                bad = tok.translate(None, allowed)
+            else:
+                try:
+                    val = tok.decode(v.encoding)
+                except UnicodeDecodeError:
+                    v.fail('expected characters in %s' % v.encoding, pos)
+                bad = ''.join(c for c in val if c not in allowed)
+            if bad:
+                idx = val.index(bad[0:1])
+                if narrow:
+                    v.fail('unexpected character %r' % chr(val[idx]), pos + idx)
+                v.fail('unexpected character %r' % val[idx], pos + len(val[:idx].encode(v.encoding)))
+            if not minlen <= len(val) <= maxlen:
+                v.fail('string length %d out of range [%d, %d]' % (len(val), minlen, maxlen), pos)
+            if vartype == bytes:
+                return val if narrow else val.encode(v.encoding)
+            return val.decode('latin-1') if narrow else val
+        return check
+    elif vartype in {list, tuple, set}:
+        if len(args) <= 0:
+            raise ValueError('expected array length, candidates: function(list, ...)')
+        length = check_type_int(args[0], 'array length')
+        if length < 1:
+            raise ValueError('length should not be too short')
+        item = check_plan(*args[1:])
+        bounds = getattr(item, 'bounds', None)
+        def check(v):
+            if bounds is not None and vartype != set:
+                v.int_list(length, bounds[0], bounds[1])
+                return None
+            seen = set()
+            for i in range(0, length):
+                if i > 0:
+                    v.space()
+                pos = v.pos
+                val = item(v)
+                if vartype == set:
+                    if val in seen:
+                        v.fail('duplicate item %r' % (val,), pos)
+                    seen.add(val)
+            return None
+        return check
+    elif vartype == (list, list):
+        if len(args) <= 0 or len(args[0]) != 2:
+            raise ValueError('expected matrix size, candidates: function((list, list), ...)')
+        rows = check_type_int(args[0][0], 'matrix rows')
+        cols = check_type_int(args[0][1], 'matrix columns')
+        row = check_plan(list, cols, *args[1:])
+        def check(v):
+            for i in range(0, rows):
+                if i > 0:
+                    v.eol()
+                row(v)
+            return None
+        return check
+    raise ValueError('unsupported type, candidates: function(int / float / str / bytes / list / tuple / set / (list, list) / iterable object, ...)')
+
+@functools.lru_cache(maxsize=256, typed=True)
+def cached_check_plan(*args):
+    """cached_check_plan(...): compile_check() with a bounded LRU cache."""
+    return compile_check(*args)
+
+def check_plan(*args):
+    """check_plan(...): Returns the compiled check of the arguments, which is
+    cached just like spec_plan()."""
+    try:
+        return cached_check_plan(*args)
+    except TypeError:
+        return compile_check(*args)
+
 ################################################################################
 
 def check_vartype(val, vartype, note, varnote):
@@ -92,72 +1034,95 @@ def iterable(object):
     """iterable(object): Returns if object is iterable."""
     return hasattr(object, '__iter__')
 
+def as_sequence(object):
+    """as_sequence(object): Returns object itself if it is an immutable
+    sequence which could be indexed in place (tuple, str, bytes and range),
+    otherwise copies it into a tuple, so that compiled specs and generators
+    are not affected when a list given to them is modified later."""
+    if isinstance(object, (tuple, str, bytes, range)):
+        return object
+    return tuple(object)
+
 ################################################################################
 
 class DequeTemplate:
-    class Element:
-        def __init__(self, data=None):
-            self.data = data
-            self.left = None
-            self.right = None
-        pass
-    def link_element(self, l_element, r_element):
-        l_element.right = r_element
-        r_element.left = l_element
-        return
-    def __init__(self):
-        self.l_elem = None
-        self.r_elem = None
+    """DequeTemplate(capacity=16): A double-ended queue stored in a ring buffer,
+    which grows twice as large when it is full. Pushing and popping at both
+    ends costs O(1) amortized, and no objects are created per item."""
+    def __init__(self, capacity=16):
+        capacity = max(capacity, 1)
+        capacity = 1 << (capacity - 1).bit_length()
+        self.buffer = [None] * capacity
+        self.mask = capacity - 1
+        self.head = 0
         self.size = 0
         return
+    def grow(self, capacity=0):
+        # Rearranges the items into [0, size) of a buffer twice as large, or
+        # large enough for capacity items
+        buffer = self.buffer
+        capacity = 1 << (max(capacity, 2 * len(buffer)) - 1).bit_length()
+        self.buffer = buffer[self.head:] + buffer[:self.head] + [None] * (capacity - len(buffer))
+        self.mask = capacity - 1
+        self.head = 0
+        return
     def push_left(self, data):
-        el = self.Element(data)
-        if self.size > 0:
-            self.link_element(el, self.l_elem)
-            self.l_elem = el
-        else:
-            self.l_elem = el
-            self.r_elem = el
+        if self.size > self.mask:
+            self.grow()
+        self.head = (self.head - 1) & self.mask
+        self.buffer[self.head] = data
         self.size += 1
         return
     def push_right(self, data):
-        el = self.Element(data)
-        if self.size > 0:
-            self.link_element(self.r_elem, el)
-            self.r_elem = el
-        else:
-            self.l_elem = el
-            self.r_elem = el
+        if self.size > self.mask:
+            self.grow()
+        self.buffer[(self.head + self.size) & self.mask] = data
         self.size += 1
         return
+    def extend_left(self, iterable):
+        # Pushes the items one by one to the left, so they end up reversed
+        items = list(iterable)
+        items.reverse()
+        if self.size + len(items) > self.mask + 1:
+            self.grow(self.size + len(items))
+        # Copies the items in at most two slices
+        pos = (self.head - len(items)) & self.mask
+        first = min(len(items), self.mask + 1 - pos)
+        self.buffer[pos:pos+first] = items[:first]
+        self.buffer[0:len(items)-first] = items[first:]
+        self.head = pos
+        self.size += len(items)
+        return
+    def extend_right(self, iterable):
+        items = list(iterable)
+        if self.size + len(items) > self.mask + 1:
+            self.grow(self.size + len(items))
+        # Copies the items in at most two slices
+        pos = (self.head + self.size) & self.mask
+        first = min(len(items), self.mask + 1 - pos)
+        self.buffer[pos:pos+first] = items[:first]
+        self.buffer[0:len(items)-first] = items[first:]
+        self.size += len(items)
+        return
     def get_left(self):
         if self.size <= 0:
             raise ValueError('cannot get from empty list')
-        return self.l_elem.data
+        return self.buffer[self.head]
     def get_right(self):
         if self.size <= 0:
             raise ValueError('cannot get from empty list')
-        return self.r_elem.data
+        return self.buffer[(self.head + self.size - 1) & self.mask]
     def pop_left(self):
         if self.size <= 0:
             raise ValueError('cannot pop from empty list')
-        if self.l_elem.right:
-            self.l_elem.right.left = None
-            self.l_elem = self.l_elem.right
-        else:
-            self.l_elem = None
-            self.r_elem = None
+        self.buffer[self.head] = None
+        self.head = (self.head + 1) & self.mask
         self.size -= 1
         return
     def pop_right(self):
         if self.size <= 0:
             raise ValueError('cannot pop from empty list')
-        if self.r_elem.left:
-            self.r_elem.left.right = None
-            self.r_elem = self.r_elem.left
-        else:
-            self.l_elem = None
-            self.r_elem = None
+        self.buffer[(self.head + self.size - 1) & self.mask] = None
         self.size -= 1
         return
     def is_empty(self):
@@ -165,10 +1130,19 @@ class DequeTemplate:
     def get_size(self):
         return self.size
     def clear(self):
-        self.l_elem = None
-        self.r_elem = None
-        self.empty = True
+        self.buffer = [None] * 16
+        self.mask = 15
+        self.head = 0
+        self.size = 0
         return
+    def __iter__(self):
+        # Iterates from left to right
+        end = self.head + self.size
+        if end <= self.mask + 1:
+            return iter(self.buffer[self.head:end])
+        return itertools.chain(self.buffer[self.head:], self.buffer[:end-self.mask-1])
+    def __reversed__(self):
+        return reversed(list(iter(self)))
     pass
 
 class deque:
@@ -183,6 +1157,10 @@ class deque:
         return self.deque_base.push_left(data)
     def push_back(self, data):
         return self.deque_base.push_right(data)
+    def extend_front(self, iterable):
+        return self.deque_base.extend_left(iterable)
+    def extend(self, iterable):
+        return self.deque_base.extend_right(iterable)
     def front(self):
         return self.deque_base.get_left()
     def back(self):
@@ -205,6 +1183,9 @@ class deque:
         return self.deque_base.get_size()
     def clear(self):
         return self.deque_base.clear()
+    def __iter__(self):
+        # From front to back
+        return iter(self.deque_base)
     pass
 
 class queue:
@@ -217,6 +1198,8 @@ class queue:
         return 'queue(front: %s, size: %d)' % (self.deque_base.get_right(), self.deque_base.get_size())
     def push(self, data):
         return self.deque_base.push_left(data)
+    def extend(self, iterable):
+        return self.deque_base.extend_left(iterable)
     def front(self):
         return self.deque_base.get_right()
     def pop(self):
@@ -231,6 +1214,9 @@ class queue:
         return self.deque_base.get_size()
     def clear(self):
         return self.deque_base.clear()
+    def __iter__(self):
+        # From front to back
+        return reversed(self.deque_base)
     pass
 
 class stack:
@@ -243,13 +1229,15 @@ class stack:
         return 'stack(top: %s, size: %d)' % (self.deque_base.get_left(), self.deque_base.get_size())
     def push(self, data):
         return self.deque_base.push_left(data)
+    def extend(self, iterable):
+        return self.deque_base.extend_left(iterable)
     def top(self):
         return self.deque_base.get_left()
     def pop(self):
         return self.deque_base.pop_left()
     def get(self):
-        data = self.deque_base.get_right()
-        self.deque_base.pop_right()
+        data = self.deque_base.get_left()
+        self.deque_base.pop_left()
         return data
     def empty(self):
         return self.deque_base.is_empty()
@@ -257,9 +1245,16 @@ class stack:
         return self.deque_base.get_size()
     def clear(self):
         return self.deque_base.clear()
+    def __iter__(self):
+        # From top to bottom
+        return iter(self.deque_base)
     pass
 
 class GraphTemplate:
+    """GraphTemplate(n=0, simple=False): A graph stored as parallel arrays of
+    edges (u, v, data), with a hash index from (u, v) to the edges for O(1)
+    lookups. Nodes are integers in [0, n] if n > 0, otherwise any hashable
+    objects. Simple graphs reject duplicate edges."""
     class Edge:
         def __init__(self, u, v, data):
             self.u = u
@@ -271,83 +1266,459 @@ class GraphTemplate:
                 return '(%s -> %s)' % (repr(self.u), repr(self.v))
             return '(%s -> %s : %s)' % (repr(self.u), repr(self.v), repr(self.data))
         def __add__(self, value):
-            return Edge(u, value.v, self.data + value.data)
+            return GraphTemplate.Edge(self.u, value.v, self.data + value.data)
+        pass
+    class CSR:
+        """CSR(offsets, targets, edge_ids): A frozen adjacency view in the
+        compressed sparse row format. The out-edges of node u are
+        edge_ids[offsets[u]:offsets[u+1]], leading to the nodes in
+        targets[offsets[u]:offsets[u+1]], in the order they were added."""
+        def __init__(self, offsets, targets, edge_ids):
+            self.offsets = offsets
+            self.targets = targets
+            self.edge_ids = edge_ids
+            return
+        def __len__(self):
+            return len(self.offsets) - 1
+        def neighbours(self, u):
+            return self.targets[self.offsets[u]:self.offsets[u+1]]
+        def out_edges(self, u):
+            return self.edge_ids[self.offsets[u]:self.offsets[u+1]]
+        def degree(self, u):
+            return self.offsets[u+1] - self.offsets[u]
         pass
-    def __init__(self, n=0):
+    def __init__(self, n=0, simple=False):
         self.n = n
         self.m = 0
+        self.simple = simple
         # Exception handling
         if type(n) != int or n < 0:
             raise ValueError('invalid number of nodes')
-        # If n = 0 here, then we create the edges and relations dynamically,
-        # instead of creating them statically.
+        # If n = 0 here, then nodes could be any objects, otherwise they are
+        # integers and are kept in compact arrays.
         if self.n == 0:
-            self.edges = {}
+            self.eu = []
+            self.ev = []
         else:
-            self.edges = {set()} * (self.n + 1)
-        # Done building (lazily)
+            self.eu = array.array('q')
+            self.ev = array.array('q')
+        self.ed = []
+        # Maps the key of (u, v) to an edge id, or a list of multi-edge ids
+        self.index = {}
+        self.csr_view = None
+        self.edges_view = None
+        return
+    def key(self, u, v):
+        if self.n == 0:
+            return (u, v)
+        return u * (self.n + 1) + v
+    def edge_ids(self, u, v):
+        ids = self.index.get(self.key(u, v), ())
+        if type(ids) == int:
+            return (ids,)
+        return ids
+    def find_edge(self, u, v, data=None):
+        """find_edge(u, v, data): Returns the id of an edge from u to v (whose
+        data equals to data if given), or -1 if there is none."""
+        for eid in self.edge_ids(u, v):
+            if data == None or self.ed[eid] == data:
+                return eid
+        return -1
+    def replace_id(self, key, old, new):
+        # Replaces (or removes, if new is None) an edge id in the index
+        ids = self.index[key]
+        if type(ids) == int:
+            if new is None:
+                del self.index[key]
+            else:
+                self.index[key] = new
+            return
+        ids.remove(old)
+        if new is not None:
+            ids.append(new)
+        if len(ids) == 1:
+            self.index[key] = ids[0]
         return
     def add_edge(self, u, v, data=None, directed=True):
         if not directed:
+            if self.simple and (self.find_edge(u, v) >= 0 or self.find_edge(v, u) >= 0):
+                return False
             self.add_edge(u, v, data, directed=True)
             self.add_edge(v, u, data, directed=True)
-            return
-        ed = self.Edge(u, v, data)
-        if self.n == 0:
-            if u not in self.edges:
-                self.edges[u] = set()
-        else:
-            if type(u) != int or u < 0 or u > n or type(v) != int or v < 0 or v > n:
+            return True
+        if self.n != 0:
+            if type(u) != int or u < 0 or u > self.n or type(v) != int or v < 0 or v > self.n:
                 raise ValueError('node id must be an integer')
-        self.edges[u].add(ed)
+        key = self.key(u, v)
+        ids = self.index.get(key)
+        if ids is not None and self.simple:
+            return False
+        eid = self.m
+        self.eu.append(u)
+        self.ev.append(v)
+        self.ed.append(data)
+        if ids is None:
+            self.index[key] = eid
+        elif type(ids) == int:
+            self.index[key] = [ids, eid]
+        else:
+            ids.append(eid)
         self.m += 1
+        self.csr_view = None
+        self.edges_view = None
+        return True
+    def add_edges(self, us, vs, datas=None, directed=True):
+        """add_edges(us, vs, datas, directed): Adds the edges (us[i], vs[i],
+        datas[i]) in bulk. Returns the number of edges added (duplicate edges
+        of simple graphs are skipped)."""
+        us, vs = list(us), list(vs)
+        datas = [None] * len(us) if datas is None else list(datas)
+        if len(us) != len(vs) or len(us) != len(datas):
+            raise ValueError('expected the same number of nodes and data')
+        if self.simple:
+            added = sum(self.add_edge(us[i], vs[i], datas[i], directed) for i in range(0, len(us)))
+            return added if directed else added * 2
+        if not directed:
+            # Each edge becomes two adjacent directed edges
+            us, vs = [x for e in zip(us, vs) for x in e], [x for e in zip(vs, us) for x in e]
+            datas = [x for d in datas for x in (d, d)]
+        if self.n != 0:
+            for u in itertools.chain(us, vs):
+                if type(u) != int or u < 0 or u > self.n:
+                    raise ValueError('node id must be an integer')
+        index = self.index
+        if self.n != 0:
+            width = self.n + 1
+            keys = [u * width + v for u, v in zip(us, vs)]
+        else:
+            keys = list(zip(us, vs))
+        eid = self.m
+        if len(set(keys)) == len(keys) and index.keys().isdisjoint(keys):
+            # No multi-edges are formed, so the index is updated at once
+            index.update(zip(keys, range(eid, eid + len(keys))))
+            eid += len(keys)
+        else:
+            for k in keys:
+                ids = index.get(k)
+                if ids is None:
+                    index[k] = eid
+                elif type(ids) == int:
+                    index[k] = [ids, eid]
+                else:
+                    ids.append(eid)
+                eid += 1
+        self.eu.extend(us)
+        self.ev.extend(vs)
+        self.ed.extend(datas)
+        self.m = eid
+        self.csr_view = None
+        self.edges_view = None
+        return len(us)
+    def delete_edge(self, eid):
+        """delete_edge(eid): Removes the edge of id eid, the last edge is moved
+        into its place."""
+        self.replace_id(self.key(self.eu[eid], self.ev[eid]), eid, None)
+        last = self.m - 1
+        if eid != last:
+            self.replace_id(self.key(self.eu[last], self.ev[last]), last, eid)
+            self.eu[eid] = self.eu[last]
+            self.ev[eid] = self.ev[last]
+            self.ed[eid] = self.ed[last]
+        self.eu.pop()
+        self.ev.pop()
+        self.ed.pop()
+        self.m -= 1
+        self.csr_view = None
+        self.edges_view = None
         return
     def remove_edge(self, u, v, data=None, directed=True):
         if not directed:
             self.remove_edge(u, v, data, directed=True)
             self.remove_edge(v, u, data, directed=True)
             return
-        if u not in self.edges:
-            return
-        for ed in self.edges[u]:
-            if ed.v == v:
-                if data == None or ed.data == data:
-                    self.edges[u].remove(ed)
-                    self.m -= 1
-                    break
+        eid = self.find_edge(u, v, data)
+        if eid >= 0:
+            self.delete_edge(eid)
         return
     def contains(self, u, v, data):
-        if u not in self.edges:
-            return False
-        for ed in self.edges[u]:
-            if ed.v == v:
-                if data == None or ed.data == data:
-                    return True
-        return False
+        return self.find_edge(u, v, data) >= 0
     def size(self):
         return self.m
+    def node_limit(self):
+        # The length of arrays indexed by nodes, which must be non-negative integers
+        if self.n != 0:
+            return self.n + 1
+        for u in itertools.chain(self.eu, self.ev):
+            if type(u) != int or u < 0:
+                raise ValueError('csr view requires non-negative integer nodes')
+        return max(itertools.chain(self.eu, self.ev, (0,))) + 1
+    def csr(self):
+        """csr(): Returns the frozen CSR view of the graph, which is rebuilt
+        only after the graph is modified. Nodes must be non-negative
+        integers."""
+        if self.csr_view is not None:
+            return self.csr_view
+        nodes = self.node_limit()
+        # Sorting is stable, so edges are kept in the order they were added
+        order = sorted(range(0, self.m), key=self.eu.__getitem__)
+        counts = [0] * (nodes + 1)
+        for u in self.eu:
+            counts[u + 1] += 1
+        offsets = array.array('q', itertools.accumulate(counts))
+        targets = array.array('q', map(self.ev.__getitem__, order))
+        self.csr_view = self.CSR(offsets, targets, array.array('q', order))
+        return self.csr_view
+    def adjacency(self, weighted=False):
+        """adjacency(weighted): Returns the CSR view as plain lists (offsets,
+        targets), along with the weight of each entry of targets if weighted,
+        where edges without data weigh 1. Nodes count from 1 if n > 0."""
+        view = self.csr()
+        offsets, targets = view.offsets.tolist(), view.targets.tolist()
+        if not weighted:
+            return offsets, targets
+        ed = self.ed
+        weights = [1 if d is None else d for d in map(ed.__getitem__, view.edge_ids)]
+        return offsets, targets, weights
+    def nodes(self):
+        """nodes(): Returns the nodes in increasing order, which are [1, n] if
+        n > 0 (and node 0 as well, if any edge uses it), otherwise the nodes
+        that occur in any edge."""
+        if self.n != 0:
+            return range(0 if 0 in self.eu or 0 in self.ev else 1, self.n + 1)
+        return sorted(set(self.eu).union(self.ev))
+    def first_node(self):
+        # The default source of searches
+        nodes = self.nodes()
+        if len(nodes) == 0:
+            raise ValueError('graph has no nodes')
+        return nodes[0]
+    def bfs(self, source):
+        """bfs(source): Returns the list of the numbers of edges on the shortest
+        paths from source (a node, or a list of nodes) to every node, or -1 for
+        unreachable nodes."""
+        offsets, targets = self.adjacency()
+        dist = [-1] * (len(offsets) - 1)
+        que = [source] if type(source) == int else list(source)
+        for s in que:
+            dist[s] = 0
+        # The list grows while being iterated, which makes it the queue
+        for u in que:
+            du = dist[u] + 1
+            for v in targets[offsets[u]:offsets[u+1]]:
+                if dist[v] < 0:
+                    dist[v] = du
+                    que.append(v)
+        return dist
+    def dijkstra(self, source):
+        """dijkstra(source): Returns the list of the lengths of the shortest
+        paths from source (a node, or a list of nodes) to every node, or -1 for
+        unreachable nodes. Edge data are the weights (1 if None), which should
+        not be negative."""
+        offsets, targets, weights = self.adjacency(True)
+        dist = [-1] * (len(offsets) - 1)
+        done = bytearray(len(offsets) - 1)
+        heap = []
+        for s in ([source] if type(source) == int else source):
+            dist[s] = 0
+            heap.append((0, s))
+        heapq.heapify(heap)
+        heappush, heappop = heapq.heappush, heapq.heappop
+        while heap:
+            du, u = heappop(heap)
+            if done[u]:
+                continue
+            done[u] = 1
+            for i in range(offsets[u], offsets[u+1]):
+                v = targets[i]
+                dv = du + weights[i]
+                if dist[v] < 0 or dv < dist[v]:
+                    dist[v] = dv
+                    heappush(heap, (dv, v))
+        return dist
+    def components(self):
+        """components(): Returns (count, labels), where labels[u] is the index
+        (from 1) of the (weakly) connected component of node u, numbered in
+        the order of their smallest nodes. Uses a disjoint set union over the
+        edges, so the direction of edges does not matter."""
+        uf = list(range(0, self.node_limit()))
+        for u, v in zip(self.eu, self.ev):
+            # Path halving on both ends
+            while uf[u] != u:
+                uf[u] = u = uf[uf[u]]
+            while uf[v] != v:
+                uf[v] = v = uf[uf[v]]
+            if u < v:
+                uf[v] = u
+            elif v < u:
+                uf[u] = v
+        labels = [0] * len(uf)
+        count = 0
+        for u in self.nodes():
+            # Every node links to a smaller one of its set (labelled before),
+            # except for the smallest one
+            p = uf[u]
+            if p == u:
+                count += 1
+                labels[u] = count
+            else:
+                labels[u] = labels[p]
+        return count, labels
+    def toposort(self):
+        """toposort(): Returns the nodes in a topological order (Kahn's
+        algorithm, where nodes of no incoming edges are taken from the
+        smallest). Raises ValueError if the graph contains a cycle."""
+        offsets, targets = self.adjacency()
+        indegree = [0] * (len(offsets) - 1)
+        for v in targets:
+            indegree[v] += 1
+        nodes = self.nodes()
+        # The order grows while being iterated, which makes it the queue
+        order = [u for u in nodes if indegree[u] == 0]
+        for u in order:
+            for v in targets[offsets[u]:offsets[u+1]]:
+                indegree[v] -= 1
+                if indegree[v] == 0:
+                    order.append(v)
+        if len(order) != len(nodes):
+            raise ValueError('graph contains a cycle')
+        return order
+    def tree_distances(self, source, offsets, targets, weights):
+        # Distances in a tree (or forest), where the path to each node is unique
+        dist = [-1] * (len(offsets) - 1)
+        dist[source] = 0
+        stack = [source]
+        while stack:
+            u = stack.pop()
+            du = dist[u]
+            for i in range(offsets[u], offsets[u+1]):
+                v = targets[i]
+                if dist[v] < 0 and v != source:
+                    dist[v] = du + weights[i]
+                    stack.append(v)
+        return dist
+    def tree_diameter(self, source=None):
+        """tree_diameter(source=None): Returns (length, u, v), where the path
+        from u to v is the longest one of the tree containing source (defaults
+        to the first node). Edge data are the weights (1 if None), which should
+        not be negative. Edges should be undirected."""
+        offsets, targets, weights = self.adjacency(True)
+        if source is None:
+            source = self.first_node()
+        dist = self.tree_distances(source, offsets, targets, weights)
+        u = max(range(0, len(dist)), key=dist.__getitem__)
+        dist = self.tree_distances(u, offsets, targets, weights)
+        v = max(range(0, len(dist)), key=dist.__getitem__)
+        return dist[v], u, v
+    def lca(self, pairs, root=None):
+        """lca(pairs, root=None): Returns the list of the lowest common ancestors
+        of each pair (u, v) in pairs, in the tree rooted at root (defaults to the
+        first node), or -1 if either node is not in the tree. Answers all the
+        pairs at once with Tarjan's offline algorithm, without recursion."""
+        offsets, targets = self.adjacency()
+        if root is None:
+            root = self.first_node()
+        size = len(offsets) - 1
+        # A preorder of the tree, whose reverse is a postorder
+        parent = list(range(0, size))
+        visited = bytearray(size)
+        visited[root] = 1
+        order = []
+        stack = [root]
+        while stack:
+            u = stack.pop()
+            order.append(u)
+            for v in targets[offsets[u]:offsets[u+1]]:
+                if not visited[v]:
+                    visited[v] = 1
+                    parent[v] = u
+                    stack.append(v)
+        # Both ends of each pair are linked to the list of their queries
+        pairs = list(pairs)
+        us = [u for u, v in pairs]
+        vs = [v for u, v in pairs]
+        others = vs + us
+        head = [-1] * size
+        link = [-1] * len(others)
+        for i, u in enumerate(itertools.chain(us, vs)):
+            link[i] = head[u]
+            head[u] = i
+        res = [-1] * len(pairs)
+        uf = list(range(0, size))
+        finished = bytearray(size)
+        for u in reversed(order):
+            finished[u] = 1
+            i = head[u]
+            while i >= 0:
+                v = others[i]
+                if finished[v]:
+                    # The set of v is led by its lowest ancestor not finished
+                    while uf[v] != v:
+                        uf[v] = uf[uf[v]]
+                        v = uf[v]
+                    res[i % len(pairs)] = v
+                i = link[i]
+            uf[u] = parent[u]
+        return res
+    def __iter__(self):
+        for eid in range(0, self.m):
+            yield (self.eu[eid], self.ev[eid], self.ed[eid])
+        return
+    @property
+    def edges(self):
+        """A snapshot of the edges as {u: set of Edge}, kept only for
+        compatibility. It is built once and rebuilt only after the graph is
+        modified, just like the CSR view."""
+        if self.edges_view is not None:
+            return self.edges_view
+        res = {}
+        for u, v, data in self:
+            if u not in res:
+                res[u] = set()
+            res[u].add(self.Edge(u, v, data))
+        self.edges_view = res
+        return res
     pass
 
 class graph:
-    def __init__(self, n=0):
-        self.graph_temp = GraphTemplate(n)
-        self.edges = self.graph_temp.edges
+    def __init__(self, n=0, simple=False):
+        self.graph_temp = GraphTemplate(n, simple)
         return
     def __repr__(self):
         if self.graph_temp.m == 0:
             return 'graph{}'
         pool = []
-        for i in self.edges:
-            for j in self.edges[i]:
-                pool.append(repr(j))
+        for u, v, data in self.graph_temp:
+            pool.append(repr(GraphTemplate.Edge(u, v, data)))
         pool.sort()
         return 'graph{' + ', '.join(s for s in pool) + '}'
+    @property
+    def edges(self):
+        return self.graph_temp.edges
     def add_edge(self, u, v, data=None, directed=True):
         return self.graph_temp.add_edge(u, v, data, directed)
+    def add_edges(self, us, vs, datas=None, directed=True):
+        return self.graph_temp.add_edges(us, vs, datas, directed)
     def remove_edge(self, u, v, data=None, directed=True):
         return self.graph_temp.remove_edge(u, v, data, directed)
     def size(self):
         return self.graph_temp.size()
+    def csr(self):
+        return self.graph_temp.csr()
+    def bfs(self, source):
+        return self.graph_temp.bfs(source)
+    def dijkstra(self, source):
+        return self.graph_temp.dijkstra(source)
+    def components(self):
+        return self.graph_temp.components()
+    def toposort(self):
+        return self.graph_temp.toposort()
+    def tree_diameter(self, source=None):
+        return self.graph_temp.tree_diameter(source)
+    def lca(self, pairs, root=None):
+        return self.graph_temp.lca(pairs, root)
+    def __iter__(self):
+        # Yields (u, v, data) of each edge
+        return iter(self.graph_temp)
     def __contains__(self, u_v_pair):
         if len(u_v_pair) == 2:
             u, v = u_v_pair
@@ -361,40 +1732,197 @@ class graph:
 
 ################################################################################
 
-def generator_range_int(lower_bound=1, upper_bound=1):
-    """generator_range_int(lower_bound, upper_bound) -- A generator that
-    infinitely chooses a number in the range [lower_bound, upper_bound]"""
+class RandomBackend:
+    """RandomBackend(source=None): The source of randomness all generators draw
+    from. If source is None, the global instance of the random module is used,
+    so that random.seed() takes effect. If source is a random.Random instance,
+    it is used instead, otherwise a new random.Random is seeded with source.
+
+    Methods are bound once when created, generators then keep local references
+    to them instead of looking them up on every draw."""
+    def __init__(self, source=None):
+        if source is None:
+            self.random = random.random
+            self.getrandbits = random.getrandbits
+        else:
+            if not isinstance(source, random.Random):
+                source = random.Random(source)
+            self.random = source.random
+            self.getrandbits = source.getrandbits
+        return
+    def randbelow(self, n):
+        """randbelow(n): Chooses an integer in [0, n) without bias, with as
+        many random bits as needed, even for very large n."""
+        k = (n - 1).bit_length()
+        r = self.getrandbits(k)
+        while r >= n:
+            r = self.getrandbits(k)
+        return r
+    def shuffle(self, lst):
+        """shuffle(lst): Shuffles the list in place (Fisher-Yates)."""
+        getrandbits = self.getrandbits
+        for i in range(len(lst) - 1, 0, -1):
+            k = i.bit_length()
+            j = getrandbits(k)
+            while j > i:
+                j = getrandbits(k)
+            lst[i], lst[j] = lst[j], lst[i]
+        return
+    def numpy_generator(self):
+        """numpy_generator(): Creates a NumPy random generator seeded from this
+        backend, so that the results are still reproducible."""
+        if numpy is None:
+            raise ValueError('numpy backend is not available, install numpy first')
+        return numpy.random.default_rng(self.getrandbits(64))
+    pass
+
+random_backend = RandomBackend()
+
+def get_backend():
+    """get_backend(): Returns the current RandomBackend."""
+    return random_backend
+
+def set_backend(backend):
+    """set_backend(backend): Makes all generators created afterwards draw from
+    backend, which is a RandomBackend or anything accepted by RandomBackend().
+    Existing generators from xrand() keep drawing from the previous one."""
+    global random_backend
+    if not isinstance(backend, RandomBackend):
+        backend = RandomBackend(backend)
+    random_backend = backend
+    # Compiled plans keep generators bound to the previous backend
+    spec_cache_clear()
+    return backend
+
+@contextlib.contextmanager
+def use_backend(backend):
+    """use_backend(backend): Context manager which temporarily replaces the
+    current backend, see set_backend()."""
+    previous = random_backend
+    set_backend(backend)
+    try:
+        yield random_backend
+    finally:
+        set_backend(previous)
+    return
+
+@contextlib.contextmanager
+def seeded_random(seed):
+    """seeded_random(seed): Context manager which reseeds the random module
+    with seed, and restores the original random state on leaving."""
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+    return
+
+def generator_range_int(lower_bound=1, upper_bound=1, rng=None):
+    """generator_range_int(lower_bound, upper_bound, rng) -- A generator that
+    infinitely chooses a number in the range [lower_bound, upper_bound]
+    uniformly, drawing from rng (or the current backend)."""
     if upper_bound < lower_bound:
         raise ValueError('upper bound should not be less than the lower bound')
+    getrandbits = (rng or random_backend).getrandbits
+    span = upper_bound - lower_bound + 1
+    k = (span - 1).bit_length()
     while True:
-        res = int(random.random() * (upper_bound - lower_bound + 1)) + lower_bound
-        yield res
+        res = getrandbits(k)
+        while res >= span:
+            res = getrandbits(k)
+        yield res + lower_bound
     return 0
 
-def generator_range_float(lower_bound=0.0, upper_bound=1.0):
-    """generator_range_float(lower_bound, upper_bound) -- A generator that
-    infinitely chooses a number in the range (lower_bound, upper_bound)"""
+def generator_range_float(lower_bound=0.0, upper_bound=1.0, rng=None):
+    """generator_range_float(lower_bound, upper_bound, rng) -- A generator that
+    infinitely chooses a number in the range (lower_bound, upper_bound),
+    drawing from rng (or the current backend)."""
     if upper_bound < lower_bound:
         raise ValueError('upper bound should not be less than the lower bound')
+    rnd = (rng or random_backend).random
+    span = upper_bound - lower_bound
     while True:
-        res = float(random.random() * (upper_bound - lower_bound) + lower_bound)
+        res = float(rnd() * span + lower_bound)
         yield res
     return 0.0
 
-def generator_choice(objset=list()):
-    """generator_choice(objset) -- A generator that infinitely chooses objects
-    from the given set."""
+def generator_choice(objset=list(), rng=None):
+    """generator_choice(objset, rng) -- A generator that infinitely chooses
+    objects from the given set, drawing from rng (or the current backend)."""
     if not iterable(objset):
         raise ValueError('object set is not a set, literally')
-    objset = list(objset)
+    objset = as_sequence(objset)
     if len(objset) <= 0:
         raise ValueError('can\'t choose from an empty set')
-    gen = generator_range_int(0, len(objset) - 1)
+    gen = generator_range_int(0, len(objset) - 1, rng)
     while True:
         pos = next(gen)
         yield objset[pos]
     return objset[0]
 
+class choice:
+    """choice(items, weights=None): A set of items chosen with probabilities
+    proportional to their weights, which could also be given as a dict of
+    {item: weight}. The alias table (Vose's method) is built once when it is
+    created, after which every choice costs O(1). Choose items with
+    rand(choice_object) or xrand(choice_object)."""
+    def __init__(self, items, weights=None):
+        if type(items) == dict and weights is None:
+            items, weights = list(items.keys()), list(items.values())
+        if not iterable(items):
+            raise ValueError('object set is not a set, literally')
+        self.items = as_sequence(items)
+        n = len(self.items)
+        if n <= 0:
+            raise ValueError('can\'t choose from an empty set')
+        if weights is None:
+            weights = [1.0] * n
+        weights = batch_check_type(check_type_float, list(weights), 'weight')
+        if len(weights) != n:
+            raise ValueError('expected as many weights as items')
+        if min(weights) < 0.0 or sum(weights) <= 0.0:
+            raise ValueError('weights should be non-negative and not all zero')
+        # Builds the alias table, each slot is either itself or its alias
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(0, n))
+        small = [i for i in range(0, n) if scaled[i] < 1.0]
+        large = [i for i in range(0, n) if scaled[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        return
+    def __repr__(self):
+        return 'choice(size: %d)' % len(self.items)
+    def __len__(self):
+        return len(self.items)
+    pass
+
+def generator_weighted_choice(table, rng=None):
+    """generator_weighted_choice(table, rng) -- A generator that infinitely
+    chooses objects from the weighted set table (a choice object)."""
+    rng = rng or random_backend
+    rnd, getrandbits = rng.random, rng.getrandbits
+    items, prob, alias = table.items, table.prob, table.alias
+    n = len(items)
+    k = (n - 1).bit_length()
+    while True:
+        pos = getrandbits(k)
+        while pos >= n:
+            pos = getrandbits(k)
+        if rnd() >= prob[pos]:
+            pos = alias[pos]
+        yield items[pos]
+    return items[0]
+
 def generator_list(generator, length=1):
     """generator_list(generator, length) -- A generator that creates a list of
     length and starts index from [1]."""
@@ -434,6 +1962,25 @@ def generator_list_2d(generator, rows=1, columns=1):
         yield res
     return [None,]
 
+def generator_lazylist(args, length=1, rng=None):
+    """generator_lazylist(args, length, rng) -- A generator that creates
+    lazylists of length with items specified by args, each from a different
+    seed drawn from rng (or the current backend)."""
+    getrandbits = (rng or random_backend).getrandbits
+    while True:
+        res = lazylist(length, *args, seed=getrandbits(64))
+        yield res
+    return None
+
+def generator_tuple(generator, length=1):
+    """generator_tuple(generator, length) -- Wraps generator_list() but yields
+    tuples which start indexes from 0."""
+    generator_l = generator_list(generator, length)
+    while True:
+        res = tuple(next(generator_l)[1:])
+        yield res
+    return ()
+
 def generator_string_fixed_length(generator, length=1):
     """generator_string_fixed_length(generator, length) -- Wraps generator_list()
     but yields strings as results. Length is constant."""
@@ -453,112 +2000,1081 @@ def generator_string_dynamic_length(generator, length_generator):
         yield res
     return ''
 
-def generator_random(*args):
-    """generator_random(...): Dynamically determines which random algorithm to
-    use according to the abstracted vartype given by this function. The specific
-    invocation methods are listed in the rand() documentation."""
+def compile_charset(chrset):
+    """compile_charset(chrset) -- Prepares a character set of at most 256
+    characters for random_chars(), returns (table, delete, widen) or None if
+    the set is too large. Random bytes are mapped onto character codes by
+    bytes.translate(table, delete), where the bytes in delete are rejected so
+    that every character is equally likely. If some characters do not fit in a
+    byte, the table maps onto positions in chrset instead, which are widened
+    to the characters by str.translate(widen)."""
+    m = len(chrset)
+    if m <= 0 or m > 256:
+        return None
+    limit = 256 - 256 % m
+    if all(ord(c) < 256 for c in chrset):
+        codes, widen = [ord(c) for c in chrset], None
+    else:
+        codes, widen = list(range(0, m)), {i: chrset[i] for i in range(0, m)}
+    table = bytes.maketrans(bytes(range(0, 256)), bytes(codes[i % m] for i in range(0, 256)))
+    return (table, bytes(range(limit, 256)), widen)
+
+def random_chars(length, charset, rng=None):
+    """random_chars(length, charset, rng) -- Creates length random character
+    codes in bytes, with charset compiled by compile_charset(). The random
+    bytes are drawn from getrandbits() in bulk."""
+    rng = rng or random_backend
+    getrandbits = rng.getrandbits
+    table, delete = charset[0], charset[1]
+    limit = 256 - len(delete)
+    res = b''
+    while len(res) < length:
+        need = length - len(res)
+        k = need * 256 // limit + 8
+        res += getrandbits(8 * k).to_bytes(k, 'little').translate(table, delete)
+    return res[:length]
+
+def generator_string_bulk(charset, minlen, maxlen, binary=False, rng=None):
+    """generator_string_bulk(charset, minlen, maxlen, binary, rng) -- A
+    generator that infinitely yields strings with characters drawn in bulk by
+    random_chars(), of length within [minlen, maxlen]. Yields bytes instead if
+    binary is True."""
+    rng = rng or random_backend
+    widen = charset[2]
+    gen_len = generator_range_int(minlen, maxlen, rng) if minlen < maxlen else None
+    while True:
+        res = random_chars(next(gen_len) if gen_len else minlen, charset, rng)
+        if not binary:
+            res = res.decode('latin-1')
+            if widen is not None:
+                res = res.translate(widen)
+        yield res
+    return ''
+
+def parse_args_int(args):
+    """parse_args_int(args): Interprets the arguments following int in rand(),
+    returns ('range', lower_bound, upper_bound) or ('set', items)."""
+    # Default to the C++ standard, [0, 65535]
+    if len(args) <= 0:
+        return ('range', 0, 65535)
+    # Default to the OI de-facto standard, [1, ...]
+    elif len(args) == 1:
+        upr_bnd = check_type_int(args[0], 'upper bound')
+        return ('range', 1, upr_bnd)
+    # Generates within closed-interval range
+    elif len(args) == 2:
+        low_bnd = check_type_int(args[0], 'lower bound')
+        upr_bnd = check_type_int(args[1], 'upper bound')
+        return ('range', low_bnd, upr_bnd)
+    # Generates within created set, which is **probably** intended
+    lst = batch_check_type(check_type_int, list(args), 'set item')
+    return ('set', lst)
+
+def parse_args_float(args):
+    """parse_args_float(args): Interprets the arguments following float in
+    rand(), returns ('range', lower_bound, upper_bound) or ('set', items)."""
+    # Default to the Python standard (0.0, 1.0), which looks all right.
+    if len(args) <= 0:
+        return ('range', 0.0, 1.0)
+    # Generates with nativeness, defaults to (0.0, ...)
+    elif len(args) == 1:
+        upr_bnd = check_type_float(args[0], 'upper bound')
+        return ('range', 0.0, upr_bnd)
+    # Generates within open-interval range
+    elif len(args) == 2:
+        low_bnd = check_type_float(args[0], 'lower bound')
+        upr_bnd = check_type_float(args[1], 'upper bound')
+        return ('range', low_bnd, upr_bnd)
+    # Generates within created set, which is **probably** intended
+    lst = batch_check_type(check_type_float, list(args), 'set item')
+    return ('set', lst)
+
+def parse_args_str(args):
+    """parse_args_str(args): Interprets the arguments following str in rand(),
+    returns (character_set, min_length, max_length).
+
+    Due to the ambiguous nature of this section, variable type ambiguity is not
+    allowed here. Automatic type conversion would not be enabled, which
+    meant."""
+    def convert_charset(input):
+        output = batch_check_type(check_type_str, list(args[0]), 'character set item')
+        return list(dict.fromkeys(''.join(output)))
+    # You should at least give me a length?!
+    if len(args) <= 0:
+        raise ValueError('expected string length, candidates: function(str, ...)')
+    # Given a character set but not a length
+    elif len(args) == 1 and type(args[0]) != int:
+        raise ValueError('expected string length, candidates: function(str, ...)')
+    # Given a length but no character set, defaults to the OI habit [a-z]
+    elif len(args) == 1 and type(args[0]) == int:
+        chrset = list('abcdefghijklmnopqrstuvwxyz')
+        minlen = args[0]
+        maxlen = args[0]
+    # Given a character set and a length
+    elif len(args) == 2 and iterable(args[0]) and type(args[1]) == int:
+        chrset = convert_charset(args[0])
+        minlen = args[1]
+        maxlen = args[1]
+    # Given a length range but no character set
+    elif len(args) == 2 and type(args[0]) == int and type(args[1]) == int:
+        chrset = list('abcdefghijklmnopqrstuvwxyz')
+        minlen = args[0]
+        maxlen = args[1]
+        if minlen > maxlen:
+            raise ValueError('expected maximum length longer than minimum length (typo?)')
+    # Given a character set and a length range
+    elif len(args) == 3 and iterable(args[0]) and type(args[1]) == int and type(args[2]) == int:
+        chrset = convert_charset(args[0])
+        minlen = args[1]
+        maxlen = args[2]
+        if minlen > maxlen:
+            raise ValueError('expected maximum length longer than minimum length (typo?)')
+    # Otherwise not understood
+    else:
+        raise ValueError('ambiguous arguments, candidates: function(str, ...)')
+    return (chrset, minlen, maxlen)
+
+################################################################################
+
+def typecode_of(objset):
+    """typecode_of(objset): Returns the array.array type code which can hold
+    every item of objset, or None if they should be kept as Python objects."""
+    if type(objset) == range:
+        return typecode_of([objset[0], objset[-1]]) if len(objset) > 0 else 'q'
+    if all(type(i) == int for i in objset):
+        if all(-2**63 <= i < 2**63 for i in objset):
+            return 'q'
+        return None
+    if all(type(i) == float for i in objset):
+        return 'd'
+    return None
+
+def batch_randbelow(count, n, rng=None, offset=0):
+    """batch_randbelow(count, n, rng, offset) -- Chooses count integers in the
+    range [offset, offset + n) without bias, in one pass. The random bits drawn
+    from rng (or the current backend) are the same as calling randbelow() for
+    count times, so the results are identical."""
+    getrandbits = (rng or random_backend).getrandbits
+    k = (n - 1).bit_length()
+    res = []
+    while len(res) < count:
+        res += [r + offset for r in map(getrandbits, itertools.repeat(k, count - len(res))) if r < n]
+    return res
+
+def batch_range_int(count, lower_bound=1, upper_bound=1, backend='array', rng=None):
+    """batch_range_int(count, lower_bound, upper_bound, backend, rng) -- Chooses
+    count numbers in the range [lower_bound, upper_bound] in one pass."""
+    if upper_bound < lower_bound:
+        raise ValueError('upper bound should not be less than the lower bound')
+    rng = rng or random_backend
+    if backend == 'numpy':
+        if typecode_of([lower_bound, upper_bound]) != 'q':
+            raise ValueError('numpy backend only supports 64-bit integers')
+        return rng.numpy_generator().integers(lower_bound, upper_bound, size=count, endpoint=True)
+    res = batch_randbelow(count, upper_bound - lower_bound + 1, rng, lower_bound)
+    if typecode_of([lower_bound, upper_bound]) != 'q':
+        return res
+    return array.array('q', res)
+
+def batch_range_float(count, lower_bound=0.0, upper_bound=1.0, backend='array', rng=None):
+    """batch_range_float(count, lower_bound, upper_bound, backend, rng) --
+    Chooses count numbers in the range (lower_bound, upper_bound) in one pass."""
+    if upper_bound < lower_bound:
+        raise ValueError('upper bound should not be less than the lower bound')
+    rng = rng or random_backend
+    if backend == 'numpy':
+        return rng.numpy_generator().uniform(lower_bound, upper_bound, size=count)
+    rnd = rng.random
+    span = upper_bound - lower_bound
+    return array.array('d', [rnd() * span + lower_bound for i in itertools.repeat(None, count)])
+
+def batch_choice(count, objset=list(), backend='array', rng=None):
+    """batch_choice(count, objset, backend, rng) -- Chooses count objects from
+    the given set in one pass. Numbers are packed into arrays, other objects are
+    returned in a list."""
+    objset = as_sequence(objset)
+    if len(objset) <= 0:
+        raise ValueError('can\'t choose from an empty set')
+    rng = rng or random_backend
+    typecode = typecode_of(objset)
+    if backend == 'numpy':
+        pos = rng.numpy_generator().integers(0, len(objset), size=count)
+        if type(objset) == range:
+            return pos * objset.step + objset.start
+        dtype = {'q': numpy.int64, 'd': numpy.float64}.get(typecode, object)
+        return numpy.array(objset, dtype=dtype)[pos]
+    res = list(map(objset.__getitem__, batch_randbelow(count, len(objset), rng)))
+    if typecode is None:
+        return res
+    return array.array(typecode, res)
+
+def batch_weighted_choice(count, table, backend='array', rng=None):
+    """batch_weighted_choice(count, table, backend, rng) -- Chooses count objects
+    from the weighted set table (a choice object) in one pass."""
+    rng = rng or random_backend
+    items, prob, alias = table.items, table.prob, table.alias
+    n = len(items)
+    typecode = typecode_of(items)
+    if backend == 'numpy':
+        gen = rng.numpy_generator()
+        pos = gen.integers(0, n, size=count)
+        pos = numpy.where(gen.random(count) < numpy.array(prob)[pos], pos, numpy.array(alias)[pos])
+        dtype = {'q': numpy.int64, 'd': numpy.float64}.get(typecode, object)
+        return numpy.array(items, dtype=dtype)[pos]
+    # Draws the slot and the coin of each item in turn, as the generator does
+    rnd, getrandbits = rng.random, rng.getrandbits
+    k = (n - 1).bit_length()
+    res = []
+    for i in itertools.repeat(None, count):
+        pos = getrandbits(k)
+        while pos >= n:
+            pos = getrandbits(k)
+        res.append(items[pos] if rnd() < prob[pos] else items[alias[pos]])
+    if typecode is None:
+        return res
+    return array.array(typecode, res)
+
+def batch_string_fixed_length(count, chrset, length=1, backend='array', rng=None):
+    """batch_string_fixed_length(count, chrset, length, backend, rng) -- Creates
+    count strings of constant length with characters from chrset. All the
+    characters are drawn in one pass and then cut into pieces."""
+    chrset = list(chrset)
+    if len(chrset) <= 0:
+        raise ValueError('can\'t choose from an empty set')
+    rng = rng or random_backend
+    if backend == 'numpy':
+        gen = rng.numpy_generator()
+        if length <= 0:
+            return numpy.array([''] * count)
+        codes = numpy.array([ord(c) for c in chrset], dtype='<u4')
+        pos = gen.integers(0, len(chrset), size=(count, length))
+        return codes[pos].view('<U%d' % length).reshape(count)
+    if length <= 0:
+        return [''] * count
+    total = count * length
+    buf = ''.join(map(chrset.__getitem__, batch_randbelow(total, len(chrset), rng)))
+    return [buf[i:i+length] for i in range(0, total, length)]
+
+def batch_string(count, chrset, minlen, maxlen, binary=False, backend='array', rng=None):
+    """batch_string(count, chrset, minlen, maxlen, binary, backend, rng) --
+    Creates count strings (or bytes, if binary is True) of length within
+    [minlen, maxlen] with characters from chrset. All the characters are drawn
+    in one pass by random_chars() and then cut into pieces, so the strings are
+    distributed as the ones from generator_string_bulk(), but not the same
+    ones. Character sets too large for random_chars() draw the same strings as
+    the generators do."""
+    charset = compile_charset(chrset)
+    if charset is None or (backend == 'numpy' and minlen == maxlen and not binary):
+        if minlen == maxlen:
+            return batch_string_fixed_length(count, chrset, minlen, backend, rng)
+        # Each length is drawn right before its characters, as the generator does
+        gen_len = generator_range_int(minlen, maxlen, rng)
+        res = [''.join(map(chrset.__getitem__, batch_randbelow(next(gen_len), len(chrset), rng)))
+               for i in range(0, count)]
+        return numpy.array(res) if backend == 'numpy' else res
+    rng = rng or random_backend
+    if minlen == maxlen:
+        ends = list(range(minlen, count * minlen + 1, minlen)) if minlen > 0 else [0] * count
+    else:
+        ends = list(itertools.accumulate(batch_range_int(count, minlen, maxlen, 'array', rng)))
+    buf = random_chars(ends[-1] if ends else 0, charset, rng)
+    if binary and backend == 'numpy' and minlen == maxlen and minlen > 0:
+        return numpy.frombuffer(buf, dtype='S%d' % minlen)
+    if not binary:
+        buf = buf.decode('latin-1')
+        if charset[2] is not None:
+            buf = buf.translate(charset[2])
+    res = [buf[i:j] for i, j in zip([0] + ends[:-1], ends)]
+    return numpy.array(res) if backend == 'numpy' else res
+
+def sample_distinct_indices(count, n, rng=None):
+    """sample_distinct_indices(count, n, rng) -- Chooses count distinct integers
+    in the range [0, n) in random order, by a partial Fisher-Yates shuffle. The
+    shuffled positions are kept in a list if the range is dense (n <= 4 *
+    count), otherwise only the swapped ones are kept in a dict, so the memory
+    used is O(count) instead of O(n)."""
+    if count > n:
+        raise ValueError('sample size should not exceed the number of candidates')
+    getrandbits = (rng or random_backend).getrandbits
+    if n <= 4 * count:
+        pool = list(range(0, n))
+        for i in range(0, count):
+            m = n - i
+            k = (m - 1).bit_length()
+            j = getrandbits(k)
+            while j >= m:
+                j = getrandbits(k)
+            j += i
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:count]
+    res = []
+    swapped = {}
+    for i in range(0, count):
+        m = n - i
+        k = (m - 1).bit_length()
+        j = getrandbits(k)
+        while j >= m:
+            j = getrandbits(k)
+        j += i
+        res.append(swapped.get(j, j))
+        swapped[j] = swapped.get(i, i)
+    return res
+
+def sample_rejection(generator, count):
+    """sample_rejection(generator, count) -- Draws items from generator until
+    count distinct ones are found, for candidates which are too many to be
+    indexed."""
+    res = []
+    seen = set()
+    attempts = 100 * count + 1000
+    while len(res) < count:
+        val = next(generator)
+        if val not in seen:
+            seen.add(val)
+            res.append(val)
+        attempts -= 1
+        if attempts <= 0:
+            raise ValueError('unable to find enough distinct items, too few candidates?')
+    return res
+
+def compile_sampler(args, length=1):
+    """compile_sampler(args, length): Compiles the rand() arguments of the items
+    in a distinct sample into sampler(count, rng), which returns a list of count
+    distinct items in random order. Checks that there are at least "length"
+    candidates, if they could be counted."""
+    def check_candidates(n):
+        if length > n:
+            raise ValueError('sample size should not exceed the number of candidates')
+        return
+    args = list(args)
+    if len(args) <= 0:
+        args.append(int)
+    # Choosing from a set, sequences (like range) are indexed in place
+    if type(args[0]) != type and (type(args[0]) != tuple or type(args[0][0]) != type):
+        if not iterable(args[0]):
+            raise ValueError('unable to generate set, candidates: function(set, length, iterable object)')
+        objset = args[0]
+        if type(objset) != range:
+            objset = list(dict.fromkeys(objset))
+        check_candidates(len(objset))
+        return lambda count, rng: [objset[i] for i in sample_distinct_indices(count, len(objset), rng)]
+    vartype, *args = args
+    if vartype == int or vartype == float:
+        spec = parse_args_int(args) if vartype == int else parse_args_float(args)
+        if spec[0] == 'set':
+            return compile_sampler([spec[1]], length)
+        low_bnd, upr_bnd = spec[1], spec[2]
+        if upr_bnd < low_bnd:
+            raise ValueError('upper bound should not be less than the lower bound')
+        if vartype == int:
+            span = upr_bnd - low_bnd + 1
+            check_candidates(span)
+            return lambda count, rng: [low_bnd + i for i in sample_distinct_indices(count, span, rng)]
+        plan = spec_plan(float, low_bnd, upr_bnd)
+        return lambda count, rng: sample_rejection(plan.generator(rng), count)
+    elif vartype == str:
+        chrset, minlen, maxlen = parse_args_str(args)
+        if minlen == maxlen and minlen < 1:
+            raise ValueError('length should not be too short')
+        # Counts the candidates, but only as many as needed
+        def candidates(count):
+            total = 0
+            for length in range(max(minlen, 0), maxlen + 1):
+                total += len(chrset) ** length
+                if total > 2 * count:
+                    return None
+            return total
+        if candidates(length) is not None:
+            check_candidates(candidates(length))
+        plan = spec_plan(str, ''.join(chrset), minlen, maxlen)
+        def sampler(count, rng):
+            if candidates(count) is None:
+                return sample_rejection(plan.generator(rng), count)
+            # Few enough candidates to be listed
+            objset = [''.join(i) for length in range(max(minlen, 0), maxlen + 1)
+                      for i in itertools.product(chrset, repeat=length)]
+            return [objset[i] for i in sample_distinct_indices(count, len(objset), rng)]
+        return sampler
+    raise ValueError('unsupported type, candidates: function(set, length, int / float / str / iterable object)')
+
+def generator_sample(sampler, count=1, rng=None):
+    """generator_sample(sampler, count, rng) -- A generator that creates lists
+    of count distinct items with sampler, and starts index from [1]."""
+    rng = rng or random_backend
+    while True:
+        res = [None,] + sampler(count, rng)
+        yield res
+    return [None,]
+
+def batch_sample(count, sampler, length=1, backend='array', rng=None):
+    """batch_sample(count, sampler, length, backend, rng) -- Creates count
+    distinct samples of length items. The samples are the same as the ones
+    from generator_sample(), but each is packed into an array if possible, and
+    indicing starts from [0] instead of [1]."""
+    rng = rng or random_backend
+    res = []
+    for i in range(0, count):
+        sample = sampler(length, rng)
+        if backend == 'numpy':
+            res.append(numpy.array(sample))
+            continue
+        typecode = typecode_of(sample)
+        res.append(array.array(typecode, sample) if typecode is not None else sample)
+    return res
+
+def sample_permutation(items, rng=None):
+    """sample_permutation(items, rng) -- Returns the items in a shuffled list,
+    by a Fisher-Yates shuffle in O(n)."""
+    res = list(items)
+    (rng or random_backend).shuffle(res)
+    return res
+
+def sample_sorted_uniform(count, rng=None):
+    """sample_sorted_uniform(count, rng) -- Returns count sorted uniform numbers
+    in [0, 1) in O(count), as the order statistics given by the normalized
+    prefix sums of count + 1 exponential spacings."""
+    rnd = (rng or random_backend).random
+    log = math.log
+    spacings = list(itertools.accumulate([-log(1.0 - rnd()) for i in range(0, count + 1)]))
+    total = spacings.pop()
+    return [i / total for i in spacings]
+
+def sample_sorted(count, plan, bounds=None, rng=None):
+    """sample_sorted(count, plan, bounds, rng) -- Returns count items created by
+    plan in non-decreasing order. Ranges of numbers (bounds is (vartype, lower
+    bound, upper bound)) are created from sample_sorted_uniform() in O(count),
+    other items are created and then sorted."""
+    if bounds is not None:
+        vartype, low_bnd, upr_bnd = bounds
+        if vartype == float:
+            span = upr_bnd - low_bnd
+            return [low_bnd + u * span for u in sample_sorted_uniform(count, rng)]
+        span = upr_bnd - low_bnd + 1
+        # Rounding keeps the order, but might reach the upper bound
+        return [min(low_bnd + int(u * span), upr_bnd) for u in sample_sorted_uniform(count, rng)]
+    if plan.batch is not None:
+        return sorted(plan.batch(count, 'array', rng))
+    gnratr = plan.generator(rng)
+    return sorted(next(gnratr) for i in range(0, count))
+
+def sample_composition(total, parts, rng=None):
+    """sample_composition(total, parts, rng) -- Splits total into parts
+    non-negative integers uniformly, by choosing parts - 1 bars among total +
+    parts - 1 positions (stars and bars)."""
+    bars = sample_distinct_indices(parts - 1, total + parts - 1, rng)
+    bars.sort()
+    res = []
+    last = -1
+    for bar in bars:
+        res.append(bar - last - 1)
+        last = bar
+    res.append(total + parts - 2 - last)
+    return res
+
+def sample_bounded_sum(count, low_total, upr_total, low_bnd=0, upr_bnd=None, rng=None):
+    """sample_bounded_sum(count, low_total, upr_total, low_bnd, upr_bnd, rng) --
+    Returns count integers within [low_bnd, upr_bnd] (no upper bound if None),
+    which sum up to a total within [low_total, upr_total].
+
+    A slack part makes up the difference to upr_total, and the compositions
+    from stars and bars are uniform among all the candidates. If the upper
+    bounds reject too many of them, the units are handed out in random order
+    instead, which is no longer exactly uniform but always fast."""
+    rng = rng or random_backend
+    slack = upr_total - max(low_total, count * low_bnd)
+    units = upr_total - count * low_bnd
+    caps = [upr_bnd - low_bnd if upr_bnd is not None else units] * count + [slack]
+    parts = count + 1 if slack > 0 else count
+    for attempt in range(0, 64):
+        res = sample_composition(units, parts, rng)
+        if all(res[i] <= caps[i] for i in range(0, parts)):
+            return [low_bnd + i for i in res[:count]]
+    # Hands out the units in random order, keeping the rest feasible
+    order = sample_permutation(range(0, parts), rng)
+    room = sum(caps[i] for i in range(0, parts))
+    res = [0] * parts
+    gen = rng.randbelow
+    for i in order:
+        room -= caps[i]
+        least = max(0, units - room)
+        res[i] = least + gen(min(caps[i], units) - least + 1)
+        units -= res[i]
+    return [low_bnd + i for i in res[:count]]
+
+def sample_bounded_step(count, max_step, low_bnd, upr_bnd, rng=None):
+    """sample_bounded_step(count, max_step, low_bnd, upr_bnd, rng) -- Returns
+    count integers within [low_bnd, upr_bnd], where neighbours differ by at
+    most max_step. The first item is uniform within the bounds, and each next
+    one is uniform among the ones within reach (a bounded random walk)."""
+    randbelow = (rng or random_backend).randbelow
+    cur = low_bnd + randbelow(upr_bnd - low_bnd + 1)
+    res = [cur]
+    for i in range(1, count):
+        low = max(low_bnd, cur - max_step)
+        cur = low + randbelow(min(upr_bnd, cur + max_step) - low + 1)
+        res.append(cur)
+    return res
+
+def compile_shape(vartype, args):
+    """compile_shape(vartype, args) -- Compiles the arguments following
+    permutation, sorted, sum or step in rand() into a sampler(count, rng) of
+    the items, and returns (sampler, length)."""
+    if len(args) <= 0:
+        raise ValueError('expected array length, candidates: function(%s, ...)' % vartype.__name__)
+    if vartype == permutation:
+        if type(args[0]) == int:
+            items = range(1, args[0] + 1)
+        elif iterable(args[0]):
+            items = as_sequence(args[0])
+        else:
+            raise ValueError('expected length or items, candidates: function(permutation, length / items)')
+        if len(items) < 1:
+            raise ValueError('length should not be too short')
+        return (lambda count, rng: sample_permutation(items, rng)), len(items)
+    length = check_type_int(args[0], 'array length')
+    if length < 1:
+        raise ValueError('length should not be too short')
+    if vartype == sorted:
+        i_plan = spec_plan(*args[1:])
+        bounds = None
+        if len(args) == 4 and args[1] in {int, float}:
+            spec = parse_args_int(args[2:]) if args[1] == int else parse_args_float(args[2:])
+            if spec[2] < spec[1]:
+                raise ValueError('upper bound should not be less than the lower bound')
+            if args[1] == float or spec[2] - spec[1] < 2**53:
+                bounds = (args[1], spec[1], spec[2])
+        return (lambda count, rng: sample_sorted(count, i_plan, bounds, rng)), length
+    # Arrays with bounded steps between neighbours
+    if vartype == step:
+        if len(args) != 4:
+            raise ValueError('expected bounds, candidates: function(step, length, max_step, lower_bound, upper_bound)')
+        max_step = check_type_int(args[1], 'maximum step')
+        low_bnd = check_type_int(args[2], 'lower bound')
+        upr_bnd = check_type_int(args[3], 'upper bound')
+        if max_step < 0:
+            raise ValueError('maximum step should not be negative')
+        if upr_bnd < low_bnd:
+            raise ValueError('upper bound should not be less than the lower bound')
+        return (lambda count, rng: sample_bounded_step(count, max_step, low_bnd, upr_bnd, rng)), length
+    # Arrays with a bounded sum
+    if len(args) < 2 or len(args) > 4:
+        raise ValueError('expected total, candidates: function(sum, length, total, [lower_bound, [upper_bound]])')
+    if type(args[1]) == tuple and len(args[1]) == 2:
+        low_total = check_type_int(args[1][0], 'lower bound of total')
+        upr_total = check_type_int(args[1][1], 'upper bound of total')
+    else:
+        low_total = upr_total = check_type_int(args[1], 'total')
+    low_bnd = check_type_int(args[2], 'lower bound') if len(args) >= 3 else 0
+    upr_bnd = check_type_int(args[3], 'upper bound') if len(args) >= 4 else None
+    if upr_total < low_total or (upr_bnd is not None and upr_bnd < low_bnd):
+        raise ValueError('upper bound should not be less than the lower bound')
+    if length * low_bnd > upr_total or (upr_bnd is not None and length * upr_bnd < low_total):
+        raise ValueError('no array of length %d within the bounds has such a sum' % length)
+    return (lambda count, rng: sample_bounded_sum(count, low_total, upr_total, low_bnd, upr_bnd, rng)), length
+
+class permutation:
+    """permutation: The marker of permutations in rand(), like
+    rand(permutation, n) or rand(permutation, items)."""
+    pass
+
+class step:
+    """step: The marker of arrays with bounded steps between neighbours in
+    rand(), like rand(step, n, max_step, lower_bound, upper_bound)."""
+    pass
+
+################################################################################
+
+class point:
+    """point: The marker of lattice points in rand(), like rand(point, count,
+    lower_bound, upper_bound)."""
+    pass
+
+class polygon:
+    """polygon: The marker of convex polygons in rand(), like rand(polygon,
+    count, lower_bound, upper_bound)."""
+    pass
+
+class segment:
+    """segment: The marker of non-intersecting segments in rand(), like
+    rand(segment, count, lower_bound, upper_bound)."""
+    pass
+
+class SpatialHash:
+    """SpatialHash(size): A grid of square cells of the given size, which keeps
+    each item in the cells its bounding box overlaps. Items near a box are
+    found by looking into a few cells, instead of checking every pair."""
+    def __init__(self, size):
+        self.size = size
+        self.cells = {}
+        return
+    def span(self, x0, y0, x1, y1):
+        size = self.size
+        return range(int(x0 // size), int(x1 // size) + 1), range(int(y0 // size), int(y1 // size) + 1)
+    def add(self, item, x0, y0, x1, y1):
+        """add(item, x0, y0, x1, y1): Adds item with the bounding box [x0, x1] x
+        [y0, y1]."""
+        cells = self.cells
+        xs, ys = self.span(x0, y0, x1, y1)
+        for cx in xs:
+            for cy in ys:
+                if (cx, cy) in cells:
+                    cells[cx, cy].append(item)
+                else:
+                    cells[cx, cy] = [item]
+        return
+    def query(self, x0, y0, x1, y1):
+        """query(x0, y0, x1, y1): Returns the items in the cells overlapped by
+        the box [x0, x1] x [y0, y1], which might be repeated."""
+        cells = self.cells
+        xs, ys = self.span(x0, y0, x1, y1)
+        res = []
+        for cx in xs:
+            for cy in ys:
+                if (cx, cy) in cells:
+                    res += cells[cx, cy]
+        return res
+    pass
+
+def is_prime(n):
+    """is_prime(n): Miller-Rabin test, which is deterministic for n < 3.3 *
+    10^24."""
+    if n < 2:
+        return False
+    bases = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+    for p in bases:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for a in bases:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for i in range(0, s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+def sample_points(count, low_bnd, upr_bnd, rng=None):
+    """sample_points(count, low_bnd, upr_bnd, rng) -- Returns count distinct
+    lattice points in the square [low_bnd, upr_bnd]^2, by decoding distinct
+    indices of the cells."""
+    span = upr_bnd - low_bnd + 1
+    return [(low_bnd + k // span, low_bnd + k % span)
+            for k in sample_edge_indices(count, span * span, rng or random_backend)]
+
+def sample_points_apart(count, low_bnd, upr_bnd, distance, rng=None):
+    """sample_points_apart(count, low_bnd, upr_bnd, distance, rng) -- Returns
+    count lattice points in the square [low_bnd, upr_bnd]^2 which are at least
+    "distance" apart, by throwing random points into a spatial hash and
+    rejecting those too close to any point in the neighbouring cells."""
+    rng = rng or random_backend
+    span = upr_bnd - low_bnd + 1
+    grid = SpatialHash(distance)
+    limit = distance * distance
+    res = []
+    attempts = 100 * count + 1000
+    while len(res) < count:
+        if attempts <= 0:
+            raise ValueError('unable to place %d points at least %s apart within the bounds' % (count, distance))
+        batch = count - len(res)
+        attempts -= batch
+        xs = batch_randbelow(batch, span, rng, low_bnd)
+        ys = batch_randbelow(batch, span, rng, low_bnd)
+        for x, y in zip(xs, ys):
+            for px, py in grid.query(x - distance, y - distance, x + distance, y + distance):
+                if (px - x) * (px - x) + (py - y) * (py - y) < limit:
+                    break
+            else:
+                grid.add((x, y), x, y, x, y)
+                res.append((x, y))
+    return res
+
+def sample_points_general(count, low_bnd, upr_bnd, rng=None):
+    """sample_points_general(count, low_bnd, upr_bnd, rng) -- Returns count
+    lattice points in the square [low_bnd, upr_bnd]^2, no three of which are
+    collinear, in O(count).
+
+    The points lie on a random parabola y = ax^2 + bx + c modulo a prime p,
+    which meets every line (modulo p) in at most two points, and so do the
+    points on any line over the integers. The square [0, p)^2 is then randomly
+    mirrored, transposed and moved within the bounds. The points are not
+    uniform among all such sets."""
+    rng = rng or random_backend
+    span = upr_bnd - low_bnd + 1
+    p = span
+    while p >= 2 and not is_prime(p):
+        p -= 1
+    if p < count:
+        raise ValueError('too many points, at most %d points in general position within the bounds' % max(p, 2))
+    gen = rng.randbelow
+    a, b, c = 1 + gen(p - 1), gen(p), gen(p)
+    xs = sample_edge_indices(count, p, rng)
+    res = [(x, (a * x * x + b * x + c) % p) for x in xs]
+    flips = rng.getrandbits(3)
+    if flips & 1:
+        res = [(p - 1 - x, y) for x, y in res]
+    if flips & 2:
+        res = [(x, p - 1 - y) for x, y in res]
+    if flips & 4:
+        res = [(y, x) for x, y in res]
+    dx, dy = low_bnd + gen(span - p + 1), low_bnd + gen(span - p + 1)
+    return [(x + dx, y + dy) for x, y in res]
+
+def valtr_chains(values, rng):
+    """valtr_chains(values, rng) -- Splits the sorted distinct values randomly
+    into two chains from the least to the greatest, and returns the steps
+    along the first chain forward and the second chain back, which sum to 0
+    and are never 0."""
+    steps = []
+    last1 = last2 = values[0]
+    bits = rng.getrandbits(len(values))
+    for i in range(1, len(values) - 1):
+        if bits >> i & 1:
+            steps.append(values[i] - last1)
+            last1 = values[i]
+        else:
+            steps.append(last2 - values[i])
+            last2 = values[i]
+    steps.append(values[-1] - last1)
+    steps.append(last2 - values[-1])
+    return steps
+
+def lattice_polygon_vectors(count, width):
+    """lattice_polygon_vectors(count, width) -- Returns the edge vectors of a
+    strictly convex lattice polygon of at least count vertices which fits in a
+    square of the given width, or None if there is no such polygon built this
+    way. Primitive vectors (a, b) are taken from the shortest (by a + b), each
+    along with its rotations by 90, 180 and 270 degrees, so the vectors sum to
+    0 and the polygon is width wide for a total of a + b over the groups."""
+    res = []
+    used = 0
+    s = 1
+    while len(res) < count:
+        for a in range(1, s + 1):
+            if math.gcd(a, s) != 1:
+                continue
+            if used + s > width:
+                return None
+            used += s
+            b = s - a
+            res += [(a, b), (-b, a), (-a, -b), (b, -a)]
+            if len(res) >= count:
+                break
+        s += 1
+    return res
+
+def sort_vectors(vectors):
+    """sort_vectors(vectors) -- Sorts the vectors by their angles in (-pi, pi],
+    and merges the parallel ones (of the same direction) into their sums.
+    Vectors are sorted by floating point angles first, and the runs too close
+    to be told apart by rounding are sorted again by exact cross products."""
+    atan2 = math.atan2
+    keyed = sorted((atan2(dy, dx), dx, dy) for dx, dy in vectors)
+    cross_order = functools.cmp_to_key(lambda v, w: w[0] * v[1] - w[1] * v[0])
+    res = []
+    i = 0
+    while i < len(keyed):
+        j = i + 1
+        while j < len(keyed) and keyed[j][0] - keyed[j-1][0] < 1e-9:
+            j += 1
+        run = [(dx, dy) for a, dx, dy in keyed[i:j]]
+        if len(run) > 1:
+            run.sort(key=cross_order)
+        for dx, dy in run:
+            if res and res[-1][0] * dy - res[-1][1] * dx == 0 and res[-1][0] * dx + res[-1][1] * dy > 0:
+                res[-1] = (res[-1][0] + dx, res[-1][1] + dy)
+            else:
+                res.append((dx, dy))
+        i = j
+    if len(res) > 1 and res[-1][0] * res[0][1] - res[-1][1] * res[0][0] == 0 and \
+            res[-1][0] * res[0][0] + res[-1][1] * res[0][1] > 0:
+        res[0] = (res[0][0] + res[-1][0], res[0][1] + res[-1][1])
+        res.pop()
+    return res
+
+def sample_convex_polygon(count, low_bnd, upr_bnd, rng=None):
+    """sample_convex_polygon(count, low_bnd, upr_bnd, rng) -- Returns the
+    vertices of a strictly convex lattice polygon in counterclockwise order,
+    within the square [low_bnd, upr_bnd]^2, in O(count log count).
+
+    Valtr's method: the x and y coordinates of random values are each split
+    into two chains, whose steps are paired randomly into edge vectors. Laid
+    end to end by their angles, the vectors form a convex polygon. Parallel
+    vectors are merged, so a few more values are drawn than needed, and the
+    extra vertices are dropped, which keeps the polygon strictly convex.
+    If that fails (for too many vertices in small bounds), the polygon is
+    built from the shortest primitive vectors by lattice_polygon_vectors(),
+    with random vertices dropped, which always succeeds if count is at most
+    polygon_capacity(upr_bnd - low_bnd)."""
+    rng = rng or random_backend
+    span = upr_bnd - low_bnd + 1
+    if count < 3:
+        raise ValueError('a polygon should have at least 3 vertices')
+    vectors = None
+    values = count
+    for attempt in range(0, 16 if count <= span else 0):
+        xs = sorted(sample_edge_indices(values, span, rng))
+        ys = sorted(sample_edge_indices(values, span, rng))
+        dxs, dys = valtr_chains(xs, rng), valtr_chains(ys, rng)
+        rng.shuffle(dys)
+        merged = sort_vectors(zip(dxs, dys))
+        turns = zip(merged, merged[1:] + merged[:1])
+        if len(merged) >= 3 and all(x1 * y2 - y1 * x2 > 0 for (x1, y1), (x2, y2) in turns):
+            if len(merged) >= count:
+                vectors = merged
+                break
+            values = min(span, values + 2 * (count - len(merged)))
+    if vectors is None:
+        vectors = lattice_polygon_vectors(count, span - 1)
+        if vectors is None:
+            raise ValueError('too many vertices, at most %d for a convex polygon within the bounds' % polygon_capacity(span - 1))
+        vectors = sort_vectors(vectors)
+    start = rng.randbelow(len(vectors))
+    vectors = vectors[start:] + vectors[:start]
+    px = list(itertools.accumulate(v[0] for v in vectors))
+    py = list(itertools.accumulate(v[1] for v in vectors))
+    if len(vectors) > count:
+        # Any subset of the vertices is still strictly convex
+        dropped = set(sample_distinct_indices(len(vectors) - count, len(vectors), rng))
+        kept = [i for i in range(0, len(vectors)) if i not in dropped]
+        px, py = [px[i] for i in kept], [py[i] for i in kept]
+    # Moves the polygon to a random place within the bounds
+    dx = low_bnd - min(px) + rng.randbelow(span - (max(px) - min(px)))
+    dy = low_bnd - min(py) + rng.randbelow(span - (max(py) - min(py)))
+    return [(x + dx, y + dy) for x, y in zip(px, py)]
+
+@functools.lru_cache(maxsize=256)
+def polygon_capacity(width):
+    """polygon_capacity(width) -- Returns the number of vertices of the polygon
+    from lattice_polygon_vectors() within a square of the given width, which
+    is the most vertices rand(polygon, ...) accepts. Only called for small
+    widths, where it runs out of room quickly."""
+    used = 0
+    res = 0
+    s = 1
+    while True:
+        for a in range(1, s + 1):
+            if math.gcd(a, s) != 1:
+                continue
+            if used + s > width:
+                return res
+            used += s
+            res += 4
+        s += 1
+    return res
+
+def segments_intersect(s, t):
+    """segments_intersect(s, t): Returns if the segments s and t, given as (x1,
+    y1, x2, y2), have any point in common."""
+    ax, ay, bx, by = s
+    cx, cy, dx, dy = t
+    d1 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+    d2 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+    d3 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    d4 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+    if ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) and ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0)):
+        return True
+    # Touching at an end, or overlapping when collinear
+    def between(px, py, qx, qy, rx, ry):
+        return min(px, qx) <= rx <= max(px, qx) and min(py, qy) <= ry <= max(py, qy)
+    return ((d1 == 0 and between(cx, cy, dx, dy, ax, ay)) or
+            (d2 == 0 and between(cx, cy, dx, dy, bx, by)) or
+            (d3 == 0 and between(ax, ay, bx, by, cx, cy)) or
+            (d4 == 0 and between(ax, ay, bx, by, dx, dy)))
+
+def sample_segments(count, low_bnd, upr_bnd, max_length=None, rng=None):
+    """sample_segments(count, low_bnd, upr_bnd, max_length, rng) -- Returns count
+    segments (x1, y1, x2, y2) with lattice ends in the square [low_bnd,
+    upr_bnd]^2, no two of which have any point in common. Each end differs
+    from the other by at most max_length on each axis (defaults to span /
+    (2 sqrt(count) + 1)). Random segments are thrown into a spatial hash of
+    cells of that size, and rejected if they meet any segment in the cells
+    they overlap."""
+    rng = rng or random_backend
+    span = upr_bnd - low_bnd + 1
+    if max_length is None:
+        max_length = max(1, span // (2 * math.isqrt(count) + 1))
+    grid = SpatialHash(max_length)
+    res = []
+    attempts = 100 * count + 1000
+    while len(res) < count:
+        if attempts <= 0:
+            raise ValueError('unable to place %d non-intersecting segments within the bounds' % count)
+        batch = count - len(res)
+        attempts -= batch
+        xs = batch_randbelow(batch, span, rng, low_bnd)
+        ys = batch_randbelow(batch, span, rng, low_bnd)
+        dxs = batch_randbelow(batch, 2 * max_length + 1, rng, -max_length)
+        dys = batch_randbelow(batch, 2 * max_length + 1, rng, -max_length)
+        for x, y, dx, dy in zip(xs, ys, dxs, dys):
+            x2, y2 = x + dx, y + dy
+            if (dx == 0 and dy == 0) or x2 < low_bnd or x2 > upr_bnd or y2 < low_bnd or y2 > upr_bnd:
+                continue
+            seg = (x, y, x2, y2)
+            box = (min(x, x2), min(y, y2), max(x, x2), max(y, y2))
+            for other in grid.query(*box):
+                if segments_intersect(seg, other):
+                    break
+            else:
+                grid.add(seg, *box)
+                res.append(seg)
+    return res
+
+def compile_geometry(vartype, args):
+    """compile_geometry(vartype, args) -- Compiles the arguments following
+    point, polygon or segment in rand() into a sampler(count, rng) of the
+    items, and returns (sampler, length)."""
+    name = vartype.__name__
+    option = {point: '[min_distance / \'general\']', polygon: '', segment: '[max_length]'}[vartype]
+    if len(args) < 3 or len(args) > (3 if vartype == polygon else 4):
+        raise ValueError('expected count and bounds, candidates: function(%s, count, lower_bound, upper_bound%s)' % (
+            name, ', ' + option if option else ''))
+    length = check_type_int(args[0], '%s count' % name)
+    low_bnd = check_type_int(args[1], 'lower bound')
+    upr_bnd = check_type_int(args[2], 'upper bound')
+    if length < 1:
+        raise ValueError('length should not be too short')
+    if upr_bnd < low_bnd:
+        raise ValueError('upper bound should not be less than the lower bound')
+    if vartype == polygon:
+        if length < 3:
+            raise ValueError('a polygon should have at least 3 vertices')
+        if lattice_polygon_vectors(length, upr_bnd - low_bnd) is None:
+            raise ValueError('too many vertices, at most %d for a convex polygon within the bounds' % polygon_capacity(upr_bnd - low_bnd))
+        return (lambda count, rng: sample_convex_polygon(count, low_bnd, upr_bnd, rng)), length
+    if vartype == segment:
+        max_length = check_type_int(args[3], 'max length') if len(args) >= 4 else None
+        if max_length is not None and max_length < 1:
+            raise ValueError('max length should be positive')
+        return (lambda count, rng: sample_segments(count, low_bnd, upr_bnd, max_length, rng)), length
+    if len(args) >= 4 and args[3] == 'general':
+        return (lambda count, rng: sample_points_general(count, low_bnd, upr_bnd, rng)), length
+    if len(args) >= 4:
+        if type(args[3]) not in {int, float} or args[3] < 0:
+            raise ValueError('expected min distance or \'general\', candidates: function(point, count, lower_bound, upper_bound, [min_distance / \'general\'])')
+        # Distinct lattice points are already 1 apart
+        if args[3] > 1:
+            distance = args[3]
+            return (lambda count, rng: sample_points_apart(count, low_bnd, upr_bnd, distance, rng)), length
+    if length > (upr_bnd - low_bnd + 1) ** 2:
+        raise ValueError('sample size should not exceed the number of candidates')
+    return (lambda count, rng: sample_points(count, low_bnd, upr_bnd, rng)), length
+
+def check_backend(backend):
+    """check_backend(backend): Checks if the batch backend is available."""
+    if backend not in {'array', 'numpy'}:
+        raise ValueError('unsupported backend, candidates: array, numpy')
+    if backend == 'numpy' and numpy is None:
+        raise ValueError('numpy backend is not available, install numpy first')
+    return backend
+
+################################################################################
+
+class SpecPlan:
+    """SpecPlan(factory, batch=None): A compiled rand() spec. The arguments are
+    parsed and checked only once, and then factory(rng) creates generators and
+    batch(count, backend, rng) creates batches (if supported) without any
+    further parsing, both drawing from the RandomBackend rng. draw() takes the
+    next item from a generator kept by the plan for the calling thread, so
+    that plans shared through the cache could be drawn from in any thread."""
+    def __init__(self, factory, batch=None):
+        self.factory = factory
+        self.batch = batch
+        self.local = threading.local()
+        return
+    def draw(self):
+        try:
+            draw = self.local.draw
+        except AttributeError:
+            draw = self.reset()
+        return draw()
+    def reset(self):
+        """reset(): Replaces the generator of the calling thread (which is
+        closed after raising an exception), and returns its __next__."""
+        draw = self.local.draw = self.factory(random_backend).__next__
+        return draw
+    def generator(self, rng=None):
+        return self.factory(rng or random_backend)
+    pass
+
+def compile_spec(*args):
+    """compile_spec(...): Dynamically determines which random algorithm to use
+    according to the abstracted vartype given by this function, and compiles
+    it into a SpecPlan. The specific invocation methods are listed in the
+    rand() documentation."""
     args = list(args)
     # Defaultly integer randomization
     if len(args) <= 0:
         args.append(int)
+    # Structured arrays and geometry
+    if args[0] is permutation or args[0] is sorted or args[0] is sum or args[0] is step:
+        sampler, length = compile_shape(args[0], args[1:])
+        return SpecPlan(lambda rng: generator_sample(sampler, length, rng),
+                        lambda count, backend, rng: batch_sample(count, sampler, length, backend, rng))
+    if args[0] is point or args[0] is polygon or args[0] is segment:
+        sampler, length = compile_geometry(args[0], args[1:])
+        return SpecPlan(lambda rng: generator_sample(sampler, length, rng),
+                        lambda count, backend, rng: batch_sample(count, sampler, length, backend, rng))
     # Choosing from a set, blindly
     if type(args[0]) != type and (type(args[0]) != tuple or type(args[0][0]) != type):
+        # Weighted choices
+        if type(args[0]) == choice:
+            return compile_spec(choice, args[0])
+        if type(args[0]) == dict and all(type(w) in {int, float} for w in args[0].values()):
+            return compile_spec(choice, choice(args[0]))
         if not iterable(args[0]):
             raise ValueError('unable to generate set, candidates: function(iterable object)')
-        objset = list(args[0])
-        gnratr = generator_choice(objset)
-        yield from gnratr
+        objset = as_sequence(args[0])
+        if len(objset) <= 0:
+            raise ValueError('can\'t choose from an empty set')
+        return SpecPlan(lambda rng: generator_choice(objset, rng),
+                        lambda count, backend, rng: batch_choice(count, objset, backend, rng))
     vartype, *args = args
-    # Enforces integer output
-    if vartype == int:
-        # Default to the C++ standard, [0, 65535]
-        if len(args) <= 0:
-            gnratr = generator_range_int(0, 65535)
-        # Default to the OI de-facto standard, [1, ...]
-        elif len(args) == 1:
-            upr_bnd = check_type_int(args[0], 'upper bound')
-            gnratr = generator_range_int(1, upr_bnd)
-        # Generates within closed-interval range
-        elif len(args) == 2:
-            low_bnd = check_type_int(args[0], 'lower bound')
-            upr_bnd = check_type_int(args[1], 'upper bound')
-            gnratr = generator_range_int(low_bnd, upr_bnd)
-        # Generates within created set, which is **probably** intended
-        else:
-            lst = batch_check_type(check_type_int, args, 'set item')
-            gnratr = generator_choice(lst)
-        # Chooses items
-        yield from gnratr
-    # Enforces floating point output
-    elif vartype == float:
-        # Default to the Python standard (0.0, 1.0), which looks all right.
-        if len(args) <= 0:
-            gnratr = generator_range_float(0.0, 1.0)
-        # Generates with nativeness, defaults to (0.0, ...)
-        elif len(args) == 1:
-            upr_bnd = check_type_float(args[0], 'upper bound')
-            gnratr = generator_range_float(0.0, upr_bnd)
-        # Generates within open-interval range
-        elif len(args) == 2:
-            low_bnd = check_type_float(args[0], 'lower bound')
-            upr_bnd = check_type_float(args[1], 'upper bound')
-            gnratr = generator_range_float(low_bnd, upr_bnd)
-        # Generates within created set, which is **probably** intended
+    # Enforces integer or floating point output
+    if vartype == int or vartype == float:
+        if vartype == int:
+            spec = parse_args_int(args)
+            generator_range, batch_range = generator_range_int, batch_range_int
         else:
-            lst = batch_check_type(check_type_float, args, 'set item')
-            gnratr = generator_choice(lst)
-        # Chooses items
-        yield from gnratr
+            spec = parse_args_float(args)
+            generator_range, batch_range = generator_range_float, batch_range_float
+        if spec[0] == 'set':
+            objset = spec[1]
+            return SpecPlan(lambda rng: generator_choice(objset, rng),
+                            lambda count, backend, rng: batch_choice(count, objset, backend, rng))
+        low_bnd, upr_bnd = spec[1], spec[2]
+        if upr_bnd < low_bnd:
+            raise ValueError('upper bound should not be less than the lower bound')
+        return SpecPlan(lambda rng: generator_range(low_bnd, upr_bnd, rng),
+                        lambda count, backend, rng: batch_range(count, low_bnd, upr_bnd, backend, rng))
     # Enforces string output
-    elif vartype == str:
-        """Due to the ambiguous nature of this section, variable type ambiguity
-        is not allowed here. Automatic type conversion would not be enabled,
-        which meant."""
-        def convert_charset(input):
-            output = batch_check_type(check_type_str, list(args[0]), 'character set item')
-            return list(set(''.join(output)))
-        # You should at least give me a length?!
-        if len(args) <= 0:
-            raise ValueError('expected string length, candidates: function(str, ...)')
-        # Given a character set but not a length
-        elif len(args) == 1 and type(args[0]) != int:
-            raise ValueError('expected string length, candidates: function(str, ...)')
-        # Given a length but no character set, defaults to the OI habit [a-z]
-        elif len(args) == 1 and type(args[0]) == int:
-            chrset = list('abcdefghijklmnopqrstuvwxyz')
-            minlen = args[0]
-            maxlen = args[0]
-        # Given a character set and a length
-        elif len(args) == 2 and iterable(args[0]) and type(args[1]) == int:
-            chrset = convert_charset(args[0])
-            minlen = args[1]
-            maxlen = args[1]
-        # Given a length range but no character set
-        elif len(args) == 2 and type(args[0]) == int and type(args[1]) == int:
-            chrset = list('abcdefghijklmnopqrstuvwxyz')
-            minlen = args[0]
-            maxlen = args[1]
-            if minlen > maxlen:
-                raise ValueError('expected maximum length longer than minimum length (typo?)')
-        # Given a character set and a length range
-        elif len(args) == 3 and iterable(args[0]) and type(args[1]) == int and type(args[2]) == int:
-            chrset = convert_charset(args[0])
-            minlen = args[1]
-            maxlen = args[2]
-            if minlen > maxlen:
-                raise ValueError('expected maximum length longer than minimum length (typo?)')
-        # Otherwise not understood
-        else:
-            raise ValueError('ambiguous arguments, candidates: function(str, ...)')
-        # Creates generators...
-        chr_gnratr = generator_choice(chrset)
+    elif vartype in {str, bytes}:
+        binary = vartype == bytes
+        if binary and len(args) >= 2 and type(args[0]) in {bytes, bytearray}:
+            args = (args[0].decode('latin-1'),) + tuple(args[1:])
+        chrset, minlen, maxlen = parse_args_str(args)
+        if len(chrset) <= 0:
+            raise ValueError('can\'t choose from an empty set')
+        if minlen == maxlen and minlen < 1:
+            raise ValueError('length should not be too short')
+        if minlen < 0:
+            raise ValueError('length should not be negative')
+        charset = compile_charset(chrset)
+        if binary and (charset is None or charset[2] is not None):
+            raise ValueError('bytes should be made up of at most 256 characters within \\x00-\\xff')
+        batch = lambda count, backend, rng: batch_string(count, chrset, minlen, maxlen, binary, backend, rng)
+        # Characters are drawn in bulk, unless there are too many of them
+        if charset is not None:
+            return SpecPlan(lambda rng: generator_string_bulk(charset, minlen, maxlen, binary, rng), batch)
         if minlen == maxlen:
-            gnratr = generator_string_fixed_length(chr_gnratr, minlen)
-        else:
-            ln_gnratr = generator_range_int(minlen, maxlen)
-            gnratr = generator_string_dynamic_length(chr_gnratr, ln_gnratr)
-        # Chooses items
-        yield from gnratr
+            return SpecPlan(lambda rng: generator_string_fixed_length(generator_choice(chrset, rng), minlen), batch)
+        return SpecPlan(lambda rng: generator_string_dynamic_length(
+            generator_choice(chrset, rng), generator_range_int(minlen, maxlen, rng)), batch)
     # The invoker requires a list.
     elif vartype == list:
         # Not even a length is given!
@@ -566,25 +3082,51 @@ def generator_random(*args):
             raise ValueError('expected array length, candidates: function(list, ...)')
         # Then we assign the rest to this itself, recursively
         length = check_type_int(args[0], 'array length')
-        n_args = args[1:]
-        i_gnratr = generator_random(*n_args)
-        gnratr = generator_list(i_gnratr, length)
-        # Choosing items
-        yield from gnratr
+        if length < 1:
+            raise ValueError('length should not be too short')
+        i_plan = spec_plan(*args[1:])
+        return SpecPlan(lambda rng: generator_list(i_plan.generator(rng), length))
+    # The invoker requires weighted choices
+    elif vartype == choice:
+        if len(args) <= 0:
+            raise ValueError('expected items to choose from, candidates: function(choice, ...)')
+        table = args[0] if type(args[0]) == choice else choice(*args)
+        return SpecPlan(lambda rng: generator_weighted_choice(table, rng),
+                        lambda count, backend, rng: batch_weighted_choice(count, table, backend, rng))
+    # The invoker requires distinct items
+    elif vartype == set:
+        if len(args) <= 0:
+            raise ValueError('expected sample size, candidates: function(set, ...)')
+        length = check_type_int(args[0], 'sample size')
+        if length < 1:
+            raise ValueError('length should not be too short')
+        sampler = compile_sampler(args[1:], length)
+        return SpecPlan(lambda rng: generator_sample(sampler, length, rng),
+                        lambda count, backend, rng: batch_sample(count, sampler, length, backend, rng))
+    # The invoker requires a list which is created lazily
+    elif vartype == lazylist:
+        if len(args) <= 0:
+            raise ValueError('expected array length, candidates: function(lazylist, ...)')
+        length = check_type_int(args[0], 'array length')
+        if length < 1:
+            raise ValueError('length should not be too short')
+        i_args = args[1:]
+        spec_plan(*i_args)
+        return SpecPlan(lambda rng: generator_lazylist(i_args, length, rng))
     # The invoker requires a 2D matrix
     elif vartype == (list, list):
         # No length is given!
-        if len(args[0]) <= 0:
+        if len(args) <= 0 or len(args[0]) <= 0:
             raise ValueError('expected matrix size, candidates: function((list, list), ...)')
         # Then we assign the rest to this itself, recursively
         rows, cols = args[0]
         rows = check_type_int(rows, 'matrix rows')
         cols = check_type_int(cols, 'matrix columns')
-        n_args = args[1:]
-        i_gnratr = generator_random(*n_args)
-        gnratr = generator_list_2d(i_gnratr, rows, cols)
-        # Choosing items
-        yield from gnratr
+        if rows < 1 or cols < 1:
+            raise ValueError('the given table size is either too short or too thin')
+        i_plan = spec_plan(*args[1:])
+        return SpecPlan(lambda rng: generator_matrix(i_plan, rows, cols, rng),
+                        lambda count, backend, rng: batch_matrix(count, i_plan, rows, cols, rng))
     # Tuple which starts indexes from 0
     elif vartype == tuple:
         # Not even a length is given!
@@ -592,17 +3134,326 @@ def generator_random(*args):
             raise ValueError('expected tuple length, candidates: function(tuple, ...)')
         # Then we assign the rest to this itself, recursively
         length = check_type_int(args[0], 'tuple length')
-        n_args = [list, length] + args[1:]
-        gnratr = generator_random(*n_args)
-        # Choosing items
-        for i in gnratr:
-            yield tuple(i[1:])
+        if length < 1:
+            raise ValueError('length should not be too short')
+        i_plan = spec_plan(*args[1:])
+        return SpecPlan(lambda rng: generator_tuple(i_plan.generator(rng), length))
     # We currently don't support the rest.
-    else:
-        raise ValueError('unsupported type, candidates: function(...)')
+    raise ValueError('unsupported type, candidates: function(...)')
+
+@functools.lru_cache(maxsize=256, typed=True)
+def cached_spec_plan(*args):
+    """cached_spec_plan(...): compile_spec() with a bounded LRU cache."""
+    return compile_spec(*args)
+
+def spec_plan(*args):
+    """spec_plan(...): Returns the compiled SpecPlan of the arguments. Plans of
+    hashable arguments are kept in a LRU cache of 256 entries, so that they are
+    compiled only once. Mutable objects which are hashable by identity should
+    not be modified after being used as arguments."""
+    try:
+        return cached_spec_plan(*args)
+    except TypeError:
+        # Unhashable arguments (like lists) cannot be cached
+        return compile_spec(*args)
+
+def spec_cache_info():
+    """spec_cache_info(): Returns the hits, misses, maxsize and currsize of the
+    compiled spec cache."""
+    return cached_spec_plan.cache_info()
+
+def spec_cache_clear():
+    """spec_cache_clear(): Clears the compiled spec cache and its counters."""
+    cached_spec_plan.cache_clear()
+    return
+
+def generator_random(*args):
+    """generator_random(...): Dynamically determines which random algorithm to
+    use according to the abstracted vartype given by this function. The specific
+    invocation methods are listed in the rand() documentation."""
+    yield from spec_plan(*args).generator()
     # Ending, which ought not happen
     return
 
+class lazylist:
+    """lazylist(length, ...): A list of length "length" which starts index from
+    [1], with items generated by the rest of the arguments (in the same syntax
+    as rand()). Items are never kept as a whole, but created chunk by chunk from
+    seeds derived from the seed of the list, so that any item or slice could be
+    recomputed on demand with bounded memory. Also created by
+    rand(lazylist, length, ...).
+
+    Just like the lists from rand(list, ...), lst[0] is None and len(lst) is
+    "length" + 1. Items are read-only, and determined by both the seed and the
+    chunk size."""
+    def __init__(self, length, *args, seed=None, chunk_size=4096):
+        self.length = check_type_int(length, 'array length')
+        if self.length < 1:
+            raise ValueError('length should not be too short')
+        self.chunk_size = check_type_int(chunk_size, 'chunk size')
+        if self.chunk_size < 1:
+            raise ValueError('chunk size should be positive')
+        self.plan = spec_plan(*args)
+        if seed is None:
+            seed = random_backend.getrandbits(64)
+        self.seed = seed
+        self.cache_index = -1
+        self.cache_chunk = None
+        return
+    def __repr__(self):
+        return 'lazylist(size: %d)' % self.length
+    def __len__(self):
+        return self.length + 1
+    def chunk(self, index):
+        """chunk(index): Returns the items [index * chunk_size + 1, ...] in a
+        list (or an array.array), which is the index-th chunk."""
+        if index == self.cache_index:
+            return self.cache_chunk
+        begin = index * self.chunk_size
+        count = min(self.chunk_size, self.length - begin)
+        rng = RandomBackend((self.seed << 64) | index)
+        if self.plan.batch is not None:
+            res = self.plan.batch(count, 'array', rng)
+        else:
+            gnratr = self.plan.generator(rng)
+            res = [next(gnratr) for i in range(0, count)]
+        self.cache_index = index
+        self.cache_chunk = res
+        return res
+    def chunks(self):
+        """chunks(): Yields the chunks in order, from which all the items could
+        be iterated without keeping them all in memory."""
+        for i in range(0, (self.length - 1) // self.chunk_size + 1):
+            yield self.chunk(i)
+        return
+    def __iter__(self):
+        yield None
+        for chk in self.chunks():
+            yield from chk
+        return
+    def __getitem__(self, key):
+        if type(key) == slice:
+            return [self[i] for i in range(0, self.length + 1)[key]]
+        key = check_type_int(key, 'array index')
+        if key < 0:
+            key += self.length + 1
+        if key < 0 or key > self.length:
+            raise IndexError('lazylist index out of range')
+        if key == 0:
+            return None
+        return self.chunk((key - 1) // self.chunk_size)[(key - 1) % self.chunk_size]
+    def write_to(self, sink, conv=None):
+        """write_to(sink, conv=None): Writes the items (separated with spaces)
+        into the output sink chunk by chunk, each formatted by the printf()
+        conversion conv (like '%5d', or str() if not given)."""
+        sep = ''
+        for chk in self.chunks():
+            if conv is None:
+                sink.write(sep + ' '.join(map(str, chk)))
+            else:
+                sink.write(sep + ' '.join([conv] * len(chk)) % tuple(chk))
+            sep = ' '
+        return
+    pass
+
+class matrix:
+    """matrix(rows, columns, data=None, sep=' '): A table of said rows and columns which
+    starts index from [1][1], with the items kept in one flat row-major buffer
+    "data" (an array.array for numbers, or a list for other objects). Zeros
+    are filled in if data is not given. Also created by rand((list, list),
+    (rows, columns), ...).
+
+    Just like lazylist, mat[0] is None and len(mat) is "rows" + 1. Each row
+    mat[i] is a view into the buffer (without copying), where mat[i][0] is
+    None, and items could be changed through mat[i][j] = val.
+    printf() writes the rows separated with newlines, and the items separated
+    with "sep", e.g. set mat.sep = '' for grids of characters."""
+    class Row:
+        """Row(data, offset, columns): A view of a row in the matrix."""
+        def __init__(self, data, offset, columns):
+            self.data = data
+            self.offset = offset
+            self.columns = columns
+            return
+        def __repr__(self):
+            return 'matrix.Row(%r)' % self.tolist()
+        def __len__(self):
+            return self.columns + 1
+        def index(self, key):
+            key = check_type_int(key, 'column index')
+            if key < 0:
+                key += self.columns + 1
+            if key < 1 or key > self.columns:
+                raise IndexError('matrix column index out of range')
+            return self.offset + key - 1
+        def __getitem__(self, key):
+            if type(key) == slice:
+                return self.tolist()[key]
+            if key == 0:
+                return None
+            return self.data[self.index(key)]
+        def __setitem__(self, key, val):
+            self.data[self.index(key)] = val
+            return
+        def __iter__(self):
+            yield None
+            yield from itertools.islice(self.data, self.offset, self.offset + self.columns)
+            return
+        def values(self):
+            """values(): Returns the items of the row in a copied list (or an
+            array.array), which starts index from [0]."""
+            return self.data[self.offset:self.offset+self.columns]
+        def tolist(self):
+            """tolist(): Returns the row in a list which starts index from [1]."""
+            return [None] + list(self.values())
+        pass
+    def __init__(self, rows, columns, data=None, sep=' '):
+        self.sep = check_type_str(sep, 'separator')
+        self.rows = check_type_int(rows, 'matrix rows')
+        self.columns = check_type_int(columns, 'matrix columns')
+        if self.rows < 1 or self.columns < 1:
+            raise ValueError('the given table size is either too short or too thin')
+        if data is None:
+            data = array.array('q', bytes(8 * self.rows * self.columns))
+        elif type(data) != array.array:
+            data = list(data)
+            typecode = typecode_of(data)
+            if typecode is not None:
+                data = array.array(typecode, data)
+        if len(data) != self.rows * self.columns:
+            raise ValueError('expected rows * columns items in the data')
+        self.data = data
+        return
+    def __repr__(self):
+        return 'matrix(size: %dx%d)' % (self.rows, self.columns)
+    def __len__(self):
+        return self.rows + 1
+    def __getitem__(self, key):
+        if type(key) == slice:
+            return [self[i] for i in range(0, self.rows + 1)[key]]
+        key = check_type_int(key, 'row index')
+        if key < 0:
+            key += self.rows + 1
+        if key < 0 or key > self.rows:
+            raise IndexError('matrix row index out of range')
+        if key == 0:
+            return None
+        return matrix.Row(self.data, (key - 1) * self.columns, self.columns)
+    def __iter__(self):
+        yield None
+        for i in range(1, self.rows + 1):
+            yield self[i]
+        return
+    def tolist(self):
+        """tolist(): Returns the matrix in lists of lists, the same as the ones
+        created by rand((list, list), ...) in former versions."""
+        return [[None] * (self.columns + 1)] + [self[i].tolist() for i in range(1, self.rows + 1)]
+    def memoryview(self):
+        """memoryview(): Returns a 2D memoryview of the buffer without copying,
+        which starts index from [0][0]. Only numbers are supported."""
+        if type(self.data) != array.array:
+            raise ValueError('only matrices of numbers are kept in a buffer')
+        return memoryview(self.data).cast('B').cast(self.data.typecode, (self.rows, self.columns))
+    def numpy(self):
+        """numpy(): Returns a 2D NumPy array which shares the buffer of numbers
+        (or a copy for other objects), which requires NumPy to be installed."""
+        if numpy is None:
+            raise ImportError('matrix.numpy() requires numpy, install numpy first')
+        if type(self.data) != array.array:
+            return numpy.array(self.data, dtype=object).reshape(self.rows, self.columns)
+        return numpy.frombuffer(self.data, dtype=self.data.typecode).reshape(self.rows, self.columns)
+    def write_to(self, sink, sep=None, conv=None):
+        """write_to(sink, sep=None, conv=None): Writes the rows (separated with
+        newlines) into the output sink, with the items formatted by the printf()
+        conversion conv (like '%.2f', or as is if not given) and separated with
+        sep (or mat.sep if not given). Rows are formatted in blocks by a single
+        format string, so that no string is created for each item."""
+        if conv is not None:
+            cell = conv
+        elif type(self.data) == array.array and self.data.typecode == 'q':
+            cell = '%d'
+        else:
+            cell = '%s'
+        sep = self.sep if sep is None else sep
+        line = sep.replace('%', '%%').join([cell] * self.columns)
+        count = max(1, 65536 // self.columns)
+        block = '\n'.join([line] * count)
+        for i in range(0, self.rows, count):
+            if i > 0:
+                sink.write('\n')
+            if i + count > self.rows:
+                block = '\n'.join([line] * (self.rows - i))
+            sink.write(block % tuple(self.data[i*self.columns:(i+count)*self.columns]))
+        return
+    pass
+
+def generator_matrix(plan, rows=1, columns=1, rng=None):
+    """generator_matrix(plan, rows, columns, rng) -- A generator that creates
+    matrices of said rows and columns, with items created by the SpecPlan plan
+    in one pass if it supports batched creation."""
+    count = rows * columns
+    if plan.batch is not None:
+        while True:
+            yield matrix(rows, columns, plan.batch(count, 'array', rng))
+    gnratr = plan.generator(rng)
+    while True:
+        yield matrix(rows, columns, [next(gnratr) for i in range(0, count)])
+    return None
+
+def batch_matrix(count, plan, rows=1, columns=1, rng=None):
+    """batch_matrix(count, plan, rows, columns, rng) -- Creates count matrices
+    with all of their items created in one pass."""
+    if plan.batch is None:
+        gnratr = generator_matrix(plan, rows, columns, rng)
+        return [next(gnratr) for i in range(0, count)]
+    size = rows * columns
+    data = plan.batch(count * size, 'array', rng)
+    return [matrix(rows, columns, data[i*size:(i+1)*size]) for i in range(0, count)]
+
+def take(generator, count, backend='array'):
+    """take(generator, count, backend='array'): Creates count items from a
+    generator created by xrand() in one pass, which is a lot faster than
+    calling next(generator) for count times.
+
+    Integers and floating point numbers are returned in an array.array (or a
+    list, if the integers do not fit in 64 bits), strings and other objects
+    are returned in a list. Indicing starts from [0].
+
+    With the default backend, take(generator, count) returns the same items as
+    calling next(generator) for count times from the same random state would,
+    except for two cases. Strings and bytes drawn in bulk (character sets of
+    at most 256 characters) are cut from a single run of random bytes, so they
+    follow the same distribution but differ from the ones next() would yield.
+    Samples (set, permutation, sorted, sum, step and geometry) are the same,
+    but each is an array (or a list) indexed from [0], where next() yields
+    lists indexed from [1]. Matrices follow the kind of their items.
+    If backend is 'numpy', the results are returned in a NumPy array instead,
+    which requires NumPy to be installed. They are drawn from a NumPy
+    generator seeded from the backend, so they never match next().
+    Specs which do not support batched creation (and generators not created by
+    xrand()) fall back to calling next(generator) for count times, and the
+    results are returned in a list."""
+    if profiler is not None:
+        return take_profiled(generator, count, backend)
+    return take_plain(generator, count, backend)
+
+def take_plain(generator, count, backend):
+    """take_plain(generator, count, backend): take() without profiling."""
+    count = check_type_int(count, 'batch size')
+    if count < 0:
+        raise ValueError('batch size should not be negative')
+    check_backend(backend)
+    res = None
+    if generator in xrand_specs:
+        plan, rng = xrand_specs[generator]
+        if plan.batch is not None:
+            res = plan.batch(count, backend, rng)
+    if res is None:
+        res = [next(generator) for i in range(0, count)]
+    return res
+
+xrand_specs = weakref.WeakKeyDictionary()
+
 def rand(*args):
     """rand(...): An **intelligent** function which determines input type
     through the input formats dynamically. The results differs through type,
@@ -616,6 +3467,16 @@ def rand(*args):
     rand(iterable_object):
         Selects arbitrary items among "iterable_object".
         It is required that "iterable_object" is iterable.
+        Sequences (like list, tuple, str and range) are indexed in place, so
+          rand(range(1, 10**18)) does not create a huge list.
+    rand(dict_of_weights):
+        Selects keys of the dict, with probabilities proportional to the values.
+        It is required that the values are all numbers.
+    rand(choice, items, weights):
+        Selects items with probabilities proportional to the weights in O(1).
+        The alias table is built only once if items and weights are hashable
+          (like tuple and range), or if a choice object is given instead, like
+          rand(choice(items, weights)).
     rand(int):
         Generates integer among [0, 65535].
     rand(int, upper_bound):
@@ -653,15 +3514,68 @@ def rand(*args):
           with characters in "character_set".
         It is required that "max_length" >= "min_length".
         It is required that it is a valid character set.
+    rand(bytes, ...):
+        Generates bytes instead of string, with the same arguments as above.
+        The character set may also be given as bytes, and it is required that
+          every character is within \\x00-\\xff.
+        Character sets of at most 256 characters are drawn in bulk, which is
+          very fast for long strings.
     rand(list, length, ...):
         Generates a one-dimensional list / array / matrix, with length "length",
           appending further generators after these two arguments.
         It should be noted that array indicing starts from [1].
+    rand(permutation, length / items):
+        Generates a random permutation of [1, length], or of the given items,
+          by a Fisher-Yates shuffle.
+    rand(sorted, length, ...):
+        Generates a list of "length" items in non-decreasing order, with items
+          specified by the further arguments.
+        Ranges like (int, lower_bound, upper_bound) are created in O(length)
+          from order statistics, others are created and then sorted.
+    rand(step, length, max_step, lower_bound, upper_bound):
+        Generates a list of "length" integers within [lower_bound, upper_bound],
+          where neighbours differ by at most "max_step". The first item is
+          uniform, and each next one is uniform among the ones within reach.
+    rand(sum, length, total, [lower_bound, [upper_bound]]):
+        Generates a list of "length" integers within [lower_bound, upper_bound]
+          (lower_bound defaults to 0, and no upper bound if not given) which sum
+          up to "total", uniformly among all such lists (stars and bars).
+        If "total" is a tuple (min_total, max_total), the sum is within.
+        If the upper bound rejects too many lists, a fast approximation which
+          is not exactly uniform is used instead.
+    rand(point, count, lower_bound, upper_bound, [min_distance / 'general']):
+        Generates a list of "count" distinct lattice points (x, y) within
+          [lower_bound, upper_bound] on both axes.
+        If "min_distance" is given, the points are at least that far apart,
+          found by throwing random points into a spatial hash.
+        If 'general' is given, no three of the points are collinear, which are
+          taken from a random parabola modulo a prime in O(count).
+    rand(polygon, count, lower_bound, upper_bound):
+        Generates the "count" vertices (x, y) of a strictly convex lattice
+          polygon within the bounds in counterclockwise order, by Valtr's
+          method in O(count log count).
+        Counts which could not be reached within the bounds (roughly 3.5 *
+          width^(2/3) vertices) are rejected when the spec is compiled.
+    rand(segment, count, lower_bound, upper_bound, [max_length]):
+        Generates a list of "count" segments (x1, y1, x2, y2) with lattice ends
+          within the bounds, no two of which have any point in common. The ends
+          of each segment differ by at most "max_length" on each axis.
+    The lists above start indicing from [1] like rand(list, ...).
     rand((list,list), (rows,columns), ...):
         Generates a two-dimensional list / array / matrix, with "rows" rows and
           "columns" columns. Further arguments which composes the elements are
           appended after these two arguments.
         It should be noted that array indicing starts from [1][1] ([row][col]).
+        The items are kept in a flat buffer, see matrix for details.
+    rand(set, length, ...):
+        Generates a list of "length" distinct items in random order, with items
+          specified by the further arguments (int, float, str or an iterable
+          object). Candidates are never listed as a whole unless there are only
+          a few of them, so rand(set, k, int, 1, 10**18) uses O(k) memory.
+        It should be noted that array indicing starts from [1].
+    rand(lazylist, length, ...):
+        Same as rand(list, length, ...), but the items are created lazily, chunk
+        by chunk, when they are accessed. See lazylist for details.
     rand(tuple, length, ...):
         Generates a one-dimensional tuple, with length "length", appending
           further generators after these two arguments.
@@ -672,16 +3586,1001 @@ def rand(*args):
 
     Performance impact: This function brings about 3x of additional performance
     loss to general application, when using generators;
-    While using direct invocations (which is strongly disrecommended), this
-    brings about 75x of speed loss. So use xrand() when necessary and call
-    next(generator) for faster random data generation."""
-    gnratr = generator_random(*args)
-    return next(gnratr)
+    Direct invocations with hashable arguments are compiled only once and
+    cached (see spec_plan()), so they are almost as fast as calling next() on
+    a generator from xrand(). Unhashable arguments (like lists) have to be
+    parsed (and lists copied) again on every call, which brings about 75x of
+    speed loss, so pass a tuple, or use xrand() and call next(generator) for
+    those instead."""
+    if profiler is not None:
+        return rand_profiled(args)
+    try:
+        plan = cached_spec_plan(*args)
+    except TypeError:
+        plan = compile_spec(*args)
+    try:
+        draw = plan.local.draw
+    except AttributeError:
+        # The first draw from this plan in the calling thread
+        draw = plan.reset()
+    try:
+        return draw()
+    except Exception:
+        # The generator kept by the plan is closed by the exception
+        plan.reset()
+        raise
 
 def xrand(*args):
-    """xrand(...): Generator wrapper for rand()."""
-    yield from generator_random(*args)
+    """xrand(...): Generator wrapper for rand(). Items could also be created
+    in batches from the generator with take(generator, count)."""
+    if profiler is not None:
+        return xrand_profiled(args)
+    plan = spec_plan(*args)
+    gnratr = plan.generator(random_backend)
+    xrand_specs[gnratr] = (plan, random_backend)
+    return gnratr
 
 def rate(ratio):
     """rate(ratio): Yield True at a probability of "ratio"."""
-    return random.random() < ratio
+    return random_backend.random() < ratio
+
+def generator_rate(ratio, start=0, stop=None, rng=None):
+    """generator_rate(ratio, start, stop, rng) -- A generator that yields the
+    indices in [start, stop) (or [start, ...) if stop is None) which succeed
+    at a probability of ratio. The gaps between successes are drawn from the
+    geometric distribution, so only one draw is made for each success."""
+    rnd, log = (rng or random_backend).random, math.log
+    if ratio <= 0.0:
+        return
+    if ratio >= 1.0:
+        yield from (range(start, stop) if stop is not None else itertools.count(start))
+        return
+    scale = 1.0 / math.log1p(-ratio)
+    i = start - 1
+    while True:
+        i += 1 + int(log(1.0 - rnd()) * scale)
+        if stop is not None and i >= stop:
+            return
+        yield i
+    return
+
+def xrate(ratio, *args):
+    """xrate(ratio, [start,] stop=None): Yields the indices of range(start, stop)
+    which succeed at a probability of "ratio", as if rate(ratio) is called for
+    each of them, but in time of the number of successes instead of trials.
+    Without stop, the indices never end. For instance:
+
+        for i in xrate(1e-5, 10**7):
+            lst[i + 1] = 0
+    """
+    ratio = check_type_float(ratio, 'probability')
+    if len(args) > 2:
+        raise ValueError('too many arguments, candidates: function(ratio, [start,] stop)')
+    args = [None if i is None else check_type_int(i, 'index') for i in args]
+    start, stop = (0, args[0] if args else None) if len(args) <= 1 else args
+    return generator_rate(ratio, start, stop, random_backend)
+
+def rate_mask(ratio, count, backend='array'):
+    """rate_mask(ratio, count, backend='array'): Returns count results of
+    rate(ratio) at once, in a bytearray of 0 and 1 (or a NumPy array of bool
+    if backend is 'numpy'), which starts index from [0].
+    Sparse masks are filled by the geometric gaps of xrate() (or of the
+    failures, for dense ones), and the others from 64 random bits per item."""
+    ratio = check_type_float(ratio, 'probability')
+    count = check_type_int(count, 'mask size')
+    if count < 0:
+        raise ValueError('mask size should not be negative')
+    check_backend(backend)
+    rng = random_backend
+    if backend == 'numpy':
+        return rng.numpy_generator().random(count) < ratio
+    if min(ratio, 1.0 - ratio) < 0.375:
+        # Marks the rare outcomes only
+        rare = ratio if ratio < 0.5 else 1.0 - ratio
+        res = bytearray(count) if ratio < 0.5 else bytearray(b'\1' * count)
+        for i in generator_rate(rare, 0, count, rng):
+            res[i] ^= 1
+        return res
+    bits = array.array('Q')
+    bits.frombytes(rng.getrandbits(64 * count).to_bytes(8 * count, 'little'))
+    return bytearray(map(int(ratio * 2**64).__gt__, bits))
+
+################################################################################
+
+def draw_weights(weight, count, rng=None):
+    """draw_weights(weight, count, rng): Draws count edge weights, where weight
+    is None (no weights), a tuple of rand() arguments, or an iterator."""
+    if weight is None:
+        return None
+    if type(weight) == tuple:
+        plan = spec_plan(*weight)
+        if plan.batch is not None:
+            return list(plan.batch(count, 'array', rng))
+        weight = plan.generator(rng)
+    return [next(weight) for i in range(0, count)]
+
+def tree_prufer(n, rng):
+    """tree_prufer(n, rng): Decodes a random Prufer sequence into the edges of
+    a uniformly random labelled tree, in linear time."""
+    code = batch_randbelow(n - 2, n, rng, 1)
+    degree = [1] * (n + 2)
+    for v in code:
+        degree[v] += 1
+    ptr = 1
+    while degree[ptr] != 1:
+        ptr += 1
+    leaf = ptr
+    us, vs = [], []
+    for v in code:
+        us.append(v)
+        vs.append(leaf)
+        degree[v] -= 1
+        if degree[v] == 1 and v < ptr:
+            leaf = v
+        else:
+            ptr += 1
+            while degree[ptr] != 1:
+                ptr += 1
+            leaf = ptr
+    us.append(n)
+    vs.append(leaf)
+    return us, vs
+
+def tree_parent(n, rng):
+    """tree_parent(n, rng): Node i chooses its parent among [1, i - 1]."""
+    getrandbits = rng.getrandbits
+    us = []
+    for i in range(1, n):
+        k = (i - 1).bit_length()
+        p = getrandbits(k)
+        while p >= i:
+            p = getrandbits(k)
+        us.append(p + 1)
+    return us, list(range(2, n + 1))
+
+def tree_caterpillar(n, rng, spine=None):
+    """tree_caterpillar(n, rng, spine): A chain of "spine" nodes, with the rest
+    attached to random nodes on the chain."""
+    if spine is None:
+        spine = (n + 1) // 2
+    spine = check_type_int(spine, 'spine length')
+    if spine < 1 or spine > n:
+        raise ValueError('spine length should be in [1, n]')
+    us = list(range(1, spine)) + batch_randbelow(n - spine, spine, rng, 1)
+    return us, list(range(2, n + 1))
+
+def tree_depth(n, rng, depth=None):
+    """tree_depth(n, rng, depth): Node i chooses its parent among the nodes of
+    depth less than "depth" (the root has depth 0)."""
+    depth = check_type_int(depth, 'tree depth')
+    if depth < 1 and n > 1:
+        raise ValueError('tree depth should be positive')
+    getrandbits = rng.getrandbits
+    level = [0] * (n + 1)
+    eligible = [1]
+    us = []
+    for i in range(2, n + 1):
+        m = len(eligible)
+        k = (m - 1).bit_length()
+        p = getrandbits(k)
+        while p >= m:
+            p = getrandbits(k)
+        p = eligible[p]
+        us.append(p)
+        level[i] = level[p] + 1
+        if level[i] < depth:
+            eligible.append(i)
+    return us, list(range(2, n + 1))
+
+def rand_tree(n, shape='uniform', relabel=True, weight=None, directed=False, **options):
+    """rand_tree(n, shape='uniform', relabel=True, weight=None, directed=False,
+    ...): Generates a tree of nodes [1, n] into a graph. The shapes are:
+
+    'uniform':
+        A uniformly random labelled tree, by decoding a Prufer sequence.
+    'parent':
+        Every node i > 1 chooses a random parent among [1, i - 1].
+    'chain':
+        A chain of n nodes.
+    'star':
+        A node connected to all the other nodes.
+    'caterpillar':
+        A chain of "spine" nodes (given as spine=..., defaults to half of the
+          nodes), with the rest of the nodes attached to random nodes on it.
+    'depth':
+        Every node i > 1 chooses a random parent among the nodes whose depth is
+          less than "depth" (given as depth=...), so the tree is not deeper
+          than it. The root has depth 0.
+
+    If relabel is True, the nodes are relabelled with a random permutation and
+    the edges are shuffled, otherwise the root is 1 and every parent is added
+    before its children. Edge data are drawn from "weight", which is either a
+    tuple of rand() arguments like (int, 1, 100) or a generator from xrand().
+    Edges are added in both directions, unless directed is True, where they
+    lead from parents to children.
+    All shapes are generated in O(n) time (iteratively)."""
+    n = check_type_int(n, 'number of nodes')
+    if n < 1:
+        raise ValueError('number of nodes should be positive')
+    rng = random_backend
+    if n == 1:
+        us, vs = [], []
+    elif shape == 'uniform':
+        us, vs = tree_prufer(n, rng)
+        # The decoded edges lead to the children of the tree rooted at n, leaves
+        # first, so they are reversed and relabelled by n + 1 - u to root at 1
+        us = [n + 1 - u for u in reversed(us)]
+        vs = [n + 1 - v for v in reversed(vs)]
+    elif shape == 'parent':
+        us, vs = tree_parent(n, rng)
+    elif shape == 'chain':
+        us, vs = list(range(1, n)), list(range(2, n + 1))
+    elif shape == 'star':
+        us, vs = [1] * (n - 1), list(range(2, n + 1))
+    elif shape == 'caterpillar':
+        us, vs = tree_caterpillar(n, rng, **options)
+    elif shape == 'depth':
+        us, vs = tree_depth(n, rng, **options)
+    else:
+        raise ValueError('unsupported shape, candidates: uniform, parent, chain, star, caterpillar, depth')
+    if relabel:
+        perm = list(range(0, n + 1))
+        rng.shuffle(perm)
+        perm.remove(0)
+        perm = [0] + perm
+        us = [perm[u] for u in us]
+        vs = [perm[v] for v in vs]
+        order = list(range(0, len(us)))
+        rng.shuffle(order)
+        us = [us[i] for i in order]
+        vs = [vs[i] for i in order]
+    res = graph(n)
+    res.add_edges(us, vs, draw_weights(weight, len(us), rng), directed)
+    return res
+
+def sample_edge_indices(count, total, rng):
+    """sample_edge_indices(count, total, rng): Chooses count distinct integers
+    in the range [0, total) in random order. Sparse ranges (where duplicates
+    are rare) are drawn in batches with the duplicates dropped, otherwise
+    sample_distinct_indices() is used."""
+    if count > total:
+        raise ValueError('sample size should not exceed the number of candidates')
+    if total < 64 * count:
+        return sample_distinct_indices(count, total, rng)
+    res = dict.fromkeys(batch_randbelow(count, total, rng))
+    while len(res) < count:
+        res.update(dict.fromkeys(batch_randbelow(count - len(res), total, rng)))
+    return list(res)
+
+def decode_pairs(indices):
+    """decode_pairs(indices): Decodes each index k into the k-th pair (i, j)
+    of 0 <= i < j, ordered by j and then i. Returns the lists of i and j."""
+    js = [(1 + math.isqrt(8 * k + 1)) // 2 for k in indices]
+    return [k - j * (j - 1) // 2 for k, j in zip(indices, js)], js
+
+def encode_pairs(us, vs):
+    """encode_pairs(us, vs): The inverse of decode_pairs(), where each pair
+    could be in either order."""
+    return [max(u, v) * (max(u, v) - 1) // 2 + min(u, v) for u, v in zip(us, vs)]
+
+def skip_indices(indices, excluded):
+    """skip_indices(indices, excluded): Maps each index x in [0, total -
+    len(excluded)) to the x-th integer of [0, total) not in excluded (a set of
+    distinct integers), which keeps the mapping one-to-one."""
+    shifted = [e - i for i, e in enumerate(sorted(excluded))]
+    return [x + bisect.bisect_right(shifted, x) for x in indices]
+
+def graph_simple(n, m, directed, rng):
+    """graph_simple(n, m, directed, rng): m distinct edges among the pairs of
+    distinct nodes in [1, n]."""
+    if directed:
+        total = n * (n - 1)
+        indices = sample_edge_indices(m, total, rng)
+        us = [k // (n - 1) for k in indices]
+        vs = [k % (n - 1) for k in indices]
+        return [u + 1 for u in us], [v + 1 + (v >= u) for u, v in zip(us, vs)]
+    indices = sample_edge_indices(m, n * (n - 1) // 2, rng)
+    us, vs = decode_pairs(indices)
+    # Either end comes first with equal chance
+    flips = format(rng.getrandbits(m), '0%db' % m) if m > 0 else ''
+    return ([(v if f == '1' else u) + 1 for u, v, f in zip(us, vs, flips)],
+            [(u if f == '1' else v) + 1 for u, v, f in zip(us, vs, flips)])
+
+def graph_connected(n, m, directed, rng):
+    """graph_connected(n, m, directed, rng): A uniformly random labelled
+    spanning tree, along with m - n + 1 extra distinct edges which are not in
+    the tree. The tree edges lead away from the root if directed."""
+    if n == 1:
+        return [], []
+    us, vs = tree_prufer(n, rng)
+    perm = list(range(1, n + 1))
+    rng.shuffle(perm)
+    us = [perm[u - 1] - 1 for u in us]
+    vs = [perm[v - 1] - 1 for v in vs]
+    if directed:
+        tree = {u * (n - 1) + v - (v > u) for u, v in zip(us, vs)}
+        indices = skip_indices(sample_edge_indices(m - n + 1, n * (n - 1) - n + 1, rng), tree)
+        extra_us = [k // (n - 1) for k in indices]
+        extra_vs = [k % (n - 1) for k in indices]
+        extra_vs = [v + (v >= u) for u, v in zip(extra_us, extra_vs)]
+    else:
+        tree = set(encode_pairs(us, vs))
+        indices = skip_indices(sample_edge_indices(m - n + 1, n * (n - 1) // 2 - n + 1, rng), tree)
+        extra_us, extra_vs = decode_pairs(indices)
+    us, vs = us + extra_us, vs + extra_vs
+    order = list(range(0, m))
+    rng.shuffle(order)
+    return [us[i] + 1 for i in order], [vs[i] + 1 for i in order]
+
+def graph_dag(n, m, rng):
+    """graph_dag(n, m, rng): m distinct edges which all lead forward in a random
+    topological order of the nodes [1, n]."""
+    perm = list(range(1, n + 1))
+    rng.shuffle(perm)
+    us, vs = decode_pairs(sample_edge_indices(m, n * (n - 1) // 2, rng))
+    return [perm[u] for u in us], [perm[v] for v in vs]
+
+def graph_bipartite(n, m, rng, left=None):
+    """graph_bipartite(n, m, rng, left): m distinct edges between the nodes
+    [1, left] and [left + 1, n]."""
+    if left is None:
+        left = n // 2
+    left = check_type_int(left, 'number of left nodes')
+    if left < 0 or left > n:
+        raise ValueError('number of left nodes should be in [0, n]')
+    right = n - left
+    indices = sample_edge_indices(m, left * right, rng)
+    return [k // right + 1 for k in indices], [k % right + left + 1 for k in indices]
+
+def graph_grid(n, m, rng, columns=None):
+    """graph_grid(n, m, rng, columns): m distinct edges between the adjacent
+    cells of a grid with "columns" columns, where the cell at (i, j) is the node
+    (i - 1) * columns + j."""
+    columns = check_type_int(columns, 'number of columns')
+    if columns < 1 or n % columns != 0:
+        raise ValueError('number of columns should be a positive divisor of n')
+    rows = n // columns
+    # The first (columns - 1) * rows edges are horizontal
+    horizontal = (columns - 1) * rows
+    total = horizontal + columns * (rows - 1)
+    if m is None:
+        m = total
+    if m > total:
+        raise ValueError('too many edges, at most %d edges in the grid' % total)
+    indices = sample_edge_indices(m, total, rng)
+    us = [k // (columns - 1) * columns + k % (columns - 1) + 1 if k < horizontal
+          else k - horizontal + 1 for k in indices]
+    vs = [u + 1 if k < horizontal else u + columns for u, k in zip(us, indices)]
+    return us, vs
+
+def rand_graph(n, m=None, kind='simple', weight=None, directed=False, **options):
+    """rand_graph(n, m=None, kind='simple', weight=None, directed=False, ...):
+    Generates a graph of nodes [1, n] with m edges. The kinds are:
+
+    'simple':
+        No self-loops or multi-edges.
+    'connected':
+        A uniformly random spanning tree, with m - n + 1 extra edges (which do
+          not duplicate each other or the tree). If directed, every node is
+          reachable from the root of the tree.
+    'dag':
+        A directed acyclic graph, where the edges all lead forward in a random
+          topological order. Edges are always directed.
+    'bipartite':
+        Edges between the nodes [1, left] and [left + 1, n], where left is
+          given as left=... (defaults to n // 2).
+    'grid':
+        Edges between adjacent cells of a grid of n nodes, with the number of
+          columns given as columns=..., where the cell at (i, j) is the node
+          (i - 1) * columns + j. All the edges are kept if m is None.
+
+    None of the kinds form self-loops or multi-edges. Edges are sampled without
+    replacement by drawing distinct indices of the candidate pairs and decoding
+    them, so dense graphs cost no more than sparse ones, in O(m log m) time.
+    Edge data are drawn from "weight", which is either a tuple of rand()
+    arguments like (int, 1, 100) or a generator from xrand(). Edges are added
+    in both directions, unless directed is True."""
+    n = check_type_int(n, 'number of nodes')
+    if n < 1:
+        raise ValueError('number of nodes should be positive')
+    rng = random_backend
+    if kind == 'grid':
+        us, vs = graph_grid(n, m, rng, **options)
+    else:
+        m = check_type_int(m, 'number of edges')
+        if m < 0:
+            raise ValueError('number of edges should not be negative')
+        if kind == 'simple':
+            us, vs = graph_simple(n, m, directed, rng, **options)
+        elif kind == 'connected':
+            if m < n - 1:
+                raise ValueError('connected graph requires at least n - 1 edges')
+            us, vs = graph_connected(n, m, directed, rng, **options)
+        elif kind == 'dag':
+            us, vs = graph_dag(n, m, rng, **options)
+            directed = True
+        elif kind == 'bipartite':
+            us, vs = graph_bipartite(n, m, rng, **options)
+        else:
+            raise ValueError('unsupported kind, candidates: simple, connected, dag, bipartite, grid')
+    res = graph(n)
+    res.add_edges(us, vs, draw_weights(weight, len(us), rng), directed)
+    return res
+
+################################################################################
+
+def case_seed(seed, index):
+    """case_seed(seed, index): Derives the seed of the index-th case from the
+    master seed. The result does not depend on the process building it."""
+    digest = hashlib.sha256(('%r:%d' % (seed, index)).encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def case_arguments(params):
+    """case_arguments(params): Returns the (args, kwargs) to call a generator
+    with params, which is a tuple (or a list) for positional arguments, a dict
+    for keyword arguments, or a single argument otherwise."""
+    if type(params) == dict:
+        return (), params
+    elif type(params) == tuple or type(params) == list:
+        return tuple(params), {}
+    return (params,), {}
+
+def build_case(generator, params, seed, path):
+    """build_case(generator, params, seed, path): Calls generator with params
+    (a tuple for positional arguments, a dict for keyword arguments, or a single
+    argument otherwise) with the random module seeded with seed, and writes the
+    output of printf() into path. The output is written into a temporary file
+    first and then renamed, so that path is never left half written. Returns
+    the SHA-256 digest of the output file."""
+    args, kwargs = case_arguments(params)
+    # Keeps the suffix, from which the compression is inferred
+    head, tail = os.path.split(path)
+    temp = os.path.join(head, '.%s.%d.tmp' % (tail, os.getpid()) + os.path.splitext(tail)[1])
+    try:
+        with seeded_random(seed), use_backend(RandomBackend()):
+            with output(temp):
+                generator(*args, **kwargs)
+        digest = file_digest(temp)
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return digest
+
+def file_digest(path):
+    """file_digest(path): Returns the SHA-256 digest of the file at path, or
+    None if the file does not exist."""
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_digest(generator, exclude=('cases',)):
+    """source_digest(generator, exclude=('cases',)): Returns the SHA-256 digest
+    of the code which the outputs of generator depend on. These are the source
+    of the functions and classes defined in the module (or the script) of
+    generator, the values of its other simple globals except the names in
+    exclude, and the source of pydatagen itself. Editing the list of cases
+    therefore does not change the digest."""
+    digest = hashlib.sha256()
+    if type(generator) == ScriptFunction:
+        module, name = load_script(generator.path), generator.name
+    else:
+        module = sys.modules.get(getattr(generator, '__module__', None))
+        name = getattr(generator, '__qualname__', repr(generator))
+    digest.update(name.encode() + b'\0')
+    simple = {type(None), bool, int, float, str, bytes, tuple, list, dict, set, frozenset}
+    for key, val in sorted(vars(module).items() if module is not None else []):
+        if key.startswith('__') or key in exclude:
+            continue
+        if (inspect.isfunction(val) or inspect.isclass(val)) and val.__module__ == module.__name__:
+            try:
+                text = inspect.getsource(val)
+            except (OSError, TypeError):
+                text = val.__qualname__
+        elif type(val) in simple:
+            text = repr(val)
+        else:
+            continue
+        digest.update(('%s=%s\0' % (key, text)).encode())
+    digest.update((file_digest(os.path.abspath(__file__)) or '').encode())
+    return digest.hexdigest()
+
+def case_key(source, params, seed):
+    """case_key(source, params, seed): Returns the key of a case in the build
+    cache, derived from the source digest, the parameters and the seed."""
+    params = json.dumps(params, sort_keys=True, default=repr)
+    return hashlib.sha256(('%s:%s:%d' % (source, params, seed)).encode()).hexdigest()
+
+def build_cases(generator, jobs, workers=None, done=None):
+    """build_cases(generator, jobs, workers, done): Builds the cases in jobs, a
+    list of (params, seed, path), on a pool of workers processes. Calls
+    done(index, digest) in order for each case built, until any case fails."""
+    if workers == 1 or len(jobs) <= 1:
+        for i in range(0, len(jobs)):
+            digest = build_case(generator, *jobs[i])
+            if done is not None:
+                done(i, digest)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(build_case, generator, *job) for job in jobs]
+        for i in range(0, len(jobs)):
+            digest = futures[i].result()
+            if done is not None:
+                done(i, digest)
+    return
+
+def build_suite(generator, cases, seed=0, workers=None, directory='.', pattern='%d.in'):
+    """build_suite(generator, cases, seed=0, workers=None, directory='.',
+    pattern='%d.in'): Builds a test suite, where the i-th case (starting from 1)
+    is written into "directory/pattern % i" by calling generator with cases[i].
+    Returns the list of written paths.
+
+    Every case is built with its own seed derived from "seed", and the cases
+    are built in parallel on a pool of "workers" processes (defaults to the
+    number of processors). The outputs are identical regardless of the number
+    of workers. The generator should be a function that could be pickled, that
+    is, defined at the top level of a module."""
+    cases = list(cases)
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, pattern % i) for i in range(1, len(cases) + 1)]
+    seeds = [case_seed(seed, i) for i in range(1, len(cases) + 1)]
+    build_cases(generator, list(zip(cases, seeds, paths)), workers)
+    return paths
+
+def update_suite(generator, cases, seed=0, workers=None, directory='.', pattern='%d.in',
+                 cache='.pydatagen-cache.json', force=False):
+    """update_suite(generator, cases, seed=0, workers=None, directory='.',
+    pattern='%d.in', cache='.pydatagen-cache.json', force=False): Builds a test suite just
+    like build_suite(), but skips the cases which are up to date. Returns the
+    lists of (built paths, skipped paths).
+
+    The build cache (a JSON file in "directory") keeps a key of each case,
+    derived from the source of the generator, its parameters and its seed,
+    along with the digest of the output. A case is up to date if its key is
+    unchanged and its output file still has the same digest. All the cases are
+    rebuilt if force is True."""
+    cases = list(cases)
+    os.makedirs(directory, exist_ok=True)
+    cache_path = os.path.join(directory, cache)
+    try:
+        with open(cache_path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    source = source_digest(generator)
+    jobs, keys, skipped = [], [], []
+    for i in range(1, len(cases) + 1):
+        path = os.path.join(directory, pattern % i)
+        seed_i = case_seed(seed, i)
+        key = case_key(source, cases[i - 1], seed_i)
+        entry = entries.get(pattern % i)
+        if not force and entry is not None and entry.get('key') == key and entry.get('output') == file_digest(path):
+            skipped.append(path)
+            continue
+        jobs.append((cases[i - 1], seed_i, path))
+        keys.append((pattern % i, key))
+    def done(index, digest):
+        name, key = keys[index]
+        entries[name] = {'key': key, 'output': digest}
+        return
+    # Outdated entries are dropped, and added back when built
+    for name, key in keys:
+        entries.pop(name, None)
+    try:
+        build_cases(generator, jobs, workers, done)
+    finally:
+        temp = cache_path + '.%d.tmp' % os.getpid()
+        with open(temp, 'w') as f:
+            json.dump(entries, f, indent=1, sort_keys=True)
+        os.replace(temp, cache_path)
+    return [job[2] for job in jobs], skipped
+
+script_modules = {}
+
+def load_script(path):
+    """load_script(path): Loads a generator script as a module, which is only
+    loaded once in each process."""
+    path = os.path.abspath(path)
+    if path not in script_modules:
+        spec = importlib.util.spec_from_file_location('pydatagen_script', path)
+        if spec is None:
+            raise ValueError('unable to load script %s' % path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        script_modules[path] = module
+    return script_modules[path]
+
+class ScriptFunction:
+    """ScriptFunction(path, name): A function in a generator script, which could
+    be sent to worker processes even if the script is not importable."""
+    def __init__(self, path, name):
+        self.path = os.path.abspath(path)
+        self.name = name
+        return
+    def __repr__(self):
+        return 'ScriptFunction(%s: %s)' % (self.path, self.name)
+    def __call__(self, *args, **kwargs):
+        module = load_script(self.path)
+        if not hasattr(module, self.name):
+            raise ValueError('function %s not found in script %s' % (self.name, self.path))
+        return getattr(module, self.name)(*args, **kwargs)
+    pass
+
+################################################################################
+
+def generate_case(generator, params, seed):
+    """generate_case(generator, params, seed): Calls generator with params just
+    like build_case(), and returns the output of printf() as bytes instead of
+    writing it into a file."""
+    args, kwargs = case_arguments(params)
+    sink = output(io.BytesIO())
+    with seeded_random(seed), use_backend(RandomBackend()):
+        with sink:
+            generator(*args, **kwargs)
+    return sink.getvalue()
+
+def program_command(program):
+    """program_command(program): Splits a command line (a string) into the list
+    of arguments, or returns the list of arguments as is."""
+    if type(program) == str:
+        return shlex.split(program, posix=os.name != 'nt')
+    return list(program)
+
+def run_program(command, data, timeout=None):
+    """run_program(command, data, timeout): Runs command with data as its
+    stdin. Returns (stdout, None), or (None, message) if the program fails or
+    times out."""
+    try:
+        proc = subprocess.run(command, input=data, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, '%s timed out after %g seconds' % (' '.join(command), timeout)
+    except OSError as err:
+        return None, 'unable to run %s: %s' % (' '.join(command), err)
+    if proc.returncode != 0:
+        return None, '%s exited with code %d' % (' '.join(command), proc.returncode)
+    return proc.stdout, None
+
+def token_diff(expected, found):
+    """token_diff(expected, found): Compares two outputs (bytes) token by token,
+    ignoring the amount of whitespace. Returns None if they are the same, or a
+    message describing the first different token otherwise."""
+    if expected.split() == found.split():
+        return None
+    tokens_expected = re.finditer(rb'\S+', expected)
+    tokens_found = re.finditer(rb'\S+', found)
+    for i in itertools.count(1):
+        exp, fnd = next(tokens_expected, None), next(tokens_found, None)
+        if exp is None or fnd is None or exp.group() != fnd.group():
+            break
+    if fnd is None:
+        return 'token %d: expected %r, found end of output' % (i, exp.group().decode('latin-1'))
+    line, col = locate(found, fnd.start())
+    if exp is None:
+        return 'token %d (line %d, column %d): expected end of output, found %r' % (
+            i, line, col, fnd.group().decode('latin-1'))
+    return 'token %d (line %d, column %d): expected %r, found %r' % (
+        i, line, col, exp.group().decode('latin-1'), fnd.group().decode('latin-1'))
+
+def stress_case(generator, params, seed, commands, timeout):
+    """stress_case(generator, params, seed, commands, timeout): Generates a case
+    and runs both commands with it. Returns None if the outputs are the same,
+    or (message, input) otherwise."""
+    data = generate_case(generator, params, seed)
+    expected, message = run_program(commands[0], data, timeout)
+    if message is None:
+        found, message = run_program(commands[1], data, timeout)
+    if message is None:
+        message = token_diff(expected, found)
+    if message is None:
+        return None
+    return message, data
+
+def stress_cases(generator, params, jobs, commands, timeout, workers):
+    """stress_cases(generator, params, jobs, commands, timeout, workers): Tests
+    the cases in jobs, an iterable of (index, seed), on a pool of workers
+    processes. Yields (index, result of stress_case()) in order."""
+    if workers == 1:
+        for i, seed in jobs:
+            yield i, stress_case(generator, params, seed, commands, timeout)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        # Keeps a few cases queued for each worker, which are taken in order
+        pending = collections.deque()
+        try:
+            for i, seed in jobs:
+                pending.append((i, pool.submit(stress_case, generator, params, seed,
+                                               commands, timeout)))
+                if len(pending) >= workers * 4:
+                    i, future = pending.popleft()
+                    yield i, future.result()
+            while pending:
+                i, future = pending.popleft()
+                yield i, future.result()
+        finally:
+            for i, future in pending:
+                future.cancel()
+    return
+
+class StressResult:
+    """StressResult: The result of stress_test(), with the number of "cases" passed,
+    the wall time in "seconds", and the details of the first mismatch (index,
+    seed, message, input and the path it is saved into), which are all None if
+    every case passed."""
+    def __init__(self):
+        self.cases = 0
+        self.seconds = 0.0
+        self.index = None
+        self.seed = None
+        self.message = None
+        self.input = None
+        self.path = None
+        return
+    def __bool__(self):
+        return self.message is None
+    def __repr__(self):
+        if self.message is None:
+            return '<StressResult: %d cases passed in %.2f seconds>' % (self.cases, self.seconds)
+        return '<StressResult: case %d (seed %d) failed: %s>' % (self.index, self.seed, self.message)
+    def rate(self):
+        """rate(): Returns the number of cases tested per second."""
+        return self.cases / self.seconds if self.seconds > 0 else 0.0
+    pass
+
+def stress_test(generator, reference, solution, params=(), count=None, seed=None, workers=None,
+                timeout=10, save='failed.in', progress=None):
+    """stress_test(generator, reference, solution, params=(), count=None,
+    seed=None, workers=None, timeout=10, save='failed.in', progress=None): Tests
+    solution against reference (e.g. a brute force), which are commands of
+    local programs reading the case from stdin. Returns a StressResult.
+
+    Each case is generated in memory by calling generator with params (just
+    like build_suite()) and its own seed derived from "seed" (random if None),
+    and fed to both programs, whose outputs are compared token by token. The
+    cases are tested on a pool of "workers" processes (defaults to the number
+    of processors), so the generator should be a function that could be
+    pickled. Testing stops at the first mismatch (including crashes and
+    timeouts), or after "count" cases (never if None). The failing input is
+    saved into "save", and the seed with the message into "save" + '.json',
+    so that generate_case(generator, params, seed) reproduces it.
+    progress(result) is called after every case if given."""
+    if seed is None:
+        seed = int.from_bytes(os.urandom(8), 'big')
+    commands = [program_command(reference), program_command(solution)]
+    workers = workers or os.cpu_count() or 1
+    res = StressResult()
+    begin = time.perf_counter()
+    indices = itertools.count(1) if count is None else range(1, count + 1)
+    jobs = ((i, case_seed(seed, i)) for i in indices)
+    failure = None
+    results = stress_cases(generator, params, jobs, commands, timeout, workers)
+    try:
+        for i, failure in results:
+            if failure is not None:
+                break
+            res.cases += 1
+            res.seconds = time.perf_counter() - begin
+            if progress is not None:
+                progress(res)
+    finally:
+        results.close()
+    res.seconds = time.perf_counter() - begin
+    if failure is not None:
+        res.index, res.seed = i, case_seed(seed, i)
+        res.message, res.input = failure
+        if save is not None:
+            with open(save, 'wb') as f:
+                f.write(res.input)
+            with open(save + '.json', 'w') as f:
+                json.dump({'case': res.index, 'seed': res.seed, 'master_seed': seed,
+                           'params': params, 'message': res.message}, f, indent=1, default=repr)
+            res.path = save
+    return res
+
+################################################################################
+
+class SpecStats:
+    """SpecStats(name): The counters of a spec (or a printf() format), which
+    are the calls, the items produced, the wall time in seconds and the bytes
+    written by printf()."""
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.written = 0
+        return
+    def __repr__(self):
+        return 'SpecStats(%s: %d calls, %d items, %.6fs, %d written)' % (
+            self.name, self.calls, self.items, self.seconds, self.written)
+    pass
+
+class Profile:
+    """Profile(): Collects the counters of rand(), xrand(), take() and printf()
+    while being used in the 'with' statement. See profile() for details."""
+    def __init__(self):
+        self.stats = {}
+        return
+    def __enter__(self):
+        global profiler
+        profile_stack.append(self)
+        profiler = self
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        global profiler
+        profile_stack.remove(self)
+        profiler = profile_stack[-1] if profile_stack else None
+        return False
+    def __repr__(self):
+        return 'Profile(%d specs)' % len(self.stats)
+    def record(self, name):
+        """record(name): Returns the counters of name, created if not found."""
+        if name not in self.stats:
+            self.stats[name] = SpecStats(name)
+        return self.stats[name]
+    def sorted(self):
+        """sorted(): Returns the counters sorted by wall time, the most costly
+        ones first."""
+        return sorted(self.stats.values(), key=lambda st: st.seconds, reverse=True)
+    def report(self):
+        """report(): Returns a summary of the counters in a table, sorted by
+        wall time."""
+        lines = ['%-48s %10s %12s %10s %12s' % ('spec', 'calls', 'items', 'seconds', 'written')]
+        for st in self.sorted():
+            lines.append('%-48s %10d %12d %10.4f %12d' % (
+                st.name, st.calls, st.items, st.seconds, st.written))
+        return '\n'.join(lines)
+    pass
+
+profile_stack = []
+profiler = None
+
+def profile():
+    """profile(): Creates a profile of the random generators and printf(), to
+    be used along with the 'with' statement:
+
+        with profile() as prof:
+            generate()
+        print(prof.report())
+
+    While profiling, each spec of rand() and xrand() (and each format of
+    printf() and printf_many()) gets its own counters of the calls, the items
+    produced, the wall time and the bytes written. Generators created by
+    xrand() inside the profile are counted item by item, even after the
+    profile ends.
+
+    rand(), xrand(), take(), printf() and printf_many() check the module-level
+    profiler once per call, and pass the call to the instrumented versions
+    only while a profile is active, so that names imported before work as
+    well, and nothing else is paid when not profiling."""
+    return Profile()
+
+def spec_name(func, args):
+    """spec_name(func, args): Describes a call of func with args briefly."""
+    def describe(arg):
+        if type(arg) == type:
+            return arg.__name__
+        if type(arg) == tuple and len(arg) > 0 and all(type(i) == type for i in arg):
+            return '(%s)' % ', '.join(i.__name__ for i in arg)
+        res = repr(arg)
+        return res if len(res) <= 24 else res[:21] + '...'
+    return '%s(%s)' % (func, ', '.join(map(describe, args)))
+
+def profile_records(name):
+    """profile_records(name): Returns the counters of name in every active
+    profile."""
+    return [prof.record(name) for prof in profile_stack]
+
+class CountingSink:
+    """CountingSink(sink): Passes the contents through to sink, and counts the
+    bytes written after encoding with the encoding of sink."""
+    def __init__(self, sink):
+        self.sink = sink
+        self.encoding = getattr(sink, 'encoding', 'utf-8')
+        # ASCII text takes one byte per character in ASCII compatible encodings
+        self.ascii_bytes = len('a'.encode(self.encoding)) == 1
+        self.written = 0
+        return
+    def write(self, s):
+        if self.ascii_bytes and s.isascii():
+            self.written += len(s)
+        else:
+            self.written += len(s.encode(self.encoding))
+        self.sink.write(s)
+        return
+    def flush(self):
+        self.sink.flush()
+        return
+    pass
+
+def generator_profiled(gnratr, records):
+    """generator_profiled(gnratr, records) -- Wraps gnratr, and counts every
+    item into records."""
+    perf_counter = time.perf_counter
+    while True:
+        begin = perf_counter()
+        item = next(gnratr)
+        elapsed = perf_counter() - begin
+        for rec in records:
+            rec.items += 1
+            rec.seconds += elapsed
+        yield item
+    return None
+
+profiled_names = weakref.WeakKeyDictionary()
+
+def rand_profiled(args):
+    records = profile_records(spec_name('rand', args))
+    begin = time.perf_counter()
+    plan = spec_plan(*args)
+    try:
+        res = plan.draw()
+    except Exception:
+        plan.reset()
+        raise
+    finally:
+        elapsed = time.perf_counter() - begin
+        for rec in records:
+            rec.calls += 1
+            rec.seconds += elapsed
+    for rec in records:
+        rec.items += 1
+    return res
+
+def xrand_profiled(args):
+    name = spec_name('xrand', args)
+    records = profile_records(name)
+    begin = time.perf_counter()
+    plan = spec_plan(*args)
+    gnratr = plan.generator(random_backend)
+    elapsed = time.perf_counter() - begin
+    for rec in records:
+        rec.calls += 1
+        rec.seconds += elapsed
+    res = generator_profiled(gnratr, records)
+    xrand_specs[res] = (plan, random_backend)
+    profiled_names[res] = name
+    return res
+
+def take_profiled(generator, count, backend):
+    records = profile_records(profiled_names.get(generator, 'take(...)'))
+    begin = time.perf_counter()
+    res = take_plain(generator, count, backend)
+    elapsed = time.perf_counter() - begin
+    for rec in records:
+        rec.calls += 1
+        rec.items += len(res)
+        rec.seconds += elapsed
+    return res
+
+def printf_profiled(fmt_str, args):
+    records = profile_records('printf(%r)' % fmt_str)
+    counter = CountingSink(output_stack[-1])
+    begin = time.perf_counter()
+    try:
+        compiled_format(fmt_str).write(counter, args)
+    finally:
+        elapsed = time.perf_counter() - begin
+        for rec in records:
+            rec.calls += 1
+            rec.seconds += elapsed
+            rec.written += counter.written
+    return
+
+def printf_many_profiled(fmt_str, rows):
+    records = profile_records('printf_many(%r)' % fmt_str)
+    counter = CountingSink(output_stack[-1])
+    begin = time.perf_counter()
+    try:
+        compiled_format(fmt_str).write_many(counter, rows)
+    finally:
+        elapsed = time.perf_counter() - begin
+        for rec in records:
+            rec.calls += 1
+            rec.seconds += elapsed
+            rec.written += counter.written
+    return
@@ -0,0 +1,63 @@
+
+"""
+python -m pydatagen script.py [options]
+
+Builds a test suite with a generator script. The script should define a
+function (defaults to generate) which outputs a case with printf(), and may
+define a list of case parameters named cases.
+
+Cases which are up to date (with the same script, parameters and seed, and an
+untouched output) are skipped, unless --force is given.
+"""
+
+import argparse
+import json
+import sys
+
+from pydatagen import ScriptFunction, load_script, update_suite
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pydatagen',
+        description='Build a test suite with a generator script.')
+    parser.add_argument('script', help='path to the generator script')
+    parser.add_argument('-f', '--function', default='generate',
+        help='name of the generator function (default: generate)')
+    parser.add_argument('-c', '--cases', default=None,
+        help='JSON file of the list of case parameters (default: cases in script)')
+    parser.add_argument('-n', '--count', type=int, default=None,
+        help='build COUNT cases by calling the function with 1 ... COUNT')
+    parser.add_argument('-s', '--seed', default='0',
+        help='master seed, from which the seed of each case derives (default: 0)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+        help='number of worker processes (default: number of processors)')
+    parser.add_argument('-o', '--directory', default='.',
+        help='output directory (default: current directory)')
+    parser.add_argument('-p', '--pattern', default='%d.in',
+        help='file name pattern of the cases (default: %%d.in)')
+    parser.add_argument('-F', '--force', action='store_true',
+        help='rebuild all the cases, even if they are up to date')
+    parser.add_argument('--cache', default='.pydatagen-cache.json',
+        help='file name of the build cache in the output directory (default: .pydatagen-cache.json)')
+    args = parser.parse_args(argv)
+    # Finds out the case parameters
+    if args.cases is not None:
+        with open(args.cases) as f:
+            cases = json.load(f)
+    elif args.count is not None:
+        cases = list(range(1, args.count + 1))
+    else:
+        module = load_script(args.script)
+        if not hasattr(module, 'cases'):
+            parser.error('no cases given, candidates: --cases, --count, cases in script')
+        cases = list(module.cases)
+    seed = int(args.seed) if args.seed.lstrip('-').isdigit() else args.seed
+    generator = ScriptFunction(args.script, args.function)
+    built, skipped = update_suite(generator, cases, seed, args.workers, args.directory,
+                                  args.pattern, args.cache, args.force)
+    for path in built:
+        print('built %s' % path)
+    print('built %d cases, skipped %d up-to-date cases in %s' % (len(built), len(skipped), args.directory))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,445 @@
+
+"""
+python -m pydatagen.bench [options]
+
+Times the random generators, printf(), the containers and graphs of pydatagen
+against plain Python baselines (random, collections.deque and so on), and
+reports operations per second and peak memory. Results could be saved into a
+JSON file, and compared against a former run with --compare.
+"""
+
+import argparse
+import collections
+import io
+import json
+import math
+import platform
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+import pydatagen
+from pydatagen import (choice, deque, fflush, graph, lazylist, output,
+                       permutation, point, polygon, printf, printf_many, queue,
+                       rand, rand_graph, segment, stack, take, xrand)
+
+class Benchmark:
+    """Benchmark(group, name, ops, prepare, baseline=None): A benchmark of ops
+    operations. prepare(n) does the setup and returns a function which performs
+    n operations when called, and so does baseline(n) for the plain Python
+    approach to be compared with."""
+    def __init__(self, group, name, ops, prepare, baseline=None):
+        self.group = group
+        self.name = name
+        self.ops = ops
+        self.prepare = prepare
+        self.baseline = baseline
+        return
+    pass
+
+def measure(prepare, n, repeat):
+    """measure(prepare, n, repeat): Returns (best seconds, peak bytes) of the
+    function created by prepare(n). Memory is traced in a separate run, so
+    that the timings are not affected."""
+    best = None
+    for i in range(0, repeat):
+        run = prepare(n)
+        begin = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    run = prepare(n)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+################################################################################
+
+def bench_rand(*spec):
+    def prepare(n):
+        def run():
+            for i in range(0, n):
+                rand(*spec)
+        return run
+    return prepare
+
+def bench_xrand(*spec):
+    def prepare(n):
+        g = xrand(*spec)
+        def run():
+            for i in range(0, n):
+                next(g)
+        return run
+    return prepare
+
+def bench_take(*spec):
+    def prepare(n):
+        g = xrand(*spec)
+        return lambda: take(g, n)
+    return prepare
+
+def bench_loop(func):
+    """bench_loop(func): Calls func() for n times."""
+    def prepare(n):
+        def run():
+            for i in range(0, n):
+                func()
+        return run
+    return prepare
+
+lowercase = string.ascii_lowercase
+hexdigits = '0123456789abcdef'
+
+def baseline_sum(length, total):
+    """baseline_sum(length, total): Positive integers summing up to total, cut
+    at distinct random points."""
+    cuts = sorted(random.sample(range(1, total), length - 1))
+    return [None] + [j - i for i, j in zip([0] + cuts, cuts + [total])]
+
+def baseline_polygon(length, upper_bound):
+    """baseline_polygon(length, upper_bound): Points at random angles on the
+    largest circle in [0, upper_bound]^2, in counterclockwise order. They are
+    rounded onto the lattice, so the polygon is not always strictly convex."""
+    r = upper_bound / 2
+    angles = sorted(random.uniform(0.0, 2 * math.pi) for i in range(0, length))
+    return [None] + [(round(r + r * math.cos(a)), round(r + r * math.sin(a))) for a in angles]
+
+# (name, spec, baseline function of a single item)
+specs = [
+    ('int', (int, 1, 10**9),
+        lambda: random.randint(1, 10**9)),
+    ('int64', (int, 1, 10**18),
+        lambda: random.randint(1, 10**18)),
+    ('float', (float, 0.0, 1.0),
+        lambda: random.uniform(0.0, 1.0)),
+    ('int set', (int, 2, 3, 5, 7, 11),
+        lambda: random.choice((2, 3, 5, 7, 11))),
+    ('choice', (range(1, 10**6),),
+        lambda: random.choice(range(1, 10**6))),
+    ('weighted', (choice(range(0, 100), range(1, 101)),),
+        lambda: random.choices(range(0, 100), range(1, 101))[0]),
+    ('str', (str, 10),
+        lambda: ''.join(random.choices(lowercase, k=10))),
+    ('str range', (str, 1, 20),
+        lambda: ''.join(random.choices(lowercase, k=random.randint(1, 20)))),
+    ('bytes', (bytes, 10),
+        lambda: ''.join(random.choices(lowercase, k=10)).encode()),
+    ('list', (list, 10, int, 1, 100),
+        lambda: [None] + [random.randint(1, 100) for i in range(0, 10)]),
+    ('matrix', ((list, list), (10, 10), int, 1, 100),
+        lambda: [[random.randint(1, 100) for j in range(0, 10)] for i in range(0, 10)]),
+    ('tuple', (tuple, 3, int, 1, 100),
+        lambda: tuple(random.randint(1, 100) for i in range(0, 3))),
+    ('set', (set, 10, int, 1, 10**9),
+        lambda: [None] + random.sample(range(1, 10**9 + 1), 10)),
+    ('str charset', (str, hexdigits, 10),
+        lambda: ''.join(random.choices(hexdigits, k=10))),
+    ('lazylist', (lazylist, 10, int, 1, 100),
+        lambda: [None] + [random.randint(1, 100) for i in range(0, 10)]),
+    ('permutation', (permutation, 10),
+        lambda: [None] + random.sample(range(1, 11), 10)),
+    ('sorted', (sorted, 10, int, 1, 10**9),
+        lambda: [None] + sorted(random.randint(1, 10**9) for i in range(0, 10))),
+    ('sum', (sum, 10, 10**9, 1),
+        lambda: baseline_sum(10, 10**9)),
+    ('point', (point, 10, 0, 10**9),
+        lambda: [None] + [(random.randint(0, 10**9), random.randint(0, 10**9)) for i in range(0, 10)]),
+    ('polygon', (polygon, 10, 0, 10**9),
+        lambda: baseline_polygon(10, 10**9)),
+    ('segment', (segment, 10, 0, 10**9),
+        lambda: [None] + [tuple(random.randint(0, 10**9) for j in range(0, 4)) for i in range(0, 10)]),
+]
+
+def bench_printf(fmt, *args):
+    def prepare(n):
+        sink = output(io.BytesIO())
+        def run():
+            with sink:
+                for i in range(0, n):
+                    printf(fmt, *args)
+                fflush()
+        return run
+    return prepare
+
+def baseline_printf(fmt, *args):
+    def prepare(n):
+        def run():
+            f = io.StringIO()
+            for i in range(0, n):
+                f.write(fmt % args)
+            f.getvalue().encode()
+        return run
+    return prepare
+
+def bench_printf_list(length):
+    lst = [None] + list(range(1, length + 1))
+    return bench_printf('%s\n', lst)
+
+def bench_printf_str(length):
+    def prepare(n):
+        return bench_printf('%s\n', rand(str, length))(n)
+    return prepare
+
+def baseline_printf_list(length):
+    lst = list(range(1, length + 1))
+    def prepare(n):
+        def run():
+            f = io.StringIO()
+            for i in range(0, n):
+                f.write('%s\n' % ' '.join(map(str, lst)))
+            f.getvalue().encode()
+        return run
+    return prepare
+
+def bench_printf_many(fmt, row):
+    def prepare(n):
+        sink = output(io.BytesIO())
+        rows = [row] * n
+        def run():
+            with sink:
+                printf_many(fmt, rows)
+                fflush()
+        return run
+    return prepare
+
+def bench_container(factory, push, pop):
+    """bench_container(factory, push, pop): Pushes n items into a new container
+    and pops them all."""
+    def prepare(n):
+        container = factory()
+        push_, pop_ = getattr(container, push), getattr(container, pop)
+        def run():
+            for i in range(0, n):
+                push_(i)
+            for i in range(0, n):
+                pop_()
+        return run
+    return prepare
+
+def bench_graph_add(n):
+    g = graph(n)
+    edges = [(random.randint(1, n), random.randint(1, n)) for i in range(0, n)]
+    def run():
+        for u, v in edges:
+            g.add_edge(u, v)
+    return run
+
+def baseline_graph_add(n):
+    adj = collections.defaultdict(list)
+    edges = [(random.randint(1, n), random.randint(1, n)) for i in range(0, n)]
+    def run():
+        for u, v in edges:
+            adj[u].append(v)
+    return run
+
+def bench_graph_add_edges(n):
+    g = graph(n)
+    us = [random.randint(1, n) for i in range(0, n)]
+    vs = [random.randint(1, n) for i in range(0, n)]
+    return lambda: g.add_edges(us, vs)
+
+def bench_graph_find(n):
+    g = graph(n)
+    edges = [(random.randint(1, n), random.randint(1, n)) for i in range(0, n)]
+    g.add_edges(*zip(*edges))
+    def run():
+        for u_v in edges:
+            u_v in g
+    return run
+
+def baseline_graph_find(n):
+    edges = [(random.randint(1, n), random.randint(1, n)) for i in range(0, n)]
+    adj = collections.defaultdict(set)
+    for u, v in edges:
+        adj[u].add(v)
+    def run():
+        for u, v in edges:
+            v in adj[u]
+    return run
+
+def bench_graph_remove(n):
+    g = graph(n)
+    edges = [(random.randint(1, n), random.randint(1, n)) for i in range(0, n)]
+    g.add_edges(*zip(*edges))
+    def run():
+        for u, v in edges:
+            g.remove_edge(u, v)
+    return run
+
+def bench_graph_csr(n):
+    g = graph(n)
+    g.add_edges([random.randint(1, n) for i in range(0, n)],
+                [random.randint(1, n) for i in range(0, n)])
+    return lambda: g.csr()
+
+def bench_graph_random(kind):
+    return lambda n: lambda: rand_graph(n, n, kind)
+
+def baseline_graph_random(n):
+    def run():
+        g = graph(n)
+        seen = set()
+        while len(seen) < n:
+            u, v = random.randint(1, n), random.randint(1, n)
+            if u != v and (u, v) not in seen and (v, u) not in seen:
+                seen.add((u, v))
+                g.add_edge(u, v, directed=False)
+    return run
+
+def bench_graph_bfs(n):
+    g = rand_graph(n, 2 * n, 'connected')
+    g.csr()
+    return lambda: g.bfs(1)
+
+def baseline_graph_bfs(n):
+    g = rand_graph(n, 2 * n, 'connected')
+    adj = collections.defaultdict(list)
+    for u, v, data in g:
+        adj[u].append(v)
+    def run():
+        dist = {1: 0}
+        que = collections.deque([1])
+        while que:
+            u = que.popleft()
+            for v in adj[u]:
+                if v not in dist:
+                    dist[v] = dist[u] + 1
+                    que.append(v)
+    return run
+
+def benchmarks():
+    """benchmarks(): Returns the list of all the benchmarks."""
+    res = []
+    for name, spec, baseline in specs:
+        res.append(Benchmark('rand', name, 100000, bench_rand(*spec), bench_loop(baseline)))
+        res.append(Benchmark('xrand', name, 100000, bench_xrand(*spec), bench_loop(baseline)))
+        res.append(Benchmark('take', name, 100000, bench_take(*spec), bench_loop(baseline)))
+    res.extend([
+        Benchmark('printf', 'int', 100000, bench_printf('%d\n', 42),
+                  baseline_printf('%d\n', 42)),
+        Benchmark('printf', 'many rows', 100000, bench_printf_many('%d %d %d\n', (1, 22, 333)),
+                  baseline_printf('%d %d %d\n', 1, 22, 333)),
+        Benchmark('printf', 'list', 100, bench_printf_list(10000),
+                  baseline_printf_list(10000)),
+        Benchmark('printf', 'str 10^6', 10, bench_printf_str(10**6),
+                  baseline_printf('%s\n', 'a' * 10**6)),
+        Benchmark('container', 'deque', 100000, bench_container(deque, 'push_back', 'pop_front'),
+                  bench_container(collections.deque, 'append', 'popleft')),
+        Benchmark('container', 'queue', 100000, bench_container(queue, 'push', 'pop'),
+                  bench_container(collections.deque, 'append', 'popleft')),
+        Benchmark('container', 'stack', 100000, bench_container(stack, 'push', 'pop'),
+                  bench_container(list, 'append', 'pop')),
+        Benchmark('graph', 'add_edge', 100000, bench_graph_add, baseline_graph_add),
+        Benchmark('graph', 'add_edges', 100000, bench_graph_add_edges, baseline_graph_add),
+        Benchmark('graph', 'contains', 100000, bench_graph_find, baseline_graph_find),
+        Benchmark('graph', 'remove_edge', 100000, bench_graph_remove),
+        Benchmark('graph', 'csr', 100000, bench_graph_csr),
+        Benchmark('graph', 'rand_graph', 100000, bench_graph_random('simple'), baseline_graph_random),
+        Benchmark('graph', 'connected', 100000, bench_graph_random('connected')),
+        Benchmark('graph', 'bfs', 100000, bench_graph_bfs, baseline_graph_bfs),
+    ])
+    return res
+
+################################################################################
+
+def run_benchmarks(selected, scale=1.0, repeat=3, seed=0, log=None):
+    """run_benchmarks(selected, scale, repeat, seed, log): Runs the benchmarks
+    and returns the results as a list of dicts. Progress is written to log."""
+    results = []
+    for bench in selected:
+        n = max(1, int(bench.ops * scale))
+        random.seed(seed)
+        seconds, peak = measure(bench.prepare, n, repeat)
+        res = {
+            'group': bench.group,
+            'name': bench.name,
+            'ops': n,
+            'seconds': seconds,
+            'ops_per_sec': n / seconds if seconds > 0 else None,
+            'peak_bytes': peak,
+            'baseline_ops_per_sec': None,
+            'baseline_peak_bytes': None,
+        }
+        if bench.baseline is not None:
+            random.seed(seed)
+            seconds, peak = measure(bench.baseline, n, repeat)
+            res['baseline_ops_per_sec'] = n / seconds if seconds > 0 else None
+            res['baseline_peak_bytes'] = peak
+        results.append(res)
+        if log is not None:
+            log.write(format_result(res) + '\n')
+            log.flush()
+    return results
+
+def format_rate(rate):
+    if rate is None:
+        return '-'
+    for unit, size in (('G', 1e9), ('M', 1e6), ('k', 1e3)):
+        if rate >= size:
+            return '%.2f%s' % (rate / size, unit)
+    return '%.2f' % rate
+
+def format_result(res, former=None):
+    """format_result(res, former): Formats a result into a line of the report,
+    with the speed relative to a former result if given."""
+    ratio = '-'
+    if res['ops_per_sec'] and res['baseline_ops_per_sec']:
+        ratio = '%.2fx' % (res['ops_per_sec'] / res['baseline_ops_per_sec'])
+    line = '%-10s %-12s %10s ops/s %10s ops/s %8s %10.1f KiB' % (
+        res['group'], res['name'], format_rate(res['ops_per_sec']),
+        format_rate(res['baseline_ops_per_sec']), ratio, res['peak_bytes'] / 1024)
+    if former is not None and former.get('ops_per_sec') and res['ops_per_sec']:
+        line += ' %+7.1f%%' % ((res['ops_per_sec'] / former['ops_per_sec'] - 1) * 100)
+    return line
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pydatagen.bench',
+        description='Benchmark pydatagen against plain Python approaches.')
+    parser.add_argument('-k', '--filter', default=None,
+        help='only run benchmarks whose "group name" contains FILTER')
+    parser.add_argument('-n', '--scale', type=float, default=1.0,
+        help='multiplier of the number of operations (default: 1.0)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+        help='number of timed runs, of which the best is taken (default: 3)')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+        help='random seed of each benchmark (default: 0)')
+    parser.add_argument('-o', '--output', default=None,
+        help='save the results into a JSON file')
+    parser.add_argument('-c', '--compare', default=None,
+        help='compare the speed against the results in a former JSON file')
+    args = parser.parse_args(argv)
+    selected = [bench for bench in benchmarks()
+                if args.filter is None or args.filter in '%s %s' % (bench.group, bench.name)]
+    if not selected:
+        parser.error('no benchmarks matched the filter')
+    print('%-10s %-12s %16s %16s %8s %14s' % ('group', 'name', 'pydatagen', 'baseline', 'ratio', 'peak memory'))
+    results = run_benchmarks(selected, args.scale, args.repeat, args.seed,
+                             None if args.compare else sys.stdout)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            former = {(res['group'], res['name']): res for res in json.load(f)['results']}
+        for res in results:
+            print(format_result(res, former.get((res['group'], res['name']), {})))
+    if args.output is not None:
+        report = {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'numpy': pydatagen.numpy is not None,
+            'scale': args.scale,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+
+"""
+python -m pydatagen.stress script.py reference solution [options]
+
+Stress tests a solution against a reference (e.g. a brute force). Cases are
+generated in memory by a generator script, which defines a function (defaults
+to generate) that outputs a case with printf(). Each case is fed to both
+programs through stdin on a pool of worker processes, and the outputs are
+compared token by token. Testing stops at the first mismatch, whose input is
+saved along with its seed.
+"""
+
+import argparse
+import json
+import sys
+
+from pydatagen import ScriptFunction, stress_test
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pydatagen.stress',
+        description='Stress test a solution against a reference solution.')
+    parser.add_argument('script', help='path to the generator script')
+    parser.add_argument('reference', help='command of the reference solution')
+    parser.add_argument('solution', help='command of the solution to be tested')
+    parser.add_argument('-f', '--function', default='generate',
+        help='name of the generator function (default: generate)')
+    parser.add_argument('-a', '--params', default='[]',
+        help='JSON of the parameters passed to the function (default: [])')
+    parser.add_argument('-n', '--count', type=int, default=None,
+        help='stop after COUNT cases (default: never)')
+    parser.add_argument('-s', '--seed', default=None,
+        help='master seed, from which the seed of each case derives (default: random)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+        help='number of worker processes (default: number of processors)')
+    parser.add_argument('-t', '--timeout', type=float, default=10,
+        help='time limit of each run in seconds (default: 10)')
+    parser.add_argument('-o', '--save', default='failed.in',
+        help='file to save the failing input into (default: failed.in)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+        help='do not report the progress')
+    args = parser.parse_args(argv)
+    seed = args.seed
+    if seed is not None and seed.lstrip('-').isdigit():
+        seed = int(seed)
+    generator = ScriptFunction(args.script, args.function)
+    def progress(res):
+        if res.cases % 100 == 0:
+            sys.stderr.write('\r%d cases passed, %.1f cases/s' % (res.cases, res.rate()))
+            sys.stderr.flush()
+    try:
+        res = stress_test(generator, args.reference, args.solution, json.loads(args.params),
+                          args.count, seed, args.workers, args.timeout, args.save,
+                          None if args.quiet else progress)
+    except KeyboardInterrupt:
+        sys.stderr.write('\ninterrupted\n')
+        return 130
+    if not args.quiet:
+        sys.stderr.write('\n')
+    if res:
+        print('%d cases passed in %.2f seconds (%.1f cases/s)' % (res.cases, res.seconds, res.rate()))
+        return 0
+    print('case %d (seed %d) failed after %d cases passed: %s' % (res.index, res.seed, res.cases, res.message))
+    print('input saved into %s' % res.path)
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
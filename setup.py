@@ -30,5 +30,9 @@ setup(
     install_requires = [
     ],
     entry_points = {
+        'console_scripts': [
+            'pydatagen = pydatagen.__main__:main',
+            'pydatagen-stress = pydatagen.stress:main',
+        ],
     },
 )
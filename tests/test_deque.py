@@ -0,0 +1,38 @@
+import collections
+import random
+
+from pydatagen import deque
+
+
+def test_deque_matches_collections_deque():
+    rng = random.Random(7)
+    ours, ref = deque(), collections.deque()
+    for step in range(0, 3000):
+        op = rng.randrange(0, 6)
+        items = [rng.randrange(0, 1000) for i in range(0, rng.choice([0, 1, 5, 40]))]
+        if op == 0:
+            ours.extend_front(items)
+            ref.extendleft(items)
+        elif op == 1:
+            ours.extend(items)
+            ref.extend(items)
+        elif op == 2:
+            ours.push_front(step)
+            ref.appendleft(step)
+        elif op == 3:
+            ours.push_back(step)
+            ref.append(step)
+        elif op == 4 and ref:
+            assert ours.get_front() == ref.popleft()
+        elif op == 5 and ref:
+            assert ours.get_back() == ref.pop()
+        assert ours.size() == len(ref)
+    assert list(ours) == list(ref)
+
+
+def test_extend_front_grows_once():
+    ours = deque()
+    ours.push_back(0)
+    ours.extend_front(range(1, 1001))
+    assert list(ours) == list(range(1000, -1, -1))
+    assert len(ours.deque_base.buffer) == 1024
@@ -0,0 +1,54 @@
+import math
+import random
+
+import pytest
+
+from pydatagen import polygon, rand, xrand
+from pydatagen import lattice_polygon_vectors, polygon_capacity, sort_vectors
+
+
+def strictly_convex(poly):
+    n = len(poly)
+    turning = 0.0
+    for i in range(0, n):
+        (ax, ay), (bx, by), (cx, cy) = poly[i], poly[(i + 1) % n], poly[(i + 2) % n]
+        cross = (bx - ax) * (cy - by) - (by - ay) * (cx - bx)
+        if cross <= 0:
+            return False
+        turning += math.atan2(cross, (bx - ax) * (cx - bx) + (by - ay) * (cy - by))
+    return abs(turning - 2 * math.pi) < 1e-6
+
+
+def test_every_accepted_polygon_is_generated():
+    random.seed(1)
+    for trial in range(0, 500):
+        upr = random.choice([1, 2, 5, 10, 30, 100, 1000, 10**9])
+        most = polygon_capacity(upr) if upr <= 1000 else 1000
+        count = random.randint(3, max(3, most))
+        try:
+            gen = xrand(polygon, count, 0, upr)
+        except ValueError:
+            assert count > most
+            continue
+        poly = next(gen)[1:]
+        assert len(poly) == count
+        assert len(set(poly)) == count
+        assert all(0 <= c <= upr for p in poly for c in p)
+        assert strictly_convex(poly)
+
+
+def test_polygon_bounds_are_checked_when_compiled():
+    with pytest.raises(ValueError):
+        xrand(polygon, polygon_capacity(100) + 1, 0, 100)
+    with pytest.raises(ValueError):
+        xrand(polygon, 2, 0, 100)
+    assert len(rand(polygon, polygon_capacity(100), 0, 100)) == polygon_capacity(100) + 1
+
+
+def test_sort_vectors_merges_parallel_runs():
+    vectors = [(1, 0)] * 1000 + [(0, 1)] * 1000 + [(-1, 0)] * 1000 + [(0, -1)] * 1000
+    assert sort_vectors(vectors) == [(0, -1000), (1000, 0), (0, 1000), (-1000, 0)]
+    big = 10**18
+    assert sort_vectors([(big, 1), (big + 1, 1), (-2 * big - 1, -2)]) == [
+        (-2 * big - 1, -2), (big + 1, 1), (big, 1)]
+    assert len(lattice_polygon_vectors(100, 10**9)) >= 100
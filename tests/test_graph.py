@@ -0,0 +1,94 @@
+import collections
+import time
+
+from pydatagen import graph, rand_tree
+
+
+def test_edges_snapshot_is_cached_and_invalidated():
+    g = rand_tree(3000)
+    begin = time.perf_counter()
+    for u in range(1, 3001):
+        g.edges.get(u)
+    assert time.perf_counter() - begin < 2.0
+    g = graph(3)
+    g.add_edge(1, 2)
+    assert set(g.edges) == {1}
+    g.add_edge(2, 3)
+    assert set(g.edges) == {1, 2}
+    g.add_edges([3], [1])
+    assert set(g.edges) == {1, 2, 3}
+    g.remove_edge(1, 2)
+    assert set(g.edges) == {2, 3}
+
+
+def path_graph(n):
+    g = graph(n)
+    for u in range(1, 4):
+        g.add_edge(u, u + 1, directed=False)
+    return g
+
+
+def test_algorithms_on_graph_without_node_count():
+    for g in (path_graph(0), path_graph(4)):
+        assert g.tree_diameter() == (3, 4, 1)
+        assert g.lca([(3, 4), (1, 4)]) == [3, 1]
+        count, labels = g.components()
+        assert count == 1
+        assert labels[1:5] == [1, 1, 1, 1]
+        assert g.bfs(1)[1:5] == [0, 1, 2, 3]
+    dag = graph()
+    dag.add_edges([3, 1, 2], [4, 2, 3])
+    assert dag.toposort() == [1, 2, 3, 4]
+    forest = graph()
+    forest.add_edges([2, 5], [3, 6], directed=False)
+    assert forest.components()[0] == 2
+    assert forest.tree_diameter() == (1, 3, 2)
+
+
+def test_algorithms_on_zero_based_graph():
+    g = graph(3)
+    g.add_edges([0, 1], [1, 2])
+    assert g.toposort() == [0, 3, 1, 2]
+    assert g.components() == (2, [1, 1, 1, 2])
+    assert g.bfs(0) == [0, 1, 2, -1]
+    assert g.lca([(1, 2)], 0) == [1]
+    g = graph(3)
+    g.add_edges([1, 2], [2, 3])
+    assert g.toposort() == [1, 2, 3]
+    assert g.components() == (1, [0, 1, 1, 1])
+
+
+def test_components_and_bfs_on_directed_edges():
+    g = graph(6)
+    g.add_edges([5, 4, 3, 6], [3, 1, 4, 2])
+    assert g.components() == (2, [0, 1, 2, 1, 1, 1, 2])
+    assert g.bfs([5, 6]) == [-1, 3, 1, 1, 2, 0, 0]
+    tree = rand_tree(2000)
+    count, labels = tree.components()
+    assert count == 1 and labels[1:] == [1] * 2000
+    dist = tree.bfs(1)
+    assert dist[1] == 0 and min(dist[1:]) >= 0
+
+
+def test_trees_without_relabel_are_rooted_at_1_parents_first():
+    options = {'depth': {'depth': 3}}
+    for shape in ('uniform', 'parent', 'chain', 'star', 'caterpillar', 'depth'):
+        for n in (1, 2, 3, 50):
+            g = rand_tree(n, shape, relabel=False, directed=True, **options.get(shape, {}))
+            seen = {1}
+            for u, v, data in g:
+                assert u in seen and v not in seen
+                seen.add(v)
+            assert seen == set(range(1, n + 1))
+            assert g.toposort()[0] == 1
+
+
+def test_uniform_tree_is_uniform():
+    # There are 3 labelled trees of 3 nodes, told apart by the middle node
+    counts = collections.Counter()
+    for i in range(0, 3000):
+        g = rand_tree(3, relabel=False)
+        degree = collections.Counter(u for u, v, data in g)
+        counts[degree.most_common(1)[0][0]] += 1
+    assert sorted(counts) == [1, 2, 3]
+    assert min(counts.values()) > 850
@@ -0,0 +1,23 @@
+import array
+
+import pytest
+
+import pydatagen
+from pydatagen import matrix
+
+
+def test_numpy_without_numpy_raises_import_error(monkeypatch):
+    monkeypatch.setattr(pydatagen, 'numpy', None)
+    with pytest.raises(ImportError, match='requires numpy'):
+        matrix(2, 2, array.array('q', [1, 2, 3, 4])).numpy()
+    with pytest.raises(ImportError, match='requires numpy'):
+        matrix(1, 2, ['a', 'b']).numpy()
+
+
+def test_numpy_shares_the_buffer():
+    pytest.importorskip('numpy')
+    mat = matrix(2, 2, array.array('q', [1, 2, 3, 4]))
+    arr = mat.numpy()
+    assert arr.tolist() == [[1, 2], [3, 4]]
+    mat[2][2] = 5
+    assert arr[1, 1] == 5
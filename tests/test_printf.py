@@ -0,0 +1,34 @@
+import array
+import io
+
+from pydatagen import lazylist, matrix, output, printf, printf_many, rand
+
+
+def render(fmt, *args):
+    sink = output(io.BytesIO())
+    with sink:
+        printf(fmt, *args)
+    return sink.getvalue().decode()
+
+
+def test_lazylist_and_matrix_use_the_conversion():
+    mat = matrix(2, 2, [0.25, 1.5, 2.0, 3.125])
+    assert render('%.1f\n', mat) == '0.2 1.5\n2.0 3.1\n'
+    assert render('%5.2f|\n', mat) == ' 0.25  1.50\n 2.00  3.12|\n'
+    ints = matrix(1, 3, array.array('q', [1, 22, 333]))
+    assert render('%4d\n', ints) == '   1   22  333\n'
+    lst = rand(lazylist, 3, int, 7, 7)
+    assert render('%5d\n', lst) == '    7     7     7\n'
+    assert render('%s\n', lst) == '7 7 7\n'
+    assert render('%-3d|\n', lst) == '7   7   7  |\n'
+
+
+def test_containers_use_the_conversion():
+    assert render('%.2f\n', [None, 1, 2.5]) == '1.00 2.50\n'
+    assert render('%03d\n', (1, 2)) == '001 002\n'
+    assert render('%3d\n', array.array('q', [4, 5])) == '  4   5\n'
+    assert render('%d\n', [[None], [None, 1, 2], [None, 3, 4]]) == '1 2\n3 4\n'
+    sink = output(io.BytesIO())
+    with sink:
+        printf_many('%d %.1f\n', [(1, 0.5), (2, 1.25)])
+    assert sink.getvalue().decode() == '1 0.5\n2 1.2\n'
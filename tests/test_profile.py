@@ -0,0 +1,61 @@
+import io
+import threading
+
+import pydatagen
+from pydatagen import output, printf, printf_many, profile, rand, take, xrand
+
+
+def test_names_imported_before_are_profiled():
+    with profile() as prof:
+        rand(int, 1, 10)
+        rand(int, 1, 10)
+        gen = xrand(float, 0.0, 1.0)
+        next(gen)
+        take(gen, 5)
+    assert pydatagen.profiler is None
+    st = prof.record('rand(int, 1, 10)')
+    assert (st.calls, st.items) == (2, 2)
+    st = prof.record('xrand(float, 0.0, 1.0)')
+    assert st.calls == 2 and st.items == 6
+    # Nothing is counted once the profile ends
+    rand(int, 1, 10)
+    assert prof.record('rand(int, 1, 10)').calls == 2
+
+
+def test_nested_profiles_restore_the_outer_one():
+    with profile() as outer:
+        with profile() as inner:
+            rand(int, 1, 10)
+        assert pydatagen.profiler is outer
+        rand(int, 1, 10)
+    assert pydatagen.profiler is None
+    assert inner.record('rand(int, 1, 10)').calls == 1
+    assert outer.record('rand(int, 1, 10)').calls == 2
+
+
+def test_written_counts_encoded_bytes():
+    sink = output(io.BytesIO())
+    with sink, profile() as prof:
+        printf('%s\n', 'héllo')
+        printf_many('%d\n', [1, 22])
+    assert sink.getvalue() == 'héllo\n1\n22\n'.encode()
+    assert prof.record("printf('%s\\n')").written == 7
+    assert prof.record("printf_many('%d\\n')").written == 5
+    sink = output(io.BytesIO(), encoding='utf-16-le')
+    with sink, profile() as prof:
+        printf('%s', 'ab')
+    assert prof.record("printf('%s')").written == 4
+
+
+def test_generators_in_threads_keep_working_while_profiling():
+    results = []
+    def worker():
+        gen = xrand(int, 1, 1)
+        results.append(sum(next(gen) for i in range(0, 2000)) + sum(take(gen, 100)))
+    with profile():
+        threads = [threading.Thread(target=worker) for i in range(0, 4)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+    assert results == [2100] * 4
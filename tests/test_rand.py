@@ -0,0 +1,31 @@
+import sys
+import threading
+
+from pydatagen import rand
+
+
+def test_rand_from_several_threads():
+    errors, results = [], []
+    barrier = threading.Barrier(8)
+    def worker():
+        barrier.wait()
+        try:
+            strs = [rand(str, 50) for i in range(0, 2000)]
+            ints = [rand(int, 1, 10) for i in range(0, 2000)]
+        except Exception as exc:
+            errors.append(exc)
+            return
+        results.append(all(len(s) == 50 for s in strs) and all(1 <= i <= 10 for i in ints))
+    # Switches threads as often as possible, so that the draws overlap
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=worker) for i in range(0, 8)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert results == [True] * 8
@@ -0,0 +1,35 @@
+import pytest
+
+from pydatagen import ValidationError, rand, step, validator
+
+
+def test_step_stays_within_the_bounds_and_steps():
+    for max_step, low, upr in [(0, 5, 5), (1, 1, 2), (3, -10, 10), (10**9, 1, 10**18)]:
+        lst = rand(step, 200, max_step, low, upr)
+        assert lst[0] is None and len(lst) == 201
+        assert all(low <= x <= upr for x in lst[1:])
+        assert all(abs(lst[i + 1] - lst[i]) <= max_step for i in range(1, 200))
+    # Every value within reach is taken, including the ones at the bounds
+    lst = rand(step, 5000, 1, 1, 3)
+    assert {lst[i + 1] - lst[i] for i in range(1, 5000)} == {-1, 0, 1}
+    assert set(lst[1:]) == {1, 2, 3}
+
+
+def test_step_rejects_invalid_arguments():
+    with pytest.raises(ValueError):
+        rand(step, 5, 1, 10, 1)
+    with pytest.raises(ValueError):
+        rand(step, 5, -1, 1, 10)
+    with pytest.raises(ValueError):
+        rand(step, 5, 1)
+
+
+def test_step_is_validated():
+    with validator(b'1 3 4 2') as v:
+        v.expect(step, 4, 2, 1, 4)
+    with pytest.raises(ValidationError, match='step of at most 1'):
+        with validator(b'1 3 4 2') as v:
+            v.expect(step, 4, 1, 1, 4)
+    with pytest.raises(ValidationError):
+        with validator(b'1 3 4 5') as v:
+            v.expect(step, 4, 2, 1, 4)
@@ -0,0 +1,86 @@
+import pytest
+
+from pydatagen import (choice, matrix, permutation, point, polygon, segment,
+                       step, take, use_backend, xrand)
+
+
+def next_and_take(args, count=40):
+    with use_backend(2024):
+        gen = xrand(*args)
+        via_next = [next(gen) for i in range(0, count)]
+    with use_backend(2024):
+        via_take = take(xrand(*args), count)
+    return via_next, via_take
+
+
+WIDE = ''.join(map(chr, range(0x4e00, 0x4e00 + 300)))
+
+
+@pytest.mark.parametrize('args', [
+    (int, 1, 10),
+    (int, -10**30, 10**30),
+    (float, -1.0, 1.0),
+    (int, 3, 5, 7, 11),
+    (float, 0.5, 1.5, 2.5),
+    (['a', 'b', 'c'],),
+    (range(1, 10**18),),
+    (choice(['x', 'y', 'z'], [1, 2, 3]),),
+    ({1: 0.5, 2: 0.25, 3: 0.25},),
+    (str, WIDE, 5),
+    (str, WIDE, 0, 6),
+], ids=repr)
+def test_take_matches_next(args):
+    via_next, via_take = next_and_take(args)
+    assert list(via_take) == via_next
+
+
+def test_take_matches_next_for_matrices():
+    via_next, via_take = next_and_take(((list, list), (2, 3), int, 1, 100))
+    assert [m.tolist() for m in via_take] == [m.tolist() for m in via_next]
+    assert all(type(m) == matrix for m in via_take)
+
+
+@pytest.mark.parametrize('args', [
+    (set, 5, int, 1, 10),
+    (set, 5, float, 0.0, 1.0),
+    (set, 3, str, 'ab', 1, 2),
+    (set, 4, range(0, 10**12)),
+    (permutation, 6),
+    (sorted, 5, int, 1, 100),
+    (sum, 5, 100, 1),
+    (step, 5, 2, 1, 10),
+    (point, 4, 0, 100),
+    (polygon, 4, 0, 100),
+    (segment, 3, 0, 100),
+], ids=repr)
+def test_take_matches_next_for_samples(args):
+    via_next, via_take = next_and_take(args, 10)
+    # Samples from take() are indexed from [0], the ones from next() from [1]
+    assert [list(s) for s in via_take] == [s[1:] for s in via_next]
+    assert all(s[0] is None for s in via_next)
+
+
+@pytest.mark.parametrize('args, chrset, minlen, maxlen', [
+    ((str, 8), 'abcdefghijklmnopqrstuvwxyz', 8, 8),
+    ((str, 'xyz', 0, 6), 'xyz', 0, 6),
+    ((bytes, b'01', 3, 5), b'01', 3, 5),
+], ids=repr)
+def test_take_of_bulk_strings_follows_the_distribution(args, chrset, minlen, maxlen):
+    # Strings drawn in bulk are cut from one run of random bytes by take()
+    via_next, via_take = next_and_take(args, 400)
+    for res in (via_next, list(via_take)):
+        assert all(type(s) == args[0] for s in res)
+        assert {len(s) for s in res} == set(range(minlen, maxlen + 1))
+        assert set(args[0]().join(res)) == set(chrset)
+
+
+def test_choices_do_not_follow_later_changes_of_the_list():
+    lst = [1, 2, 3]
+    gen = xrand(lst)
+    weighted = choice(lst, [1, 1, 1])
+    lst.clear()
+    assert {next(gen) for i in range(0, 100)} == {1, 2, 3}
+    assert set(take(gen, 100)) == {1, 2, 3}
+    assert set(take(xrand(weighted), 100)) == {1, 2, 3}
+    lst.extend([7, 8, 9, 10])
+    assert {next(gen) for i in range(0, 100)} == {1, 2, 3}